@@ -4,6 +4,9 @@ from django.contrib.auth.models import Group
 
 from .forms.parking_spot_form import CustomParkingSpotForm
 from .forms.user_form import CustomUserChangeForm, CustomUserCreationForm
+from .models.archived_reservation import ArchivedReservation
+from .models.failed_charge import FailedCharge
+from .models.outbox_message import OutboxMessage
 from .models.parking_spot import ParkingSpot
 from .models.reservation import Reservation
 from .models.user import User
@@ -77,8 +80,55 @@ class CustomParkingSpotAdmin(admin.ModelAdmin):
         "updated_at",
     )
 
+    def get_queryset(self, request):
+        """
+        Read whether each parking spot is reserved in the same query as the parking spots
+        """
+
+        return super().get_queryset(request).with_reserved()
+
+
+class OutboxMessageAdmin(admin.ModelAdmin):
+    """
+    OutboxMessage admin class, e.g. for inspecting the messages which failed to be published
+    """
+
+    list_display = ("id", "topic", "created_at", "published_at", "attempts", "last_error")
+    list_filter = ("topic",)
+
+
+class ArchivedReservationAdmin(admin.ModelAdmin):
+    """
+    ArchivedReservation admin class
+    """
+
+    list_display = ("id", "user", "email", "parking_spot", "start_time", "end_time", "archived_at")
+    raw_id_fields = ("user", "parking_spot")
+
+
+class FailedChargeAdmin(admin.ModelAdmin):
+    """
+    FailedCharge admin class, e.g. for reconciling the charges which failed
+    """
+
+    list_display = (
+        "id",
+        "reservation",
+        "permanent",
+        "code",
+        "attempts",
+        "created_at",
+        "updated_at",
+        "resolved_at",
+    )
+    list_filter = ("permanent", "code")
+    raw_id_fields = ("reservation",)
+
 
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(ParkingSpot, CustomParkingSpotAdmin)
 admin.site.register(Reservation)
+admin.site.register(OutboxMessage, OutboxMessageAdmin)
+admin.site.register(ArchivedReservation, ArchivedReservationAdmin)
+admin.site.register(FailedCharge, FailedChargeAdmin)
 admin.site.unregister(Group)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AppMainConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "app"
+
+    def ready(self):
+        # connect the signal receivers
+        from . import signals  # noqa: F401
@@ -0,0 +1,106 @@
+"""
+Module for the Redis schedule of the reservation expiry, which ends each reservation within
+RESERVATION_EXPIRY_SCHEDULER_INTERVAL seconds of its end_time.
+
+The schedule is a sorted set in the Redis instance of the cache, which holds the id of each
+reservation scored by the timestamp of its end_time. The views add a reservation once it has been
+committed, and amending its end_time re-scores it in O(log n) rather than scheduling another task.
+The scheduler, i.e. the run_expiry_scheduler management command, pops the due members atomically
+and dispatches them in batches to the expire_reservations Celery task.
+
+The schedule is an index only, the reservation table remains the source of truth: the task only
+ends the dispatched reservations which are due, hence members of deleted, released or amended
+reservations are dropped once popped. A reservation missing from the schedule, e.g. because Redis
+was unreachable when it was added or its batch could not be dispatched, is ended by the
+expire_due_reservations sweeper instead.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django_redis import get_redis_connection
+from redis.commands.core import Script
+from redis.exceptions import RedisError
+
+from .tasks.tasks import expire_reservations
+
+logger = logging.getLogger(__name__)
+
+# remove and return the members scored up to ARGV[1], at most ARGV[2] of them, in one atomic step,
+# hence concurrent schedulers never dispatch the same reservation. The script is created once and
+# loaded into Redis by its first call, rather than on each poll of the scheduler.
+POP_DUE_SCRIPT = Script(
+    None,
+    b"""
+local ids = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, ARGV[2])
+if #ids > 0 then
+    redis.call("ZREM", KEYS[1], unpack(ids))
+end
+return ids
+""",
+)
+
+
+def get_connection():
+    """
+    Return the client of the Redis instance of the cache
+    """
+
+    return get_redis_connection("default")
+
+
+def schedule(*reservations):
+    """
+    Add the reservations to the schedule, or re-score them if their end_time has been amended,
+    once the current transaction has been committed
+    """
+
+    def add():
+        try:
+            get_connection().zadd(
+                settings.RESERVATION_EXPIRY_SCHEDULE_KEY,
+                {reservation.id: reservation.end_time.timestamp() for reservation in reservations},
+            )
+        except RedisError:
+            # the expire_due_reservations sweeper ends the reservations instead
+            logger.warning("Failed to schedule the expiry of %s reservations", len(reservations))
+
+    transaction.on_commit(add)
+
+
+def pop_due(now: float, batch_size: int) -> list:
+    """
+    Remove the next batch of reservations whose end_time is at or before the timestamp now from
+    the schedule and return their ids
+    """
+
+    ids = POP_DUE_SCRIPT(
+        keys=[settings.RESERVATION_EXPIRY_SCHEDULE_KEY],
+        args=[now, batch_size],
+        client=get_connection(),
+    )
+    return [int(reservation_id) for reservation_id in ids]
+
+
+def dispatch_due(now: float = None, batch_size: int = None) -> int:
+    """
+    Dispatch the reservations which are due at the timestamp now, which defaults to the current
+    time, in batches to the expire_reservations task and return the number of reservations
+    dispatched. The task checks whether the reservations are due at the same timestamp, hence a
+    worker whose clock is behind the one of the scheduler does not skip them.
+    """
+
+    now = time.time() if now is None else now
+    batch_size = batch_size or settings.RESERVATION_EXPIRY_BATCH_SIZE
+
+    dispatched = 0
+    while True:
+        reservation_ids = pop_due(now, batch_size)
+        if reservation_ids:
+            expire_reservations.delay(reservation_ids, now)
+            dispatched += len(reservation_ids)
+
+        if len(reservation_ids) < batch_size:
+            return dispatched
@@ -38,4 +38,4 @@ class CustomParkingSpotForm(ModelForm):
 
     class Meta:
         model = ParkingSpot
-        fields = ("lat", "lng", "rate", "reserved", "active")
+        fields = ("lat", "lng", "rate", "active")
@@ -0,0 +1,167 @@
+"""
+Module for the Idempotency-Key support of the POST endpoints
+"""
+
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django_redis import get_redis_connection
+from redis.commands.core import Script
+
+# the request header which carries the idempotency key chosen by the client
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+
+# the response header which marks a replayed response
+IDEMPOTENT_REPLAYED_HEADER = "Idempotent-Replayed"
+
+# the response headers which are stored with the response and replayed, e.g. the ETag of a
+# reservation which the client sends with If-Match to amend it
+IDEMPOTENT_STORED_HEADERS = ("ETag",)
+
+# delete the lock KEYS[1] only if it still holds the token ARGV[1] of the request which took it,
+# in one atomic step, hence a request which outlived its lock does not release the lock of a retry
+RELEASE_LOCK_SCRIPT = Script(
+    None,
+    b"""
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+""",
+)
+
+
+def get_connection():
+    """
+    Return the client of the Redis instance of the cache, which holds the locks of the requests in
+    progress
+    """
+
+    return get_redis_connection("default")
+
+
+def get_idempotency_cache_key(request, idempotency_key: str) -> str:
+    """
+    Return the cache key of the response to the request with the idempotency key. The key is
+    scoped to the path and to the credentials of the client, hence clients cannot read each
+    other's responses and replays do not need to look up the user in the db.
+    """
+
+    scope = "\n".join(
+        [
+            request.method,
+            request.path,
+            request.headers.get("Authorization", ""),
+            idempotency_key,
+        ]
+    )
+    return f"idempotency:{hashlib.sha256(scope.encode()).hexdigest()}"
+
+
+class IdempotentPostMixin:
+    """
+    Mixin for API views which makes POST requests idempotent if the client sends an
+    Idempotency-Key header, e.g. a random UUID per logical request which is reused for each retry.
+
+    The first request with a key holds a lock on the key in Redis while it is processed, at most
+    for IDEMPOTENCY_LOCK_TIMEOUT seconds, and its response is stored in the cache (Redis) for
+    IDEMPOTENCY_KEY_TIMEOUT seconds. Retries with the same key receive the stored response, with
+    the Idempotent-Replayed header, without running the view, hence without touching the db or
+    Stripe. A retry which arrives while the first request is still in progress waits for its
+    response rather than running in parallel. Each request only releases the lock it holds
+    itself, hence a request which outlived its lock leaves the lock of a later retry in place.
+
+    Server errors and conflicts (409) are not stored, hence the client can retry them, e.g. once
+    it has read the current version of a reservation. Reusing a key with a different request body
+    is rejected with a 422 response.
+    """
+
+    # seconds between two checks for the response of a request in progress
+    idempotency_poll_interval = 0.05
+
+    def dispatch(self, request, *args, **kwargs):
+        """
+        Replay the stored response of a POST request with a known idempotency key, otherwise
+        process the request and store its response
+        """
+
+        idempotency_key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        if request.method != "POST" or not idempotency_key:
+            return super().dispatch(request, *args, **kwargs)
+
+        cache_key = get_idempotency_cache_key(request, idempotency_key)
+        lock_key = f"{cache_key}:lock"
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+        lock_timeout = settings.IDEMPOTENCY_LOCK_TIMEOUT
+        # the token of this request, which only releases the lock it has taken itself
+        lock_token = uuid.uuid4().hex
+        connection = get_connection()
+
+        deadline = time.monotonic() + lock_timeout
+        while True:
+            stored_response = cache.get(cache_key)
+            if stored_response is not None:
+                return self.replay(stored_response, fingerprint)
+
+            if connection.set(lock_key, lock_token, nx=True, px=int(lock_timeout * 1000)):
+                break
+
+            # a request with the same key is in progress, wait for its response
+            if time.monotonic() > deadline:
+                return JsonResponse(
+                    {"detail": "A request with this Idempotency-Key is in progress."},
+                    status=409,
+                )
+            time.sleep(self.idempotency_poll_interval)
+
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+
+            # the stored response holds the rendered content of the DRF response
+            if hasattr(response, "render"):
+                response.render()
+
+            if response.status_code < 500 and response.status_code != 409:
+                stored_response = {
+                    "fingerprint": fingerprint,
+                    "status": response.status_code,
+                    "content": response.content,
+                    "content_type": response.get("Content-Type"),
+                    "headers": {
+                        header: response[header]
+                        for header in IDEMPOTENT_STORED_HEADERS
+                        if response.has_header(header)
+                    },
+                }
+                cache.set(cache_key, stored_response, timeout=settings.IDEMPOTENCY_KEY_TIMEOUT)
+        finally:
+            RELEASE_LOCK_SCRIPT(keys=[lock_key], args=[lock_token], client=connection)
+
+        return response
+
+    @staticmethod
+    def replay(stored_response: dict, fingerprint: str):
+        """
+        Return the stored response, unless the request body differs from the one of the request
+        which created it
+        """
+
+        if stored_response["fingerprint"] != fingerprint:
+            return JsonResponse(
+                {"detail": "The Idempotency-Key has been used with a different request body."},
+                status=422,
+            )
+
+        response = HttpResponse(
+            stored_response["content"],
+            status=stored_response["status"],
+            content_type=stored_response["content_type"],
+        )
+        for header, value in stored_response.get("headers", {}).items():
+            response[header] = value
+        response[IDEMPOTENT_REPLAYED_HEADER] = "true"
+        return response
@@ -0,0 +1,111 @@
+"""
+Django command which moves the paid reservations that ended more than
+RESERVATION_ARCHIVE_AFTER_DAYS days ago from the reservation table to the archive (see
+app.models.archived_reservation), in batches of bounded size
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ...models.archived_reservation import ArchivedReservation
+from ...models.failed_charge import FailedCharge
+from ...models.reservation import Reservation
+
+
+def archive_batch(ended_before, batch_size: int) -> int:
+    """
+    Move the next batch of paid reservations which ended before ended_before to the archive and
+    return the number of reservations moved.
+
+    The batch is deleted and inserted into the archive by one statement, hence the rows do not
+    travel to the app and no post_delete signals are sent, which would invalidate the cache of
+    the available parking spots for each reservation, although paid reservations do not affect
+    availability. The rows of the batch are locked with FOR UPDATE SKIP LOCKED, hence a
+    reservation being changed concurrently is moved by a later batch, and concurrent runs move
+    different batches. Reservations whose charge has failed and has not been resolved stay in
+    the reservation table until they have been re-driven (see the redrive_failed_charges
+    command).
+    """
+
+    columns = ", ".join(
+        connection.ops.quote_name(field.column) for field in Reservation._meta.concrete_fields
+    )
+    reservation_table = connection.ops.quote_name(Reservation._meta.db_table)
+    archive_table = connection.ops.quote_name(ArchivedReservation._meta.db_table)
+    failed_charge_table = connection.ops.quote_name(FailedCharge._meta.db_table)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {reservation_table}
+                WHERE id IN (
+                    SELECT id FROM {reservation_table} AS reservation
+                    WHERE paid AND end_time < %s AND NOT EXISTS (
+                        SELECT 1 FROM {failed_charge_table}
+                        WHERE reservation_id = reservation.id AND resolved_at IS NULL
+                    )
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING {columns}
+            )
+            INSERT INTO {archive_table} ({columns}, archived_at)
+            SELECT {columns}, now() FROM moved
+            """,
+            [ended_before, batch_size],
+        )
+        return cursor.rowcount
+
+
+class Command(BaseCommand):
+    """
+    Django command to archive expired reservations
+    """
+
+    help = "Move paid reservations which ended more than --days days ago to the archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=None,
+            help="age in days of the archived reservations, defaults to "
+            "RESERVATION_ARCHIVE_AFTER_DAYS",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="reservations moved per batch, defaults to RESERVATION_ARCHIVE_BATCH_SIZE",
+        )
+        parser.add_argument(
+            "--max-batches", type=int, default=None, help="stop after this number of batches"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Move one batch after the other, each in its own transaction, until no expired reservation
+        is left or --max-batches batches have been moved
+        """
+
+        days = options["days"]
+        if days is None:
+            days = settings.RESERVATION_ARCHIVE_AFTER_DAYS
+        batch_size = options["batch_size"] or settings.RESERVATION_ARCHIVE_BATCH_SIZE
+        ended_before = timezone.now() - timedelta(days=days)
+
+        archived = batches = 0
+        while options["max_batches"] is None or batches < options["max_batches"]:
+            count = archive_batch(ended_before, batch_size)
+            archived += count
+            batches += 1
+            if count < batch_size:
+                break
+
+        self.stdout.write(f"Archived {archived} reservations")
@@ -0,0 +1,56 @@
+"""
+Django command which derives the geohash and the unit vector of all parking spots that do not
+have them yet, e.g. parking spots created before these fields were added or created with
+bulk_create()
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from ...models.parking_spot import ParkingSpot
+
+
+class Command(BaseCommand):
+    """
+    Django command to backfill the fields of parking spots which are derived from lat/lng
+    """
+
+    help = "Derive the geohash and the unit vector of all parking spots which do not have them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="parking spots updated per query"
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="re-derive the fields of all parking spots, not only of those without them",
+        )
+
+    def handle(self, *args, **options):
+        """
+        Update the parking spots in batches of ascending ids
+        """
+
+        batch_size = options["batch_size"]
+        parking_spots = ParkingSpot.objects.order_by("id").only("id", "lat", "lng")
+        if not options["all"]:
+            parking_spots = parking_spots.filter(Q(geohash="") | Q(unit_x__isnull=True))
+
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(parking_spots.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+
+            for parking_spot in batch:
+                parking_spot.set_derived_fields()
+            ParkingSpot.objects.bulk_update(batch, ParkingSpot.derived_fields)
+
+            updated += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Backfilled the derived fields of {updated} parking spots")
+        )
@@ -0,0 +1,127 @@
+"""
+Django command which benchmarks the listing of all available parking spots, comparing the full
+response with the lean, compact, and paginated responses of the columns needed by map clients.
+
+Each benchmark run seeds the parking spot table with randomly located spots inside New York City
+and rolls the seeded rows back once the run is complete. Do not run this command against the
+production database.
+"""
+
+import time
+from datetime import timedelta
+from random import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from ...models.parking_spot import ParkingSpot
+from ...models.reservation import Reservation
+from ...views.parking_spot_views import GetAvailableParkingSpotsView
+from .benchmark_radial_search import seed_parking_spots
+
+# the selection of fields needed by map clients
+MAP_FIELDS = "id,lat,lng,rate"
+
+
+def reserve_parking_spots(share: float):
+    """
+    Create a current reservation for a random share of the parking spots
+    """
+
+    now = timezone.now()
+    Reservation.objects.bulk_create(
+        (
+            Reservation(
+                email="benchmark@example.com",
+                parking_spot_id=parking_spot_id,
+                rate=rate,
+                start_time=now - timedelta(minutes=30),
+                end_time=now + timedelta(minutes=30),
+            )
+            for parking_spot_id, rate in ParkingSpot.objects.values_list("id", "rate")
+            if random() < share
+        ),
+        batch_size=10_000,
+    )
+
+
+class Command(BaseCommand):
+    """
+    Django command to benchmark the listing of available parking spots
+    """
+
+    help = "Compare queries, latency and payload size of the parking spot list response modes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[50_000],
+            help="number of seeded parking spots per run",
+        )
+        parser.add_argument(
+            "--reserved",
+            type=float,
+            default=0.5,
+            help="share of the seeded parking spots which are reserved",
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="requests per response mode")
+
+    def handle(self, *args, **options):
+        """
+        Run the benchmark for each size and print one result row per size and response mode
+        """
+
+        self.stdout.write(
+            f"{'spots':>10} {'mode':>8} {'rows':>8} {'queries':>8} {'ms':>8} {'kB':>8}"
+        )
+
+        for size in options["sizes"]:
+            with transaction.atomic():
+                seed_parking_spots(size)
+                reserve_parking_spots(options["reserved"])
+
+                # the planner needs fresh statistics to pick the partial index
+                with connection.cursor() as cursor:
+                    cursor.execute(f"ANALYZE {ParkingSpot._meta.db_table}")
+                    cursor.execute(f"ANALYZE {Reservation._meta.db_table}")
+
+                self.run(size, "full", {}, options["repeat"])
+                self.run(size, "lean", {"fields": MAP_FIELDS}, options["repeat"])
+                self.run(size, "compact", {"compact": 1}, options["repeat"])
+                self.run(size, "page", {"compact": 1, "limit": 1000}, options["repeat"])
+
+                # discard the seeded parking spots
+                transaction.set_rollback(True)
+
+    def run(self, size, mode, query_params, repeat):
+        """
+        Time the rendered response of the available parking spots view and write the mean
+        latency, the number of queries and the payload size per request
+        """
+
+        request_factory = APIRequestFactory()
+        view = GetAvailableParkingSpotsView.as_view()
+
+        seconds = 0
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = view(request_factory.get("/", query_params))
+                response.render()
+                seconds += time.perf_counter() - start
+
+        # the compact response holds one array per field and paginated responses nest the results
+        data = response.data
+        if isinstance(data, dict) and "results" in data:
+            data = data["results"]
+        rows = len(data["id"]) if isinstance(data, dict) else len(data)
+
+        self.stdout.write(
+            f"{size:>10} {mode:>8} {rows:>8} {len(queries):>8} "
+            f"{seconds / repeat * 1000:>8.1f} {len(response.content) / 1024:>8.0f}"
+        )
@@ -0,0 +1,109 @@
+"""
+Django command which benchmarks the throughput of concurrent reservations of one parking spot,
+which contend for the exclusion constraint on the reservation periods.
+
+The threads use their own db connections, hence each run commits a seeded parking spot and
+deletes it, and its reservations, once the run is complete. Do not run this command against the
+production database.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from ...models.parking_spot import ParkingSpot
+from ...models.reservation import Reservation
+from ...views.reservation_views import create_reservation
+
+
+class Command(BaseCommand):
+    """
+    Django command to benchmark concurrent reservations of one parking spot
+    """
+
+    help = "Measure the latency and throughput of concurrent reservations of one parking spot"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads",
+            nargs="+",
+            type=int,
+            default=[10, 20],
+            help="number of concurrent reservations per run",
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="runs per number of threads")
+
+    def handle(self, *args, **options):
+        """
+        Run the benchmark for each number of threads and print one result row per number of
+        threads
+        """
+
+        self.stdout.write(f"{'threads':>8} {'winners':>8} {'ms':>8} {'per s':>8}")
+
+        for thread_count in options["threads"]:
+            seconds = 0
+            winners = 0
+            for _ in range(options["repeat"]):
+                parking_spot = ParkingSpot.objects.create(
+                    lat=Decimal("40.758896"), lng=Decimal("-73.985130"), rate=Decimal("10.00")
+                )
+                try:
+                    run_seconds, run_winners = self.run(parking_spot, thread_count)
+                    seconds += run_seconds
+                    winners += run_winners
+                finally:
+                    # discard the seeded parking spot
+                    Reservation.objects.filter(parking_spot=parking_spot).delete()
+                    parking_spot.delete()
+
+            seconds /= options["repeat"]
+            self.stdout.write(
+                f"{thread_count:>8} {winners / options['repeat']:>8.1f} {seconds * 1000:>8.1f} "
+                f"{thread_count / seconds:>8.0f}"
+            )
+
+    @staticmethod
+    def run(parking_spot, thread_count):
+        """
+        Reserve the parking spot for the same period from thread_count threads at once and return
+        the elapsed seconds and the number of reservations which succeeded, which is one
+        """
+
+        start_time = timezone.now()
+        barrier = threading.Barrier(thread_count)
+
+        def reserve(i):
+            # release all threads at once to maximise contention
+            barrier.wait()
+            try:
+                create_reservation(
+                    parking_spot.id,
+                    {
+                        "email": f"benchmark{i}@example.com",
+                        "start_time": start_time,
+                        "end_time": start_time + timedelta(minutes=10),
+                    },
+                    AnonymousUser(),
+                )
+                return True
+            except ValidationError:
+                return False
+            finally:
+                # each thread opens its own db connection
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+            start = time.perf_counter()
+            results = list(executor.map(reserve, range(thread_count)))
+            seconds = time.perf_counter() - start
+
+        return seconds, results.count(True)
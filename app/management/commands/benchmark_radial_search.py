@@ -0,0 +1,154 @@
+"""
+Django command which benchmarks the radial parking spot search against the legacy full scan.
+
+Each benchmark run seeds the parking spot table with randomly located spots inside New York City
+and rolls the seeded rows back once the run is complete. Do not run this command against the
+production database.
+"""
+
+import time
+from decimal import Decimal
+from random import uniform
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from utils.spatial_index import parking_spot_index
+from utils.utils import haversine_distance
+
+from ...models.parking_spot import ParkingSpot
+from ...views.parking_spot_views import GetAvailableParkingSpotsFilterView
+
+# approximate bounds of New York City
+NYC_LAT_BOUNDS = (40.4774, 40.9176)
+NYC_LNG_BOUNDS = (-74.2591, -73.7004)
+
+
+def seed_parking_spots(size: int):
+    """
+    Create size parking spots at random locations inside New York City
+    """
+
+    def build_parking_spot():
+        parking_spot = ParkingSpot(
+            lat=Decimal(f"{uniform(*NYC_LAT_BOUNDS):.6f}"),
+            lng=Decimal(f"{uniform(*NYC_LNG_BOUNDS):.6f}"),
+            rate=Decimal(f"{uniform(0, 100):.2f}"),
+        )
+        # bulk_create() does not call save(), which derives the geohash and the unit vector
+        parking_spot.set_derived_fields()
+        return parking_spot
+
+    ParkingSpot.objects.bulk_create((build_parking_spot() for _ in range(size)), batch_size=10_000)
+
+
+class Command(BaseCommand):
+    """
+    Django command to benchmark the radial parking spot search
+    """
+
+    help = "Compare rows fetched and latency of the radial search with the legacy full scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[10_000, 100_000, 1_000_000],
+            help="number of seeded parking spots per run",
+        )
+        parser.add_argument("--dist", type=float, default=1, help="search radius")
+        parser.add_argument("--unit", default="km", help="unit of the search radius")
+        parser.add_argument("--repeat", type=int, default=5, help="searches per run")
+
+    def handle(self, *args, **options):
+        """
+        Run the benchmark for each size and print one result row per size
+        """
+
+        self.stdout.write(
+            f"{'spots':>10} {'legacy rows':>12} {'legacy ms':>10} {'rows':>8} {'ms':>8} "
+            f"{'index build ms':>15} {'index ms':>9}"
+        )
+
+        for size in options["sizes"]:
+            with transaction.atomic():
+                seed_parking_spots(size)
+                self.run(size, options)
+
+                # discard the seeded parking spots
+                transaction.set_rollback(True)
+
+        # drop the seeded parking spots from the spatial index
+        parking_spot_index.clear()
+
+    def run(self, size, options):
+        """
+        Time the legacy search, the current search, and the search of the spatial index around
+        random locations and write the mean latency and rows fetched per search, as well as the
+        time to build the spatial index
+        """
+
+        dist = options["dist"]
+        unit = options["unit"]
+        repeat = options["repeat"]
+        request_factory = APIRequestFactory()
+
+        start = time.perf_counter()
+        parking_spot_index.rebuild()
+        rebuild_seconds = time.perf_counter() - start
+
+        legacy_rows = legacy_seconds = rows = seconds = index_seconds = 0
+
+        for _ in range(repeat):
+            lat = uniform(*NYC_LAT_BOUNDS)
+            lng = uniform(*NYC_LNG_BOUNDS)
+
+            # legacy search: fetch all available parking spots and check each one
+            start = time.perf_counter()
+            legacy_spots = list(ParkingSpot.objects.available())
+            legacy_matches = [
+                spot
+                for spot in legacy_spots
+                if haversine_distance(lat, lng, float(spot.lat), float(spot.lng), unit)
+                <= dist
+            ]
+            legacy_seconds += time.perf_counter() - start
+            legacy_rows += len(legacy_spots)
+
+            # current search as run by the view
+            view = GetAvailableParkingSpotsFilterView()
+            view.request = Request(
+                request_factory.get(
+                    "/", {"lat": lat, "lng": lng, "unit": unit, "dist": dist}
+                )
+            )
+            start = time.perf_counter()
+            spots = list(view.get_queryset())
+            seconds += time.perf_counter() - start
+
+            # the db runs the exact distance check, hence it only returns the matches
+            rows += len(spots)
+
+            # search of the spatial index followed by the availability check in the db
+            start = time.perf_counter()
+            index_results = parking_spot_index.search(lat, lng, dist, unit)
+            list(
+                ParkingSpot.objects.available().filter(
+                    id__in=[spot_id for spot_id, _ in index_results]
+                )
+            )
+            index_seconds += time.perf_counter() - start
+
+            if len(spots) != len(legacy_matches):
+                self.stderr.write(
+                    f"Result mismatch at ({lat},{lng}): {len(spots)} vs {len(legacy_matches)}"
+                )
+
+        self.stdout.write(
+            f"{size:>10} {legacy_rows // repeat:>12} {legacy_seconds / repeat * 1000:>10.1f} "
+            f"{rows // repeat:>8} {seconds / repeat * 1000:>8.1f} "
+            f"{rebuild_seconds * 1000:>15.1f} {index_seconds / repeat * 1000:>9.1f}"
+        )
@@ -0,0 +1,137 @@
+"""
+Django command which benchmarks the serialization of the reservation history of a user, comparing
+DRF's per-field list serialization with the lean list serializer of ReservationSerializer (see
+LeanReservationListSerializer) and a paginated request of the expired reservations view.
+
+Each benchmark run seeds one user with expired reservations and rolls the seeded rows back once
+the run is complete. Do not run this command against the production database.
+"""
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from ...models.parking_spot import ParkingSpot
+from ...models.reservation import Reservation
+from ...models.user import User
+from ...serializers.reservation_serializer import ReservationSerializer
+from ...views.reservation_views import GetExpiredReservationsAuth
+from .benchmark_radial_search import seed_parking_spots
+
+
+def seed_reservations(user, size: int):
+    """
+    Create size expired reservations of the user, one per hour going back from now
+    """
+
+    seed_parking_spots(100)
+    parking_spots = list(ParkingSpot.objects.all())
+    now = timezone.now()
+    Reservation.objects.bulk_create(
+        (
+            Reservation(
+                user=user,
+                email=user.email,
+                parking_spot=parking_spots[i % len(parking_spots)],
+                rate=parking_spots[i % len(parking_spots)].rate,
+                start_time=now - timedelta(hours=i + 1),
+                end_time=now - timedelta(hours=i, minutes=30),
+                paid=True,
+                stripe_setup_intent_id=f"seti_benchmark_{i}",
+            )
+            for i in range(size)
+        ),
+        batch_size=10_000,
+    )
+
+
+class Command(BaseCommand):
+    """
+    Django command to benchmark the serialization of lists of reservations
+    """
+
+    help = "Compare the per-row cost of the full and the lean reservation list serialization"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[1_000, 10_000],
+            help="number of seeded reservations per run",
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="runs per serialization mode")
+
+    def handle(self, *args, **options):
+        """
+        Run the benchmark for each size and print one result row per size and mode
+        """
+
+        self.stdout.write(f"{'rows':>10} {'mode':>8} {'ms':>10} {'us/row':>10}")
+
+        for size in options["sizes"]:
+            with transaction.atomic():
+                user = User.objects.create_user("benchmark@example.com", "benchmark")
+                seed_reservations(user, size)
+
+                with connection.cursor() as cursor:
+                    cursor.execute(f"ANALYZE {Reservation._meta.db_table}")
+
+                reservations = Reservation.objects.filter(paid=True, user=user).order_by(
+                    "-start_time", "-id"
+                )
+
+                # DRF's default list serializer renders each reservation field by field
+                self.run(
+                    size,
+                    "full",
+                    lambda: serializers.ListSerializer(
+                        reservations, child=ReservationSerializer()
+                    ).data,
+                    options["repeat"],
+                )
+                self.run(
+                    size,
+                    "lean",
+                    lambda: ReservationSerializer(reservations, many=True).data,
+                    options["repeat"],
+                )
+                self.run(
+                    size, "page", lambda: self.get_page(user, limit=50), options["repeat"], 50
+                )
+
+                # discard the seeded user, parking spots, and reservations
+                transaction.set_rollback(True)
+
+    @staticmethod
+    def get_page(user, limit: int):
+        """
+        Return the rendered first page of the expired reservations view
+        """
+
+        request = APIRequestFactory().get("/", {"limit": limit})
+        force_authenticate(request, user=user)
+        response = GetExpiredReservationsAuth.as_view()(request)
+        return response.render()
+
+    def run(self, size, mode, serialize, repeat, rows=None):
+        """
+        Time serialize, including the query, and write the mean latency and the cost per row
+        """
+
+        seconds = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            serialize()
+            seconds += time.perf_counter() - start
+
+        rows = rows or size
+        self.stdout.write(
+            f"{rows:>10} {mode:>8} {seconds / repeat * 1000:>10.1f} "
+            f"{seconds / repeat / rows * 1_000_000:>10.2f}"
+        )
@@ -2,16 +2,36 @@
 Script to utilise django's auto-load feature for restarting celery on any file change
 Source: https://stackoverflow.com/questions/43919166/django-and-celery-re-loading-code-into-celery
 -after-a-change
+
+One worker is started per queue of CELERY_WORKER_QUEUES, with the concurrency and the prefetch
+multiplier of its queue. Celery beat is embedded in the release worker.
 """
 
 import shlex
 import subprocess
 import sys
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils import autoreload
 
 
+def get_worker_command(name, options):
+    """
+    Return the command which starts the worker name of CELERY_WORKER_QUEUES
+    """
+
+    command = (
+        f"celery -A secure_my_spot.celeryconf worker -n {name}@%h "
+        f"-Q {','.join(options['queues'])} -c {options['concurrency']} "
+        f"--prefetch-multiplier {options['prefetch_multiplier']} --loglevel=INFO"
+    )
+    if name == "release":
+        command += " --beat"
+
+    return command
+
+
 class Command(BaseCommand):
     def handle(self, *args, **options):
         autoreload.run_with_reloader(self._restart_celery)
@@ -23,7 +43,12 @@ class Command(BaseCommand):
             cls.run("celery -A phoenix worker --loglevel=info --pool=solo")
         else:
             cls.run("pkill celery")
-            cls.run("celery -A secure_my_spot.celeryconf worker -c 2 --loglevel=INFO")
+            workers = [
+                subprocess.Popen(shlex.split(get_worker_command(name, options)))
+                for name, options in settings.CELERY_WORKER_QUEUES.items()
+            ]
+            for worker in workers:
+                worker.wait()
 
     @staticmethod
     def run(cmd):
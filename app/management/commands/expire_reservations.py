@@ -0,0 +1,48 @@
+"""
+Django command which runs the sweeper that ends the due reservations as a standalone process, as
+an alternative to the expire_due_reservations Celery beat task (see app.tasks.tasks)
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...tasks.tasks import expire_due_reservations
+
+
+class Command(BaseCommand):
+    """
+    Django command to end the reservations whose end_time has passed
+    """
+
+    help = "Release the reservations whose end_time has passed, and dispatch their charges"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=None, help="reservations ended per batch"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=None,
+            help="seconds to wait between two sweeps, defaults to RESERVATION_EXPIRY_INTERVAL",
+        )
+        parser.add_argument("--once", action="store_true", help="sweep once and exit")
+
+    def handle(self, *args, **options):
+        """
+        End the due reservations, then wait for the next ones unless --once is set
+        """
+
+        interval = options["interval"] or settings.RESERVATION_EXPIRY_INTERVAL
+
+        while True:
+            released = expire_due_reservations(options["batch_size"])
+            if released:
+                self.stdout.write(f"Released {released} reservations")
+
+            if options["once"]:
+                break
+
+            time.sleep(interval)
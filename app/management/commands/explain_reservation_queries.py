@@ -0,0 +1,239 @@
+"""
+Django command which runs EXPLAIN ANALYZE on the reservation queries of the views and tasks and
+flags the sequential scans among their plans.
+
+The queries are captured while the reservation views handle requests for a seeded dataset, and
+while the available parking spots and the due reservations are looked up like the view and the
+expiry task do, hence the plans are those of the queries the app actually runs. The seeded rows
+are rolled back once the run is complete. Do not run this command against the production
+database.
+"""
+
+from datetime import timedelta
+from random import randrange
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from ...models.archived_reservation import ArchivedReservation
+from ...models.parking_spot import ParkingSpot
+from ...models.reservation import Reservation
+from ...models.user import User
+from ...views.reservation_views import (
+    GetExpiredReservationsAuth,
+    ReservationViewAuth,
+    ReservationViewUnauth,
+)
+from .archive_reservations import archive_batch
+from .benchmark_radial_search import seed_parking_spots
+
+
+def seed_reservations(users: int, reservations_per_user: int, reserved: float):
+    """
+    Create the users, each with a history of expired reservations, one per hour going back from
+    now, and a current reservation for a share of the parking spots, each of a random user
+    """
+
+    User.objects.bulk_create(
+        (User(email=f"explain-{i}@example.com", password="!") for i in range(users)),
+        batch_size=10_000,
+    )
+    user_ids = list(
+        User.objects.filter(email__startswith="explain-").values_list("id", flat=True)
+    )
+    parking_spots = list(ParkingSpot.objects.values_list("id", "rate"))
+    now = timezone.now()
+
+    def build_reservation(user_id, parking_spot, start_time, paid):
+        return Reservation(
+            user_id=user_id,
+            email=f"user-{user_id}@example.com",
+            parking_spot_id=parking_spot[0],
+            rate=parking_spot[1],
+            start_time=start_time,
+            end_time=start_time + timedelta(minutes=30),
+            paid=paid,
+        )
+
+    Reservation.objects.bulk_create(
+        (
+            build_reservation(
+                user_id,
+                parking_spots[randrange(len(parking_spots))],
+                now - timedelta(hours=i + 1),
+                paid=True,
+            )
+            for user_id in user_ids
+            for i in range(reservations_per_user)
+        ),
+        batch_size=10_000,
+    )
+    Reservation.objects.bulk_create(
+        (
+            build_reservation(
+                user_ids[randrange(len(user_ids))],
+                parking_spot,
+                now - timedelta(minutes=10),
+                paid=False,
+            )
+            for parking_spot in parking_spots[: int(len(parking_spots) * reserved)]
+        ),
+        batch_size=10_000,
+    )
+
+
+class Command(BaseCommand):
+    """
+    Django command to explain the reservation queries of the views and tasks
+    """
+
+    help = "Run EXPLAIN ANALYZE on the reservation queries and flag sequential scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1_000, help="number of seeded users")
+        parser.add_argument(
+            "--reservations-per-user",
+            type=int,
+            default=100,
+            help="number of seeded expired reservations per user",
+        )
+        parser.add_argument(
+            "--parking-spots", type=int, default=10_000, help="number of seeded parking spots"
+        )
+        parser.add_argument(
+            "--reserved",
+            type=float,
+            default=0.5,
+            help="share of the seeded parking spots which are reserved",
+        )
+        parser.add_argument(
+            "--plans", action="store_true", help="write the full plan of each query"
+        )
+        parser.add_argument(
+            "--fail-on-seq-scan",
+            action="store_true",
+            help="exit with an error if any plan holds a sequential scan",
+        )
+
+    def handle(self, *args, **options):
+        """
+        Seed the dataset, capture the queries of each view and task, and explain them
+        """
+
+        flagged = 0
+        with transaction.atomic():
+            seed_parking_spots(options["parking_spots"])
+            seed_reservations(
+                options["users"], options["reservations_per_user"], options["reserved"]
+            )
+
+            # move the older half of the history of each user to the archive
+            archive_batch(
+                timezone.now() - timedelta(hours=options["reservations_per_user"] // 2),
+                batch_size=options["users"] * options["reservations_per_user"],
+            )
+
+            # the planner needs fresh statistics to pick the indexes
+            with connection.cursor() as cursor:
+                for model in [User, ParkingSpot, Reservation, ArchivedReservation]:
+                    cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+            for name, queries in self.capture_queries():
+                for sql in queries:
+                    flagged += self.explain(name, sql, options["plans"])
+
+            # discard the seeded users, parking spots, and reservations
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{flagged} sequential scans")
+        if flagged and options["fail_on_seq_scan"]:
+            raise CommandError(f"{flagged} sequential scans")
+
+    def capture_queries(self):
+        """
+        Yield the name and the SELECT queries of each view request and lookup
+        """
+
+        user = User.objects.get(email="explain-0@example.com")
+        active_reservation = Reservation.objects.filter(paid=False).order_by("id").first()
+        # the page after the oldest expired reservation which has not been archived continues with
+        # the archive
+        expired_reservation = (
+            Reservation.objects.filter(user=user, paid=True).order_by("start_time").first()
+        )
+        request_factory = APIRequestFactory()
+
+        def get(view, query_params=None, **kwargs):
+            request = request_factory.get("/", query_params)
+            force_authenticate(request, user=user)
+            view.as_view()(request, **kwargs).render()
+
+        runs = [
+            ("active reservations", lambda: get(ReservationViewAuth)),
+            ("expired reservations", lambda: get(GetExpiredReservationsAuth)),
+            (
+                "expired reservations page",
+                lambda: get(
+                    GetExpiredReservationsAuth, {"limit": 20, "after": expired_reservation.id}
+                ),
+            ),
+            (
+                "reservation by id and email",
+                lambda: get(
+                    ReservationViewUnauth,
+                    reservation_id=active_reservation.id,
+                    email=active_reservation.email,
+                ),
+            ),
+            # the available parking spots view runs this query on a miss of its cached response
+            (
+                "available parking spots",
+                lambda: list(ParkingSpot.objects.available().order_by("id")),
+            ),
+            # the expire_due_reservations task locks each batch of due reservations with this query,
+            # the task itself is not run, as it would release the reservations which are due and
+            # dispatch the tasks which charge and notify their customers
+            (
+                "due reservations",
+                lambda: list(
+                    Reservation.objects.due()
+                    .select_for_update(skip_locked=True)[: settings.RESERVATION_EXPIRY_BATCH_SIZE]
+                ),
+            ),
+        ]
+
+        for name, run in runs:
+            with CaptureQueriesContext(connection) as context:
+                run()
+            yield name, [
+                query["sql"]
+                for query in context.captured_queries
+                # the queries of a union start with a parenthesis
+                if query["sql"].lstrip("( ").upper().startswith("SELECT")
+            ]
+
+    def explain(self, name: str, sql: str, plans: bool) -> int:
+        """
+        Write the execution time of the query and its sequential scans, and return their number
+        """
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN ANALYZE {sql}")
+            plan = [row[0] for row in cursor.fetchall()]
+
+        seq_scans = [line.strip() for line in plan if "Seq Scan" in line]
+        execution_time = next(
+            (line for line in plan if line.startswith("Execution Time")), "Execution Time: ?"
+        )
+        self.stdout.write(
+            f"{name}: {execution_time}" + (" SEQ SCAN" if seq_scans else ""),
+            self.style.WARNING if seq_scans else None,
+        )
+        for line in plan if plans else seq_scans:
+            self.stdout.write(f"    {line}")
+
+        return len(seq_scans)
@@ -0,0 +1,86 @@
+"""
+Django command which re-drives the dead letters of the failed charges (see
+app.models.failed_charge), e.g. once a Stripe outage is over or the customers have updated their
+cards, in batches of bounded size
+"""
+
+from celery import chain
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from ...models.failed_charge import FailedCharge
+from ...models.reservation import Reservation
+from ...tasks.tasks import charge_reservations, notify_reservations
+
+
+class Command(BaseCommand):
+    """
+    Django command to re-drive the failed charges
+    """
+
+    help = "Charge the customers of the unresolved failed charges again, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="charges per task, defaults to RESERVATION_EXPIRY_BATCH_SIZE",
+        )
+        parser.add_argument(
+            "--code", default=None, help="only re-drive the charges which failed with this code"
+        )
+        parser.add_argument(
+            "--transient",
+            action="store_true",
+            help="only re-drive the charges which failed with a transient error",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="count the charges without re-driving them"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Dispatch the charge and the notification of the unresolved failed charges in batches. A
+        charge which fails again is recorded on its dead letter, one which succeeds resolves it.
+        The dead letters of deleted reservations are resolved, as there is no customer left to
+        charge.
+        """
+
+        batch_size = options["batch_size"] or settings.RESERVATION_EXPIRY_BATCH_SIZE
+
+        failed_charges = FailedCharge.objects.filter(resolved_at__isnull=True)
+        if options["code"]:
+            failed_charges = failed_charges.filter(code=options["code"])
+        if options["transient"]:
+            failed_charges = failed_charges.filter(permanent=False)
+
+        orphaned = failed_charges.filter(
+            ~Exists(Reservation.objects.filter(id=OuterRef("reservation_id")))
+        )
+        if options["dry_run"]:
+            orphaned_count = orphaned.count()
+        else:
+            orphaned_count = orphaned.update(resolved_at=timezone.now())
+        failed_charges = failed_charges.filter(
+            Exists(Reservation.objects.filter(id=OuterRef("reservation_id")))
+        )
+
+        reservation_ids = list(
+            failed_charges.order_by("id").values_list("reservation_id", flat=True)
+        )
+
+        if not options["dry_run"]:
+            for i in range(0, len(reservation_ids), batch_size):
+                chain(
+                    charge_reservations.s(reservation_ids[i : i + batch_size]),
+                    notify_reservations.s(),
+                ).apply_async()
+
+        self.stdout.write(
+            f"{'Found' if options['dry_run'] else 'Re-drove'} {len(reservation_ids)} failed "
+            f"charges, {'found' if options['dry_run'] else 'resolved'} {orphaned_count} failed "
+            "charges of deleted reservations"
+        )
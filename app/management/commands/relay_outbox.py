@@ -0,0 +1,57 @@
+"""
+Django command which runs the relay of the transactional outbox as a standalone process, as an
+alternative to the relay_outbox_messages Celery beat task (see app.outbox)
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...outbox import relay
+
+
+class Command(BaseCommand):
+    """
+    Django command to publish the pending outbox messages
+    """
+
+    help = "Publish the pending outbox messages in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=None, help="messages published per batch"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=None,
+            help="seconds to wait once the outbox is empty, defaults to OUTBOX_RELAY_INTERVAL",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="drain the outbox once and exit"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Drain the outbox, then wait for new messages unless --once is set
+        """
+
+        batch_size = options["batch_size"] or settings.OUTBOX_RELAY_BATCH_SIZE
+        interval = options["interval"] or settings.OUTBOX_RELAY_INTERVAL
+
+        while True:
+            published = 0
+            while True:
+                count = relay(batch_size)
+                published += count
+                if count < batch_size:
+                    break
+
+            if published:
+                self.stdout.write(f"Published {published} outbox messages")
+
+            if options["once"]:
+                break
+
+            time.sleep(interval)
@@ -0,0 +1,49 @@
+"""
+Django command which runs the scheduler of the reservation expiry, which dispatches the
+reservations of the Redis schedule once their end_time has passed (see app.expiry_schedule)
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...expiry_schedule import dispatch_due
+
+
+class Command(BaseCommand):
+    """
+    Django command to dispatch the due reservations of the expiry schedule
+    """
+
+    help = "Dispatch the reservations of the expiry schedule to Celery once they are due"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=None, help="reservations dispatched per task"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=None,
+            help="seconds to wait between two polls, defaults to "
+            "RESERVATION_EXPIRY_SCHEDULER_INTERVAL",
+        )
+        parser.add_argument("--once", action="store_true", help="poll once and exit")
+
+    def handle(self, *args, **options):
+        """
+        Dispatch the due reservations, then wait for the next ones unless --once is set
+        """
+
+        interval = options["interval"] or settings.RESERVATION_EXPIRY_SCHEDULER_INTERVAL
+
+        while True:
+            dispatched = dispatch_due(batch_size=options["batch_size"])
+            if dispatched:
+                self.stdout.write(f"Dispatched {dispatched} reservations")
+
+            if options["once"]:
+                break
+
+            time.sleep(interval)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_remove_reservation_stripe_payment_intent_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='parkingspot',
+            index=models.Index(fields=['lat', 'lng'], name='parking_spot_lat_lng_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_parkingspot_lat_lng_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parkingspot',
+            name='geohash',
+            field=models.CharField(blank=True, db_collation='C', default='', help_text='geohash of lat/lng, derived on save', max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='parkingspot',
+            index=models.Index(fields=['reserved', 'active', 'geohash'], name='parking_spot_geohash_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_parkingspot_geohash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='parkingspot',
+            index=models.Index(condition=models.Q(('active', True), ('reserved', False)), fields=['id'], include=('lat', 'lng', 'rate'), name='parking_spot_available_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_parkingspot_available_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parkingspot',
+            name='unit_x',
+            field=models.FloatField(help_text='unit vector of lat/lng, derived on save', null=True),
+        ),
+        migrations.AddField(
+            model_name='parkingspot',
+            name='unit_y',
+            field=models.FloatField(help_text='unit vector of lat/lng, derived on save', null=True),
+        ),
+        migrations.AddField(
+            model_name='parkingspot',
+            name='unit_z',
+            field=models.FloatField(help_text='unit vector of lat/lng, derived on save', null=True),
+        ),
+    ]
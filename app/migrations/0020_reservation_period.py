@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:29
+
+import app.models.reservation
+import django.contrib.postgres.constraints
+import django.contrib.postgres.operations
+import django.contrib.postgres.fields.ranges
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0019_parkingspot_unit_vector'),
+    ]
+
+    operations = [
+        # the exclusion constraint compares the parking_spot_id with = in a GiST index
+        django.contrib.postgres.operations.BtreeGistExtension(),
+        migrations.RemoveIndex(
+            model_name='parkingspot',
+            name='parking_spot_geohash_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='parkingspot',
+            name='parking_spot_available_idx',
+        ),
+        migrations.RemoveField(
+            model_name='parkingspot',
+            name='reserved',
+        ),
+        migrations.AddIndex(
+            model_name='parkingspot',
+            index=models.Index(fields=['active', 'geohash'], name='parking_spot_geohash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingspot',
+            index=models.Index(condition=models.Q(('active', True)), fields=['id'], include=('lat', 'lng', 'rate'), name='parking_spot_active_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.CheckConstraint(check=models.Q(('end_time__gte', models.F('start_time'))), name='reservation_end_not_before_start'),
+        ),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('paid', False)), expressions=[('parking_spot', '='), (app.models.reservation.TsTzRange('start_time', 'end_time', django.contrib.postgres.fields.ranges.RangeBoundary()), '&&')], name='reservation_no_overlap'),
+        ),
+    ]
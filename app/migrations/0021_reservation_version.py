@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0020_reservation_period'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='version',
+            field=models.PositiveIntegerField(default=1, help_text='incremented by every change of the reservation'),
+        ),
+    ]
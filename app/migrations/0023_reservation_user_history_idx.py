@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0022_outbox_message'),
+    ]
+
+    operations = [
+        # create the composite index before its leading column's index is dropped
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['user', 'paid', '-start_time', '-id'], name='reservation_user_history_idx'),
+        ),
+        migrations.AlterField(
+            model_name='reservation',
+            name='user',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
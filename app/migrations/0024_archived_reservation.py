@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0023_reservation_user_history_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedReservation',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('email', models.EmailField(max_length=254)),
+                ('rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('paid', models.BooleanField(default=True)),
+                ('stripe_setup_intent_id', models.CharField(blank=True, max_length=200)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('parking_spot', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='app.parkingspot')),
+                ('user', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-start_time', '-id'], name='archived_reservation_user_idx')],
+            },
+        ),
+    ]
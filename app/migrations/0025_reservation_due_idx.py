@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:01
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def retire_unreserve_messages(apps, schema_editor):
+    """
+    Mark the pending outbox messages which schedule the expiry of reservations as published, the
+    reservations are ended by the expire_due_reservations sweeper instead
+    """
+
+    OutboxMessage = apps.get_model("app", "OutboxMessage")
+    OutboxMessage.objects.filter(
+        topic__in=["unreserve_parking_spot", "unreserve_parking_spots"],
+        published_at__isnull=True,
+    ).update(published_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0024_archived_reservation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('paid', False)), fields=['end_time', 'id'], name='reservation_due_idx'),
+        ),
+        migrations.RunPython(retire_unreserve_messages, migrations.RunPython.noop),
+    ]
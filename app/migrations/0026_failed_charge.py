@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0025_reservation_due_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FailedCharge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('permanent', models.BooleanField()),
+                ('code', models.CharField(blank=True, max_length=100)),
+                ('error', models.TextField()),
+                ('attempts', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('reservation', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='failed_charges', to='app.reservation')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='failedcharge',
+            constraint=models.UniqueConstraint(condition=models.Q(('resolved_at__isnull', True)), fields=('reservation',), name='failed_charge_unresolved_unique'),
+        ),
+    ]
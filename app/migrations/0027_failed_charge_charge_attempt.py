@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0026_failed_charge'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='failedcharge',
+            name='charge_attempt',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
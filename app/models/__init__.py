@@ -1,3 +1,6 @@
+from .archived_reservation import ArchivedReservation
+from .failed_charge import FailedCharge
+from .outbox_message import OutboxMessage
 from .parking_spot import ParkingSpot
 from .reservation import Reservation
 from .user import User
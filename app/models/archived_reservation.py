@@ -0,0 +1,59 @@
+"""
+A model for the archive of expired reservations, see the archive_reservations command
+"""
+
+from django.db import models
+
+from .parking_spot import ParkingSpot
+from .user import User
+
+
+class ArchivedReservation(models.Model):
+    """
+    A model that represents a paid reservation which ended more than
+    RESERVATION_ARCHIVE_AFTER_DAYS days ago and has been moved out of the reservation table, hence
+    the reservation table only holds the active and the recent reservations, no matter how long
+    the history of all reservations grows.
+
+    The archive has the columns of the reservation table, including the id of the reservation,
+    plus the time it was archived. The expired reservations view reads the history of a user from
+    both tables (see app.pagination.StartTimeKeysetPagination).
+
+    Class attributes / database fields:
+    -----------------------------------
+    id: the id of the reservation
+
+    archived_at: the time the reservation was moved to the archive
+
+    See the Reservation model for the other fields.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    # the user's history is looked up by archived_reservation_user_idx, see Reservation.user
+    user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, db_index=False
+    )
+    email = models.EmailField()
+    parking_spot = models.ForeignKey(ParkingSpot, on_delete=models.PROTECT)
+    rate = models.DecimalField(decimal_places=2, max_digits=5)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    paid = models.BooleanField(default=True)
+    stripe_setup_intent_id = models.CharField(max_length=200, blank=True)
+    version = models.PositiveIntegerField(default=1)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # the archived reservations of a user, newest first
+            models.Index(
+                fields=["user", "-start_time", "-id"], name="archived_reservation_user_idx"
+            ),
+        ]
+
+    def __str__(self):
+        """
+        Return a string representation of the ArchivedReservation instance
+        """
+
+        return f"Archived reservation {self.id} for parking spot {self.parking_spot_id}"
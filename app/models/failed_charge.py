@@ -0,0 +1,71 @@
+"""
+A model for the dead letters of the charges which failed, see the redrive_failed_charges command
+"""
+
+from django.db import models
+from django.db.models import Q
+
+from .reservation import Reservation
+
+
+class FailedCharge(models.Model):
+    """
+    A model that represents a reservation whose customer could not be charged, either because the
+    error is permanent, e.g. the card has been declined, or because a transient error, e.g. a
+    Stripe outage, outlasted the retries of the charge_reservation task. The dead letters are kept
+    for reconciliation and re-driven by the redrive_failed_charges command, e.g. once the customer
+    has updated their card.
+
+    A reservation has at most one unresolved dead letter, which records each failed attempt. The
+    dead letter is resolved once the customer has been charged.
+
+    Class attributes / database fields:
+    -----------------------------------
+    reservation: the reservation whose customer could not be charged. The reservation table has
+    no foreign key constraint on it, as the reservation may be archived once the dead letter is
+    resolved (see the archive_reservations command).
+
+    permanent: whether the last error is permanent, which is not retried automatically
+
+    code: the Stripe error code of the last error, e.g. card_declined
+
+    error: the last error
+
+    attempts: the number of failed attempts to charge the customer
+
+    charge_attempt: the attempt, i.e. the idempotency key, of the next charge of the customer (see
+    utils.payments.get_next_charge_attempt)
+
+    resolved_at: the time the customer has been charged, null while the dead letter is unresolved
+    """
+
+    reservation = models.ForeignKey(
+        Reservation,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="failed_charges",
+    )
+    permanent = models.BooleanField()
+    code = models.CharField(max_length=100, blank=True)
+    error = models.TextField()
+    attempts = models.PositiveIntegerField(default=1)
+    charge_attempt = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["reservation"],
+                condition=Q(resolved_at__isnull=True),
+                name="failed_charge_unresolved_unique",
+            ),
+        ]
+
+    def __str__(self):
+        """
+        Return a string representation of the FailedCharge instance
+        """
+
+        return f"Failed charge of reservation {self.reservation_id}"
@@ -0,0 +1,59 @@
+"""
+A model for the transactional outbox of side effects, see app.outbox
+"""
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Q
+
+
+class OutboxMessage(models.Model):
+    """
+    A model that represents a side effect of a request, e.g. scheduling a Celery task or sending
+    an email, which has to be carried out once the request's transaction has been committed.
+
+    The message is written in the same transaction as the change it belongs to, hence it exists
+    if and only if the change has been committed. The relay (see app.outbox.relay) publishes the
+    pending messages in batches, outside the request path.
+
+    Class attributes / database fields:
+    -----------------------------------
+    topic: the name of the handler which publishes the message, see app.outbox.HANDLERS
+
+    payload: the JSON serializable keyword arguments of the handler
+
+    published_at: the time the relay has published the message, null while it is pending
+
+    claimed_until: the time until which a relay has claimed the pending message to publish it,
+    after which another relay may claim it, e.g. if the relay died while publishing it
+
+    attempts: the number of failed attempts to publish the message
+
+    last_error: the error of the last failed attempt
+    """
+
+    topic = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # only holds the pending messages, hence the relay reads its batches from a small
+            # index no matter how many messages have been published
+            models.Index(
+                fields=["id"],
+                condition=Q(published_at__isnull=True),
+                name="outbox_message_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        """
+        Return a string representation of the OutboxMessage instance
+        """
+
+        return f"Outbox message {self.id} ({self.topic})"
@@ -3,6 +3,96 @@ A model for parking spots that are part of the company's inventory for renting o
 """
 
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Q, Value
+from django.utils import timezone
+
+from utils.geohash import MAX_PRECISION, encode
+from utils.utils import get_chord_length, get_unit_vector
+
+
+class ParkingSpotQuerySet(models.QuerySet):
+    """
+    Custom queryset for the parking spot model
+    """
+
+    def get_reservations(self, start_time=None, end_time=None):
+        """
+        Return the Exists() expression which is True for parking spots with an unpaid reservation
+        overlapping the period [start_time, end_time), or covering the point in time start_time
+        if end_time is None. start_time defaults to now.
+        """
+
+        # avoid a circular import, the reservation model refers to the parking spot model
+        from .reservation import Reservation
+
+        return Exists(
+            Reservation.objects.filter(parking_spot=OuterRef("pk")).overlapping(
+                start_time or timezone.now(), end_time
+            )
+        )
+
+    def with_reserved(self, start_time=None, end_time=None):
+        """
+        Annotate each parking spot with reserved, which is True if an unpaid reservation overlaps
+        the period [start_time, end_time), or covers start_time if end_time is None. start_time
+        defaults to now.
+        """
+
+        return self.annotate(reserved=self.get_reservations(start_time, end_time))
+
+    def available(self, start_time=None, end_time=None):
+        """
+        Return all parking spots that are commercially available (active) and not reserved
+        during the period [start_time, end_time), or at the point in time start_time if end_time
+        is None. start_time defaults to now, i.e. the parking spots available now.
+        """
+
+        return (
+            self.alias(is_reserved=self.get_reservations(start_time, end_time))
+            .filter(is_reserved=False, active=True)
+            # the parking spots are not reserved by definition
+            .annotate(reserved=Value(False))
+        )
+
+    def within_bounding_box(self, min_lat: float, max_lat: float, lng_ranges: list):
+        """
+        Return all parking spots within the lat/lng bounding box. lng_ranges is a list of
+        inclusive (min_lng, max_lng) tuples, see utils.utils.get_bounding_box
+        """
+
+        lng_filter = Q()
+        for min_lng, max_lng in lng_ranges:
+            lng_filter |= Q(lng__gte=min_lng, lng__lte=max_lng)
+
+        return self.filter(lng_filter, lat__gte=min_lat, lat__lte=max_lat)
+
+    def within_geohash_cells(self, cells: list):
+        """
+        Return all parking spots inside any of the geohash cells, see
+        utils.geohash.get_covering_cells. Each cell is a prefix range scan on the geohash index.
+        """
+
+        geohash_filter = Q()
+        for cell in cells:
+            geohash_filter |= Q(geohash__startswith=cell)
+
+        return self.filter(geohash_filter)
+
+    def within_distance(self, lat: float, lng: float, distance: float, unit: str):
+        """
+        Return all parking spots within distance of the GPS coordinate (lat, lng). The db
+        compares the squared euclidean distance between the unit vectors of the parking spots
+        and of (lat, lng) against the squared chord length of distance, which needs no
+        trigonometric functions per row. Parking spots without a unit vector are excluded.
+        """
+
+        x, y, z = get_unit_vector(lat, lng)
+
+        return self.alias(
+            squared_chord_length=(F("unit_x") - x) * (F("unit_x") - x)
+            + (F("unit_y") - y) * (F("unit_y") - y)
+            + (F("unit_z") - z) * (F("unit_z") - z)
+        ).filter(squared_chord_length__lte=get_chord_length(distance, unit) ** 2)
 
 
 class ParkingSpot(models.Model):
@@ -18,8 +108,6 @@ class ParkingSpot(models.Model):
         Note: albeit not overly relevant, an overlapping -180th or 180th meridian is being
         avoided by making the range exclusive on the negative 180 end and inclusive on the
         positive 180 end
-    reserved: bool
-        Indicates if parking spot is reserved or whether it is available for reserving
     active: bool
         False implies that the parking spot has been taken out of the commercially available
         pool. This necessary since parking spots that have been reserved in the past cannot be
@@ -28,9 +116,21 @@ class ParkingSpot(models.Model):
         render them inactive.
     rate: decimal
         A number with 2 decimal places. Indicates the hourly USD rate for a parking spot.
+    geohash: str
+        The 12 character geohash of lat/lng, derived on save. Parking spots which share a
+        geohash prefix are located in the same geohash cell, hence a proximity search becomes a
+        range scan on the composite (active, geohash) index. The C collation ensures
+        that prefix (LIKE) queries can use the index.
+    unit_x / unit_y / unit_z: float
+        The unit vector pointing from the centre of the Earth to lat/lng, derived on save. The
+        distance between two parking spots follows from the euclidean distance between their
+        unit vectors, see utils.utils.get_chord_length.
 
     Note: lat / lng nomenclature is the same as used by Google maps
 
+    A parking spot is reserved during the periods of its unpaid reservations, see the
+    reservation model. The reserved property tells if the parking spot is reserved now.
+
     Methods
     -------------
     coordinates: str
@@ -50,10 +150,6 @@ class ParkingSpot(models.Model):
         max_digits=9,
     )
 
-    reserved = models.BooleanField(
-        help_text="Specifies if the parking spot is already reserved", default=False
-    )
-
     active = models.BooleanField(
         help_text="Is the parking spot commercially available to users", default=True
     )
@@ -62,9 +158,83 @@ class ParkingSpot(models.Model):
         help_text="hourly rate in USD with 2 decimals", decimal_places=2, max_digits=5
     )
 
+    geohash = models.CharField(
+        help_text="geohash of lat/lng, derived on save",
+        max_length=MAX_PRECISION,
+        blank=True,
+        default="",
+        db_collation="C",
+    )
+
+    unit_x = models.FloatField(help_text="unit vector of lat/lng, derived on save", null=True)
+    unit_y = models.FloatField(help_text="unit vector of lat/lng, derived on save", null=True)
+    unit_z = models.FloatField(help_text="unit vector of lat/lng, derived on save", null=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ParkingSpotQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # supports the bounding box pre-filter of the radial parking spot search
+            models.Index(fields=["lat", "lng"], name="parking_spot_lat_lng_idx"),
+            # turns proximity queries on active parking spots into index range scans
+            models.Index(fields=["active", "geohash"], name="parking_spot_geohash_idx"),
+            # only holds the active parking spots and includes the columns needed by map clients,
+            # hence the lean listing of available parking spots is an index-only scan
+            models.Index(
+                fields=["id"],
+                include=["lat", "lng", "rate"],
+                condition=Q(active=True),
+                name="parking_spot_active_idx",
+            ),
+        ]
+
+    # set by with_reserved() and available(), otherwise read from the db on first access
+    _reserved = None
+
+    # the fields derived from lat/lng
+    derived_fields = ["geohash", "unit_x", "unit_y", "unit_z"]
+
+    def set_derived_fields(self):
+        """
+        Derive the geohash and the unit vector from lat/lng. bulk_create() and bulk_update() do
+        not call save(), hence callers must call this method themselves.
+        """
+
+        lat, lng = float(self.lat), float(self.lng)
+        self.geohash = encode(lat, lng)
+        self.unit_x, self.unit_y, self.unit_z = get_unit_vector(lat, lng)
+
+    def save(self, *args, **kwargs):
+        """
+        Derive the geohash and the unit vector from lat/lng before saving the parking spot
+        """
+
+        self.set_derived_fields()
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"lat", "lng"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, *self.derived_fields}
+
+        super().save(*args, **kwargs)
+
+    @property
+    def reserved(self) -> bool:
+        """
+        Returns True if an unpaid reservation of the parking spot covers the current time
+        """
+
+        if self._reserved is None:
+            self._reserved = ParkingSpot.objects.filter(id=self.id).with_reserved()[0].reserved
+
+        return self._reserved
+
+    @reserved.setter
+    def reserved(self, reserved: bool):
+        self._reserved = reserved
+
     @property
     def get_coordinates(self) -> str:
         """
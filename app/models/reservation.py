@@ -2,12 +2,67 @@
 A model for reservations.
 """
 
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeBoundary, RangeOperators
 from django.db import models
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from django.db.models import Func, Q
+from django.utils import timezone
 
 from .parking_spot import ParkingSpot
 from .user import User
 
 
+class TsTzRange(Func):
+    """
+    The Postgres tstzrange(lower, upper, bounds) function
+    """
+
+    function = "TSTZRANGE"
+    output_field = DateTimeRangeField()
+
+
+def get_period():
+    """
+    Return the [start_time, end_time) range of a reservation. Queries must use this exact
+    expression to be able to use the GiST index of the exclusion constraint.
+    """
+
+    return TsTzRange("start_time", "end_time", RangeBoundary())
+
+
+class ReservationQuerySet(models.QuerySet):
+    """
+    Custom queryset for the reservation model
+    """
+
+    def overlapping(self, start_time, end_time=None):
+        """
+        Return all unpaid reservations whose [start_time, end_time) period overlaps the period
+        [start_time, end_time), or contains the point in time start_time if end_time is None.
+        Paid reservations have ended. The query is a lookup on the GiST index of the exclusion
+        constraint.
+        """
+
+        reservations = self.filter(paid=False).alias(period=get_period())
+
+        if end_time is None:
+            return reservations.filter(period__contains=start_time)
+
+        return reservations.filter(period__overlap=DateTimeTZRange(start_time, end_time))
+
+    def due(self, now=None):
+        """
+        Return all unpaid reservations whose end_time has passed, which are due to be ended,
+        ordered by end_time. The query is a range scan on the partial index of unpaid
+        reservations, see reservation_due_idx.
+        """
+
+        return self.filter(paid=False, end_time__lte=now or timezone.now()).order_by(
+            "end_time", "id"
+        )
+
+
 class Reservation(models.Model):
     """
     A model that represents a reservation.
@@ -49,9 +104,23 @@ class Reservation(models.Model):
     start_time: record the start time of the reservation
 
     end_time: record the end time of the reservation
+
+    version: the row version for optimistic concurrency control. Every change of the reservation
+    increments it, and amendments are conditional updates on the version the client has read,
+    see ReservationSerializer.update. The version is the ETag of the reservation.
+
+    A parking spot is reserved during the [start_time, end_time) period of each of its unpaid
+    reservations. The exclusion constraint ensures that the periods of the unpaid reservations of
+    a parking spot never overlap, hence concurrent requests cannot reserve the same parking spot
+    for the same time and parking spots can be reserved ahead of time. Once a reservation has
+    been paid for it has ended and no longer blocks its period.
     """
 
-    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    # the user's reservations are looked up by reservation_user_history_idx, whose leading
+    # column makes a separate index on the foreign key redundant
+    user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, db_index=False
+    )
     email = models.EmailField(help_text="email of the user")
     parking_spot = models.ForeignKey(ParkingSpot, on_delete=models.PROTECT)
     rate = models.DecimalField(
@@ -65,18 +134,49 @@ class Reservation(models.Model):
         help_text="issued by Stripe for setting up a setup intent",
         blank=True,
     )
+    version = models.PositiveIntegerField(
+        default=1, help_text="incremented by every change of the reservation"
+    )
+
+    objects = ReservationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # the active and the expired reservations of a user, newest first, see the reservation
+            # list views and StartTimeKeysetPagination
+            models.Index(
+                fields=["user", "paid", "-start_time", "-id"], name="reservation_user_history_idx"
+            ),
+            # the unpaid reservations in order of their end_time, see ReservationQuerySet.due(),
+            # which stays small as reservations are paid once they have ended
+            models.Index(
+                fields=["end_time", "id"], condition=Q(paid=False), name="reservation_due_idx"
+            ),
+        ]
+        constraints = [
+            # a reservation ended at its start time has an empty period, which overlaps nothing
+            models.CheckConstraint(
+                check=Q(end_time__gte=models.F("start_time")),
+                name="reservation_end_not_before_start",
+            ),
+            ExclusionConstraint(
+                name="reservation_no_overlap",
+                expressions=[
+                    ("parking_spot", RangeOperators.EQUAL),
+                    (get_period(), RangeOperators.OVERLAPS),
+                ],
+                condition=Q(paid=False),
+            ),
+        ]
 
     def __str__(self):
         """
         Return a string representation of the Reservation instance
         """
 
-        parking_spot_id = self.parking_spot.id
-        user_id = ""
-        if self.user:
-            user_id = self.user.id
-        else:
-            user_id = self.email
+        # the foreign key columns are read without fetching the related instances
+        parking_spot_id = self.parking_spot_id
+        user_id = self.user_id or self.email
         expiration_time = "{:02d}:{:02d}:{:02d}".format(
             self.end_time.hour, self.end_time.minute, self.end_time.second
         )
@@ -86,6 +186,18 @@ class Reservation(models.Model):
             f"{user_id}, expires at {expiration_time}"
         )
 
+    def save(self, *args, **kwargs):
+        """
+        Increment the version of a reservation which has been saved before
+        """
+
+        if not self._state.adding:
+            self.version += 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+
+        super().save(*args, **kwargs)
+
     @property
     def duration(self):
         """
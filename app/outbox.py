@@ -0,0 +1,121 @@
+"""
+Module for the transactional outbox of the side effects of the reservation and payment views.
+
+The views do not call Stripe or send emails themselves. Instead, they enqueue an outbox message in
+the same transaction as the reservation, and the relay, i.e. the relay_outbox_messages Celery beat
+task or the relay_outbox management command, publishes the pending messages in batches. Hence,
+Stripe and SMTP latency is not part of the request path, and a side effect is neither lost nor
+carried out for a rolled back change if a process dies half way.
+
+The end of a reservation is not a message, see the expire_due_reservations task.
+
+Messages are published at least once: if the relay dies after publishing a message but before
+marking it as published, the message is published again once its claim has expired, i.e. an
+email may be sent twice.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from utils.payments import get_stripe_payment_method_object
+from utils.send_mail import (
+    send_reservation_amendment_confirmation_mail,
+    send_reservation_confirmation_mail,
+)
+
+from .models.outbox_message import OutboxMessage
+from .models.reservation import Reservation
+
+
+def enqueue(topic: str, **payload) -> OutboxMessage:
+    """
+    Write a message to the outbox, which the relay publishes once the current transaction has
+    been committed. The payload holds the keyword arguments of the handler of the topic.
+    """
+
+    if topic not in HANDLERS:
+        raise ValueError(f"Unknown outbox topic: {topic}")
+
+    return OutboxMessage.objects.create(topic=topic, payload=payload)
+
+
+def send_confirmation_mail(reservation_id: int):
+    """
+    Send the reservation confirmation email, including the last 4 digits of the card
+    """
+
+    reservation = Reservation.objects.get(id=reservation_id)
+    payment_method = get_stripe_payment_method_object(reservation)
+
+    send_reservation_confirmation_mail(reservation, last4card=payment_method.card["last4"])
+
+
+def send_amendment_mail(reservation_id: int, end_time: str):
+    """
+    Send the email confirming the amended end_time of the reservation
+    """
+
+    reservation = Reservation.objects.get(id=reservation_id)
+    payment_method = get_stripe_payment_method_object(reservation)
+
+    send_reservation_amendment_confirmation_mail(
+        reservation, end_time=parse_datetime(end_time), last4card=payment_method.card["last4"]
+    )
+
+
+# the handler of each topic, which is called with the payload of the message as keyword arguments
+HANDLERS = {
+    "reservation_confirmation_mail": send_confirmation_mail,
+    "reservation_amendment_mail": send_amendment_mail,
+}
+
+
+def relay(batch_size: int = None) -> int:
+    """
+    Publish the next batch of pending outbox messages in order of their ids and return the number
+    of messages published.
+
+    The batch is claimed for OUTBOX_CLAIM_TIMEOUT seconds by a short transaction, which locks it
+    with SELECT ... FOR UPDATE SKIP LOCKED, hence concurrent relays publish different batches and
+    no transaction is held open while Stripe and SMTP are called. Each message is then published
+    and marked on its own, hence a failing handler, including a db error, does not undo the
+    messages published before it. A message whose handler fails stays pending and is retried by
+    the next batches until it has failed OUTBOX_MAX_ATTEMPTS times.
+    """
+
+    batch_size = batch_size or settings.OUTBOX_RELAY_BATCH_SIZE
+    now = timezone.now()
+
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(published_at__isnull=True, attempts__lt=settings.OUTBOX_MAX_ATTEMPTS)
+            .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now))
+            .order_by("id")[:batch_size]
+        )
+        OutboxMessage.objects.filter(id__in=[message.id for message in messages]).update(
+            claimed_until=now + timedelta(seconds=settings.OUTBOX_CLAIM_TIMEOUT)
+        )
+
+    published = 0
+    for message in messages:
+        try:
+            # a db error of the handler only rolls back its own savepoint
+            with transaction.atomic():
+                HANDLERS[message.topic](**message.payload)
+        except Exception as error:
+            OutboxMessage.objects.filter(id=message.id).update(
+                attempts=F("attempts") + 1, last_error=repr(error), claimed_until=None
+            )
+        else:
+            OutboxMessage.objects.filter(id=message.id).update(
+                published_at=timezone.now(), claimed_until=None
+            )
+            published += 1
+
+    return published
@@ -0,0 +1,151 @@
+"""
+Module for the pagination classes of the list views
+"""
+
+from django.db.models import Q, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def get_id(item) -> int:
+    """
+    Return the id of a model instance or of a row returned by QuerySet.values()
+    """
+
+    return item["id"] if isinstance(item, dict) else item.id
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opt-in keyset pagination ordered by id. Pagination is turned on by the limit query param,
+    without it the whole list is returned. Each page holds the first limit items with an id
+    greater than the after query param, hence fetching a page is an index range scan no matter
+    how deep the client pages, and items added or removed between requests do not shift pages:
+    available-parking-spots/?limit=500
+    available-parking-spots/?limit=500&after=1234
+
+    The paginated response body is {"next": <url of the next page or null>, "results": [...]}
+    """
+
+    limit_query_param = "limit"
+    after_query_param = "after"
+    max_limit = 1000
+
+    def get_param(self, request, name: str, minimum: int, default: int = None) -> int:
+        """
+        Return the integer value of the query param name, raising a validation error if it is not
+        an integer or smaller than minimum
+        """
+
+        value = request.query_params.get(name, default)
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValidationError({name: ["A valid integer is required."]})
+
+        if value < minimum:
+            raise ValidationError({name: [f"Ensure this value is at least {minimum}."]})
+
+        return value
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Return the page of queryset requested by the query params, or None if pagination has not
+        been requested. Lists must already be ordered by id.
+        """
+
+        if self.limit_query_param not in request.query_params:
+            return None
+
+        limit = min(self.get_param(request, self.limit_query_param, 1), self.max_limit)
+        after = self.get_param(request, self.after_query_param, 0, default=0)
+
+        # fetch one item more than the limit to find out if there is a next page
+        if isinstance(queryset, QuerySet):
+            page = list(queryset.filter(id__gt=after).order_by("id")[: limit + 1])
+        else:
+            page = [item for item in queryset if get_id(item) > after][: limit + 1]
+
+        self.request = request
+        self.next_after = get_id(page[limit - 1]) if len(page) > limit else None
+
+        return page[:limit]
+
+    def get_next_link(self):
+        """
+        Return the url of the next page, or None if this is the last page
+        """
+
+        if self.next_after is None:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.after_query_param, self.next_after)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+
+class StartTimeKeysetPagination(KeysetPagination):
+    """
+    Opt-in keyset pagination of reservations ordered by start_time descending, i.e. newest first,
+    and id descending among reservations with the same start_time. The after query param is the
+    id of the last reservation of the previous page, each page holds the first limit reservations
+    which come after it in this order:
+    expired-reservations-auth/?limit=50
+    expired-reservations-auth/?limit=50&after=1234
+
+    Only querysets can be paginated. The queryset may also be a list of the values() querysets of
+    several tables with the same columns and distinct ids, e.g. the reservation table and its
+    archive, whose pages are merged. The paginated response body is the same as
+    KeysetPagination's.
+    """
+
+    ordering = ["-start_time", "-id"]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Return the page of queryset requested by the query params, or None if pagination has not
+        been requested
+        """
+
+        if self.limit_query_param not in request.query_params:
+            return None
+
+        limit = min(self.get_param(request, self.limit_query_param, 1), self.max_limit)
+        querysets = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+
+        if self.after_query_param in request.query_params:
+            after = self.get_param(request, self.after_query_param, 1)
+
+            # the start_time of the reservation with the id after, which is in one of the tables
+            start_times = [
+                Subquery(queryset.model.objects.filter(id=after).values("start_time")[:1])
+                for queryset in querysets
+            ]
+            start_time = Coalesce(*start_times) if len(start_times) > 1 else start_times[0]
+            querysets = [
+                queryset.filter(
+                    Q(start_time__lt=start_time) | Q(start_time=start_time, id__lt=after)
+                )
+                for queryset in querysets
+            ]
+
+        # fetch one item more than the limit to find out if there is a next page, each table is
+        # read in index order up to that number of items and the page is the first items of their
+        # union
+        querysets = [queryset.order_by(*self.ordering)[: limit + 1] for queryset in querysets]
+        if len(querysets) > 1:
+            queryset = querysets[0].union(*querysets[1:], all=True)
+            queryset = queryset.order_by(*self.ordering)[: limit + 1]
+        else:
+            queryset = querysets[0]
+        page = list(queryset)
+
+        self.request = request
+        self.next_after = get_id(page[limit - 1]) if len(page) > limit else None
+
+        return page[:limit]
@@ -16,8 +16,13 @@ class ParkingSpotSerializer(serializers.ModelSerializer):
 
     created_at / updated_at:
         readonly fields
+
+    reserved:
+        readonly, derived from the reservations of the parking spot
     """
 
+    reserved = serializers.BooleanField(read_only=True)
+
     class Meta:
         model = ParkingSpot
         fields = [
@@ -100,3 +105,15 @@ class ParkingSpotSerializer(serializers.ModelSerializer):
             )
 
         return value
+
+
+class ParkingSpotDistanceSerializer(ParkingSpotSerializer):
+    """
+    Serializer for parking spots which includes the distance of each parking spot from the
+    user's location. The distance must be set as an attribute on the parking spot instance.
+    """
+
+    distance = serializers.FloatField(read_only=True)
+
+    class Meta(ParkingSpotSerializer.Meta):
+        fields = ParkingSpotSerializer.Meta.fields + ["distance"]
@@ -3,19 +3,128 @@ A module for reservation serializer class
 """
 
 from django.contrib.auth import get_user_model
-from django.db.models import ObjectDoesNotExist
-from rest_framework import serializers
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models import Manager, QuerySet
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+
+from utils.cache import bump_available_parking_spots_version
 
 from ..models.reservation import Reservation
 
 
+class ReservationVersionConflict(APIException):
+    """
+    Raised if a reservation has been changed since the client read it
+    """
+
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The reservation has been changed by another request, please reload it."
+    default_code = "conflict"
+
+
+class LoadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    A primary key related field which also accepts an instance of the related model that has been
+    loaded already, e.g. by the view, which saves the query of looking it up by its primary key
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, self.get_queryset().model):
+            return data
+
+        return super().to_internal_value(data)
+
+
+class LeanReservationListSerializer(serializers.ListSerializer):
+    """
+    The list serializer of ReservationSerializer(many=True), which renders lists of reservations
+    without DRF's per-field machinery. A queryset is read with values_list(), hence no model
+    instances are built, and each value is formatted directly by a formatter derived from the
+    field of the child serializer. The items may also be model instances or rows returned by
+    QuerySet.values().
+
+    The representation of each reservation is the same as ReservationSerializer's with the
+    default DATETIME_FORMAT.
+    """
+
+    def get_formatters(self) -> dict:
+        """
+        Return the attname and the formatter of each field of the child serializer
+        """
+
+        tz = timezone.get_current_timezone()
+
+        def format_datetime(value):
+            value = value.astimezone(tz).isoformat()
+            return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+        formatters = {}
+        for name, field in self.child.fields.items():
+            attname = Reservation._meta.get_field(field.source).attname
+            if isinstance(field, serializers.DateTimeField):
+                formatters[name] = attname, format_datetime
+            elif (
+                isinstance(field, serializers.DecimalField)
+                and api_settings.COERCE_DECIMAL_TO_STRING
+            ):
+                formatters[name] = attname, f"{{:.{field.decimal_places}f}}".format
+            else:
+                formatters[name] = attname, None
+
+        return formatters
+
+    def to_representation(self, data):
+        """
+        Return the list of the representations of the reservations
+        """
+
+        formatters = self.get_formatters()
+        names = list(formatters)
+        attnames = [attname for attname, _ in formatters.values()]
+
+        if isinstance(data, Manager):
+            data = data.all()
+        if isinstance(data, QuerySet):
+            rows = data.values_list(*attnames)
+        else:
+            rows = (
+                [row[attname] for attname in attnames]
+                if isinstance(row, dict)
+                else [getattr(row, attname) for attname in attnames]
+                for row in data
+            )
+
+        formatters = [formatter for _, formatter in formatters.values()]
+        return [
+            dict(
+                zip(
+                    names,
+                    [
+                        value if formatter is None or value is None else formatter(value)
+                        for formatter, value in zip(formatters, row)
+                    ],
+                )
+            )
+            for row in rows
+        ]
+
+
 class ReservationSerializer(serializers.ModelSerializer):
     """
-    A serializer for the reservation model.
+    A serializer for the reservation model. Lists of reservations are rendered by
+    LeanReservationListSerializer.
     """
 
+    # the views pass the parking spot and the user they have loaded already
+    serializer_related_field = LoadedPrimaryKeyRelatedField
+
     class Meta:
         model = Reservation
+        list_serializer_class = LeanReservationListSerializer
         fields = [
             "id",
             "user",
@@ -26,30 +135,72 @@ class ReservationSerializer(serializers.ModelSerializer):
             "end_time",
             "paid",
             "stripe_setup_intent_id",
+            "version",
         ]
+        read_only_fields = ["version"]
+
+    # the error raised if the reservation period overlaps another reservation of the parking spot
+    overlap_error = {"parking_spot": ["This parking spot is already reserved"]}
+
+    def save_atomically(self, save):
+        """
+        Call save() in a savepoint and turn a violation of the exclusion constraint into a
+        validation error. validate() catches overlapping reservations already, this only happens
+        if a concurrent request reserves the parking spot for an overlapping period in between.
+        """
+
+        try:
+            with transaction.atomic():
+                return save()
+        except IntegrityError as error:
+            if "reservation_no_overlap" in str(error):
+                raise serializers.ValidationError(self.overlap_error)
+            raise
 
     def create(self, validated_data):
         """
         Create a new reservation resource
         """
-        return Reservation.objects.create(**validated_data)
+        return self.save_atomically(lambda: Reservation.objects.create(**validated_data))
 
     def update(self, instance, validated_data):
         """
         Only the boolean field type "paid" and the end_time of the reservation period can be updated
+
+        The update is conditional on the version of the instance and increments it, hence two
+        concurrent updates of the same reservation cannot overwrite each other and no row lock is
+        taken. Raise ReservationVersionConflict if the reservation has been changed since the
+        instance was read.
         """
         instance.paid = validated_data.get("paid", instance.paid)
         instance.end_time = validated_data.get("end_time", instance.end_time)
         instance.stripe_setup_intent_id = validated_data.get(
             "stripe_setup_intent_id", instance.stripe_setup_intent_id
         )
-        instance.save()
+
+        updated = self.save_atomically(
+            lambda: Reservation.objects.filter(id=instance.id, version=instance.version).update(
+                paid=instance.paid,
+                end_time=instance.end_time,
+                stripe_setup_intent_id=instance.stripe_setup_intent_id,
+                version=F("version") + 1,
+            )
+        )
+        if not updated:
+            raise ReservationVersionConflict()
+
+        instance.version += 1
+
+        # QuerySet.update() does not send the post_save signal which invalidates the cache
+        transaction.on_commit(bump_available_parking_spots_version)
+
         return instance
 
     def validate(self, attrs):
         """
         Either user model instance or email must be provided but not both.
-        end_time must be strictly greater / after start_time
+        end_time must be strictly greater / after start_time.
+        The reservation period must not overlap another unpaid reservation of the parking spot.
         """
 
         # in a partial update the start_time property is not provided as only the end_time or the
@@ -67,11 +218,30 @@ class ReservationSerializer(serializers.ModelSerializer):
                         "The end_time must be strictly greater / later than the start_time"
                     )
 
+        # a partial update of other fields, e.g. the stripe_setup_intent_id, cannot add an overlap
+        if self.instance and not attrs.keys() & {"parking_spot", "start_time", "end_time", "paid"}:
+            return attrs
+
+        # in a partial update the parking spot and the period default to the instance values, the
+        # parking spot is filtered by its id without fetching it
+        parking_spot = attrs.get("parking_spot") or self.instance.parking_spot_id
+        start_time = attrs.get("start_time") or self.instance.start_time
+        end_time = attrs.get("end_time") or self.instance.end_time
+        if not attrs.get("paid", self.instance.paid if self.instance else False):
+            reservations = Reservation.objects.filter(parking_spot=parking_spot).overlapping(
+                start_time, end_time
+            )
+            if self.instance:
+                reservations = reservations.exclude(id=self.instance.id)
+            if reservations.exists():
+                raise serializers.ValidationError(self.overlap_error)
+
         return attrs
 
     def validate_parking_spot(self, parking_spot):
         """
-        The parking spot must be active and available
+        The parking spot must be active. Whether it is available for the reservation period is
+        checked by validate()
         """
 
         if not parking_spot.active:
@@ -79,9 +249,6 @@ class ReservationSerializer(serializers.ModelSerializer):
                 "This parking spot is currently not commercially available"
             )
 
-        if parking_spot.reserved:
-            raise serializers.ValidationError("This parking spot is already reserved")
-
         return parking_spot
 
     def validate_email(self, email):
@@ -95,13 +262,35 @@ class ReservationSerializer(serializers.ModelSerializer):
 
         # only run validation if the user is not authenticated
         if not self.context["user"].is_authenticated:
-            try:
-                User.objects.get(email=email)
+            if User.objects.filter(email=email).exists():
                 raise serializers.ValidationError(
                     "This email has been assigned to an existing account. Please sign into that "
                     "account to reserve your spot or use a different email address."
                 )
-            except ObjectDoesNotExist:
-                return email
 
         return email
+
+
+class BatchReservationItemSerializer(serializers.Serializer):
+    """
+    A serializer for one parking spot of a batch reservation and its reservation length in minutes
+    """
+
+    parking_spot = serializers.IntegerField(min_value=1)
+    reservation_length = serializers.IntegerField(min_value=1)
+
+
+class BatchReservationSerializer(serializers.Serializer):
+    """
+    A serializer for the request body of a batch reservation.
+
+    all_or_nothing: if True, which is the default, either all parking spots are reserved or none.
+    Otherwise, each parking spot which can be reserved is reserved.
+    """
+
+    max_batch_size = 100
+
+    reservations = serializers.ListField(
+        child=BatchReservationItemSerializer(), min_length=1, max_length=max_batch_size
+    )
+    all_or_nothing = serializers.BooleanField(default=True)
@@ -0,0 +1,52 @@
+"""
+Module for all signal receivers of the app
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from utils.cache import bump_available_parking_spots_version
+from utils.spatial_index import parking_spot_index
+
+from .models.parking_spot import ParkingSpot
+from .models.reservation import Reservation
+
+
+@receiver(post_save, sender=ParkingSpot)
+def update_parking_spot_index(sender, instance, **kwargs):
+    """
+    Keep the spatial index of the current process in sync with every saved parking spot, e.g.
+    parking spots created, moved or deactivated in the admin. The index is updated once the
+    transaction has been committed, hence a rolled back save does not change it.
+    """
+
+    transaction.on_commit(lambda: parking_spot_index.update(instance))
+
+
+@receiver(post_delete, sender=ParkingSpot)
+def remove_parking_spot_from_index(sender, instance, **kwargs):
+    """
+    Remove a deleted parking spot from the spatial index of the current process, once the
+    transaction has been committed
+    """
+
+    # the id of the instance is cleared once it has been deleted
+    parking_spot_id = instance.id
+    transaction.on_commit(lambda: parking_spot_index.remove(parking_spot_id))
+
+
+@receiver(post_save, sender=ParkingSpot)
+@receiver(post_delete, sender=ParkingSpot)
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def invalidate_available_parking_spots_cache(sender, instance, **kwargs):
+    """
+    Bump the version of the cached available parking spots whenever a parking spot or a
+    reservation is saved or deleted, e.g. a reservation made or cancelled by the reservation
+    views, a reservation ended by the expire_due_reservations task, or a parking spot changed in
+    the admin. The version is bumped once the transaction has been committed,
+    otherwise a concurrent request could cache the uncommitted state under the new version.
+    """
+
+    transaction.on_commit(bump_available_parking_spots_version)
@@ -1,47 +1,362 @@
 """
-Module for tasks associated with the reservation view
+Module for tasks associated with the reservation view, routed to the release, payments and
+notifications queues by CELERY_TASK_ROUTES
 """
 
 
-from celery import shared_task
-from django.shortcuts import get_object_or_404
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from datetime import timezone as dt_timezone
 
-from utils.payments import charge_customer
+from celery import Task, chain, shared_task
+from celery.utils.time import get_exponential_backoff_interval
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from utils.cache import bump_available_parking_spots_version
+from utils.payments import TransientChargeError, charge_customer, get_next_charge_attempt
 from utils.send_mail import send_reservation_has_ended_mail
 
-from ..models import Reservation
-from ..models.parking_spot import ParkingSpot
+from ..models import FailedCharge, Reservation
+from ..outbox import relay
+
+logger = logging.getLogger(__name__)
+
+
+def release_due_reservations(batch_size: int, reservation_ids: list = None, now=None) -> list:
+    """
+    Mark the next batch of reservations which are due at now (see ReservationQuerySet.due),
+    optionally only those of reservation_ids, as paid, which releases their periods of the
+    parking spots, and return them.
+
+    The batch is locked with SELECT ... FOR UPDATE SKIP LOCKED, hence concurrent sweepers release
+    different batches, and released with one UPDATE. The transaction is committed before the
+    customers are charged, hence no lock is held while Stripe and SMTP are called, and a
+    reservation is released once, even if charging the customer fails.
+    """
+
+    reservations = Reservation.objects.due(now)
+    if reservation_ids is not None:
+        reservations = reservations.filter(id__in=reservation_ids)
+
+    with transaction.atomic():
+        reservations = list(reservations.select_for_update(skip_locked=True)[:batch_size])
+        Reservation.objects.filter(id__in=[reservation.id for reservation in reservations]).update(
+            paid=True, version=F("version") + 1
+        )
+
+        # QuerySet.update() does not send the post_save signal which invalidates the cache
+        if reservations:
+            transaction.on_commit(bump_available_parking_spots_version)
+
+    for reservation in reservations:
+        reservation.paid = True
+        reservation.version += 1
+
+    return reservations
+
+
+def run_concurrently(function, reservations, step: str) -> tuple:
+    """
+    Call function, i.e. the step named step of the end of the reservations, with each reservation
+    and return the reservations it succeeded for and the failures, one tuple of the reservation
+    and the error per reservation it raised for.
+
+    The function waits on Stripe or SMTP rather than on the db, hence it is called concurrently by
+    a pool of at most RESERVATION_EXPIRY_WORKERS threads. A failure is logged and does not stop
+    the others.
+    """
+
+    if not reservations:
+        return [], []
+
+    succeeded = []
+    failures = []
+    max_workers = min(settings.RESERVATION_EXPIRY_WORKERS, len(reservations))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(function, reservation): reservation for reservation in reservations
+        }
+        for future in as_completed(futures):
+            reservation = futures[future]
+            error = future.exception()
+            if error is None:
+                succeeded.append(reservation)
+            else:
+                logger.error("Failed to %s reservation %s", step, reservation.id, exc_info=error)
+                failures.append((reservation, error))
+
+    return succeeded, failures
+
+
+def get_report(succeeded, failures) -> dict:
+    """
+    Return the JSON serializable report of a step of the end of the reservations, see
+    run_concurrently
+    """
+
+    return {
+        "reservation_ids": [reservation.id for reservation in succeeded],
+        "failed": [
+            {"reservation_id": reservation.id, "error": repr(error)}
+            for reservation, error in failures
+        ],
+    }
+
+
+def record_failed_charge(reservation_id, error, charge_attempt: int):
+    """
+    Record the failed charge of the reservation in its unresolved dead letter, see FailedCharge.
+    The next charge of the customer uses the idempotency key of charge_attempt.
+
+    The dead letter is inserted or updated by one INSERT ... ON CONFLICT on the partial unique
+    index of the unresolved dead letters, hence concurrent failures of the same reservation are
+    recorded on the same dead letter rather than violating failed_charge_unresolved_unique.
+    """
+
+    table = connection.ops.quote_name(FailedCharge._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (
+                reservation_id, permanent, code, error, attempts, charge_attempt, created_at,
+                updated_at
+            )
+            VALUES (%s, %s, %s, %s, 1, %s, %s, %s)
+            ON CONFLICT (reservation_id) WHERE resolved_at IS NULL DO UPDATE SET
+                permanent = EXCLUDED.permanent,
+                code = EXCLUDED.code,
+                error = EXCLUDED.error,
+                attempts = {table}.attempts + 1,
+                charge_attempt = EXCLUDED.charge_attempt,
+                updated_at = EXCLUDED.updated_at
+            """,
+            [
+                reservation_id,
+                not isinstance(error, TransientChargeError),
+                getattr(error, "code", ""),
+                repr(error),
+                charge_attempt,
+                timezone.now(),
+                timezone.now(),
+            ],
+        )
+
+
+def resolve_failed_charges(reservation_ids):
+    """
+    Resolve the dead letters of the reservations whose customers have been charged
+    """
+
+    FailedCharge.objects.filter(
+        reservation_id__in=reservation_ids, resolved_at__isnull=True
+    ).update(resolved_at=timezone.now())
+
+
+def end_reservations(reservations):
+    """
+    Dispatch the pipeline which charges the customers of the released reservations the full
+    amount (on the payments queue) and then sends them the end-of-reservation email (on the
+    notifications queue), hence the release of the next batch does not wait on Stripe or SMTP
+    """
+
+    if reservations:
+        chain(
+            charge_reservations.s([reservation.id for reservation in reservations]),
+            notify_reservations.s(),
+        ).apply_async()
 
 
 @shared_task
-def unreserve_parking_spot(parking_spot_id, reservation_id):
-    """Makes the parking spot available for renting again after a reservation has rendered it
-    unavailable. This will be achieved by retrieving the parking spot with id from database,
-    and then set its field name "reserved" to false.
+def charge_reservations(reservation_ids):
+    """Charges the customers of the released reservations of reservation_ids the full amount.
+    Returns the ids of the reservations charged, which the chain passes on to notify_reservations,
+    and the failures, see get_report.
+
+    A reservation whose charge failed with a transient error is retried by the charge_reservation
+    task, which notifies the customer once charged. The failures with a permanent error are
+    recorded as dead letters at once, as retrying them only costs worker time. A re-driven
+    reservation is charged with the idempotency key of its dead letter (see
+    FailedCharge.charge_attempt).
+    """
+
+    reservations = Reservation.objects.filter(id__in=reservation_ids, paid=True).annotate(
+        charge_attempt=Coalesce(
+            Subquery(
+                FailedCharge.objects.filter(
+                    reservation_id=OuterRef("id"), resolved_at__isnull=True
+                ).values("charge_attempt")[:1]
+            ),
+            0,
+        )
+    )
+    charged, failures = run_concurrently(
+        lambda reservation: charge_customer(reservation, reservation.charge_attempt),
+        list(reservations),
+        "charge",
+    )
+
+    resolve_failed_charges([reservation.id for reservation in charged])
+    for reservation, error in failures:
+        charge_attempt = get_next_charge_attempt(reservation.charge_attempt, error)
+        if isinstance(error, TransientChargeError):
+            countdown = get_exponential_backoff_interval(
+                settings.CHARGE_RETRY_BACKOFF, 0, settings.CHARGE_RETRY_BACKOFF_MAX, True
+            )
+            chain(
+                charge_reservation.s(reservation.id, charge_attempt).set(countdown=countdown),
+                notify_reservations.s(),
+            ).apply_async()
+        else:
+            record_failed_charge(reservation.id, error, charge_attempt)
 
-    Also, send email to user confirming that their reservation period has ended.
+    return get_report(charged, failures)
+
+
+class ChargeTask(Task):
+    """
+    Base class of the charge_reservation task, which records the charge as a dead letter once it
+    has failed for good
+    """
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        """
+        Record the failed charge, called once the retries are exhausted or the error is not
+        retried
+        """
+
+        reservation_id, charge_attempt = args
+        record_failed_charge(reservation_id, exc, get_next_charge_attempt(charge_attempt, exc))
+
+
+@shared_task(bind=True, base=ChargeTask, max_retries=settings.CHARGE_MAX_RETRIES)
+def charge_reservation(self, reservation_id, charge_attempt):
+    """Charges the customer of the released reservation the full amount, with the idempotency key
+    of charge_attempt (see utils.payments.get_next_charge_attempt). A transient error is retried
+    CHARGE_MAX_RETRIES times, after an exponential backoff with jitter, hence the retries of many
+    reservations do not hit Stripe at the same time. Returns the report of the charge, see
+    get_report.
+
+    A reservation which has been deleted since it was released is skipped, as there is no
+    customer left to charge.
+    """
+
+    reservation = Reservation.objects.filter(id=reservation_id, paid=True).first()
+    if reservation is None:
+        logger.warning("Skipped the charge of deleted reservation %s", reservation_id)
+        return get_report([], [])
+
+    try:
+        charge_customer(reservation, charge_attempt)
+    except TransientChargeError as error:
+        # the task retries itself rather than by autoretry_for, which retries with the same
+        # arguments: the retry of an error Stripe has answered needs the next charge_attempt,
+        # whereas the one of a charge whose outcome is unknown must reuse it, which cannot be
+        # derived from self.request.retries. The backoff and jitter are those of autoretry_for.
+        countdown = get_exponential_backoff_interval(
+            settings.CHARGE_RETRY_BACKOFF,
+            self.request.retries,
+            settings.CHARGE_RETRY_BACKOFF_MAX,
+            True,
+        )
+        raise self.retry(
+            args=[reservation_id, get_next_charge_attempt(charge_attempt, error)],
+            exc=error,
+            countdown=countdown,
+        )
+    resolve_failed_charges([reservation_id])
+
+    return get_report([reservation], [])
+
+
+@shared_task
+def notify_reservations(charge_report):
+    """Sends the end-of-reservation email to the customers which have been charged by
+    charge_reservations. Returns the ids of the reservations notified and the failures, see
+    get_report.
+    """
+
+    reservations = Reservation.objects.filter(id__in=charge_report["reservation_ids"])
+    notified, failures = run_concurrently(
+        send_reservation_has_ended_mail, list(reservations), "notify"
+    )
+
+    return get_report(notified, failures)
+
+
+@shared_task
+def expire_reservations(reservation_ids, now=None):
+    """Ends the reservations of reservation_ids which are due at the timestamp now, dispatched by
+    the expiry scheduler (see app.expiry_schedule) with the timestamp it has popped them at,
+    which defaults to the current time. Reservations which have been ended, amended or deleted
+    since they were scheduled are skipped. Returns the number of reservations released.
+    """
+
+    due_at = None if now is None else datetime.fromtimestamp(now, tz=dt_timezone.utc)
+    reservations = release_due_reservations(len(reservation_ids), reservation_ids, due_at)
+    end_reservations(reservations)
+
+    return len(reservations)
+
+
+@shared_task
+def expire_due_reservations(batch_size=None):
+    """Ends the reservations whose period is over. Celery beat runs this sweeper every
+    RESERVATION_EXPIRY_INTERVAL seconds, hence no task is scheduled per reservation.
+
+    Each batch of due reservations is released (see release_due_reservations), before the
+    customers are charged and sent the end-of-reservation email by the tasks of other queues (see
+    end_reservations). Each run sweeps until no reservation is due and returns the number of
+    reservations released.
+
+    The expiry scheduler (see app.expiry_schedule) ends most reservations sooner, the sweeper ends
+    those which the scheduler has missed.
 
     Params
     ------
-    parking_spot_id: the primary key of the parking_spot_instance which ought to be made
-    available again
+    batch_size: the number of reservations released per batch, defaults to
+    RESERVATION_EXPIRY_BATCH_SIZE
+    """
+
+    batch_size = batch_size or settings.RESERVATION_EXPIRY_BATCH_SIZE
+    released = 0
+
+    while True:
+        reservations = release_due_reservations(batch_size)
+        end_reservations(reservations)
+
+        released += len(reservations)
+        if len(reservations) < batch_size:
+            return released
+
+
+@shared_task
+def unreserve_parking_spot(parking_spot_id, reservation_id):
+    """Deprecated, ends the reservations which are due, see expire_due_reservations. Only kept
+    for the ETA tasks queued before the sweeper replaced them, which would otherwise fail as
+    unregistered tasks.
     """
 
-    # make parking spot available for reserving
-    parking_spot = get_object_or_404(ParkingSpot, id=parking_spot_id)
-    reservation = get_object_or_404(Reservation, id=reservation_id)
+    expire_due_reservations()
 
-    # only execute this task if the parking spot is still reserved and if it is not yet paid
-    # both are necessary only because task.revoke() does not work in the deployed app on Heroku
-    # 2nd condition is needed as it is conceivable that a long-running task in the queue executes
-    # at a time when the same parking spot is already being reserved by another customer
-    if parking_spot.reserved and not reservation.paid:
-        # charge the customer
-        charge_customer(reservation_id)
 
-        # make parking spot available for future reservations
-        parking_spot.reserved = False
-        parking_spot.save()
+@shared_task
+def unreserve_parking_spots(reservation_ids):
+    """Deprecated, see unreserve_parking_spot
+    """
+
+    expire_due_reservations()
+
+
+@shared_task
+def relay_outbox_messages():
+    """Publishes the pending outbox messages, see app.outbox. Celery beat runs this task every
+    OUTBOX_RELAY_INTERVAL seconds. Each run drains the outbox in batches until it is empty.
+    """
 
-        # send email to user confirming end of the reservation period
-        send_reservation_has_ended_mail(reservation_id)
+    while relay() == settings.OUTBOX_RELAY_BATCH_SIZE:
+        pass
@@ -5,12 +5,17 @@ test function without the need for importing the fixture into the module.
 """
 
 from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
 
+import fakeredis
 import pytest
+from django.core.cache import cache
 from faker import Faker
 from model_bakery import baker
 from rest_framework.test import APIClient
 
+from utils.spatial_index import parking_spot_index
+
 from ..models.reservation import Reservation
 from ..models.user import User
 from .factories import ParkingSpotFactory
@@ -19,6 +24,46 @@ from .factories import ParkingSpotFactory
 fake = Faker()
 
 
+@pytest.fixture(autouse=True)
+def clear_parking_spot_index():
+    """
+    Ensure that the process-local spatial index does not leak parking spots from one test into
+    the next one, given that the db is rolled back after each test
+    """
+
+    parking_spot_index.clear()
+    yield
+    parking_spot_index.clear()
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+    """
+    Run each test against an empty process-local cache rather than the shared Redis cache, such
+    that cached payloads and versions do not leak from one test into the next one
+    """
+
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def redis_connection():
+    """
+    Run each test against an empty in-memory Redis, which stands in for the Redis instance of the
+    cache that holds the expiry schedule (see app.expiry_schedule) and the locks of the
+    Idempotency-Key requests (see app.idempotency)
+    """
+
+    connection = fakeredis.FakeRedis()
+    with patch("app.expiry_schedule.get_connection", return_value=connection), patch(
+        "app.idempotency.get_connection", return_value=connection
+    ):
+        yield connection
+
+
 @pytest.fixture
 def user():
     """
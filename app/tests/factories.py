@@ -2,12 +2,16 @@
 Module for all model instance factories
 """
 
+from datetime import timedelta
+
 import factory
+from django.utils import timezone
 from faker import Factory, Faker
 
 from utils.utils import get_rand_decimal
 
 from ..models.parking_spot import ParkingSpot
+from ..models.reservation import Reservation
 from ..models.user import User
 
 # create faker instance
@@ -56,6 +60,8 @@ class ParkingSpotFactory(factory.django.DjangoModelFactory):
 
     class Meta:
         model = ParkingSpot
+        # the reserved trait creates a reservation after the parking spot has been saved
+        skip_postgeneration_save = True
 
     # Note: faker's algorithm for calculating a pydecimal returns the upper or lower bound when
     # the random decimal is above / below the upper/lower bound, thereby creating mostly lower or
@@ -66,3 +72,29 @@ class ParkingSpotFactory(factory.django.DjangoModelFactory):
     lng = get_rand_decimal(min=-179.999999, max=180, right_digits=6)
 
     rate = get_rand_decimal(min=0, max=100, right_digits=2)
+
+    class Params:
+        # ParkingSpotFactory(reserved=True) creates a parking spot with a current reservation
+        reserved = factory.Trait(
+            reservation=factory.RelatedFactory(
+                "app.tests.factories.ReservationFactory", factory_related_name="parking_spot"
+            )
+        )
+
+
+class ReservationFactory(factory.django.DjangoModelFactory):
+    """
+    A factory that generates a new reservation of a random parking spot, which started a minute
+    ago and ends in ten minutes
+    """
+
+    class Meta:
+        model = Reservation
+
+    email = factory.Faker("email")
+    parking_spot = factory.SubFactory(ParkingSpotFactory)
+    rate = factory.SelfAttribute("parking_spot.rate")
+    start_time = factory.LazyFunction(lambda: timezone.now() - timedelta(minutes=1))
+    end_time = factory.LazyAttribute(
+        lambda reservation: reservation.start_time + timedelta(minutes=11)
+    )
@@ -3,12 +3,18 @@ Testing the parking spot model
 """
 
 import copy
+from datetime import timedelta
 from decimal import Decimal
 
 import pytest
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 
 from app.models.parking_spot import ParkingSpot
-from app.tests.factories import ParkingSpotFactory
+from app.tests.factories import ParkingSpotFactory, ReservationFactory
+from utils.geohash import encode
+from utils.utils import get_unit_vector, haversine_distance
 
 pytestmark = pytest.mark.django_db
 
@@ -71,3 +77,95 @@ class TestParkingSpotModel:
             "lng": parking_spot.lng,
             "rate": parking_spot.rate,
         }
+
+    def test_derived_fields_are_derived_on_save(self, parking_spot):
+        lat, lng = float(parking_spot.lat), float(parking_spot.lng)
+        assert parking_spot.geohash == encode(lat, lng)
+        assert (parking_spot.unit_x, parking_spot.unit_y, parking_spot.unit_z) == pytest.approx(
+            get_unit_vector(lat, lng)
+        )
+
+        # moving the parking spot updates the derived fields, also if only lat/lng are saved
+        parking_spot.lat = Decimal("40.712800")
+        parking_spot.lng = Decimal("-74.006000")
+        parking_spot.save(update_fields=["lat", "lng"])
+
+        parking_spot = ParkingSpot.objects.get(id=parking_spot.id)
+        assert parking_spot.geohash == "dr5regw3ppyz"
+        assert (parking_spot.unit_x, parking_spot.unit_y, parking_spot.unit_z) == pytest.approx(
+            get_unit_vector(40.7128, -74.006)
+        )
+
+    def test_backfill_derived_fields_command(self):
+        # bulk_create() does not call save(), hence the parking spots have no derived fields
+        ParkingSpot.objects.bulk_create(
+            [ParkingSpotFactory.build(lat=40.7128, lng=-74.006) for _ in range(3)]
+        )
+
+        call_command("backfill_derived_fields", batch_size=2)
+
+        assert set(ParkingSpot.objects.values_list("geohash", flat=True)) == {"dr5regw3ppyz"}
+        assert not ParkingSpot.objects.filter(unit_x__isnull=True).exists()
+
+    @pytest.mark.parametrize(
+        "lat, lng",
+        [
+            # near the poles
+            (89.99, 0),
+            (-89.999, 120),
+            # near the antimeridian
+            (0, 179.999),
+            (-45, -179.999),
+        ],
+    )
+    def test_within_distance_matches_haversine_distance(self, lat, lng):
+        # parking spots on a grid of 0.01 deg around (lat, lng), including across the pole and
+        # the antimeridian
+        for dlat in range(-3, 4):
+            for dlng in range(-3, 4):
+                spot_lat = max(min(lat + dlat * 0.01, 90), -90)
+                spot_lng = (lng + dlng * 0.01 + 180) % 360 - 180
+                ParkingSpotFactory(lat=round(spot_lat, 6), lng=round(spot_lng, 6))
+
+        for distance in [0.5, 1, 2, 5]:
+            expected_ids = {
+                spot.id
+                for spot in ParkingSpot.objects.all()
+                if haversine_distance(lat, lng, float(spot.lat), float(spot.lng), "km")
+                <= distance
+            }
+
+            # assertions
+            assert set(
+                ParkingSpot.objects.within_distance(lat, lng, distance, "km").values_list(
+                    "id", flat=True
+                )
+            ) == expected_ids
+
+    def test_available(self, parking_spot):
+        now = timezone.now()
+        ReservationFactory(
+            parking_spot=parking_spot,
+            start_time=now + timedelta(minutes=10),
+            end_time=now + timedelta(minutes=20),
+        )
+
+        # assertions: the parking spot is reserved from 10 until 20 minutes from now
+        assert ParkingSpot.objects.available().filter(id=parking_spot.id).exists()
+        assert not parking_spot.reserved
+        assert not ParkingSpot.objects.available(now + timedelta(minutes=15)).exists()
+        assert not ParkingSpot.objects.available(now, now + timedelta(minutes=11)).exists()
+        assert ParkingSpot.objects.available(now, now + timedelta(minutes=10)).exists()
+        assert ParkingSpot.objects.available(now + timedelta(minutes=20)).exists()
+        assert ParkingSpot.objects.with_reserved(now + timedelta(minutes=10)).get().reserved
+
+    def test_reservation_no_overlap_constraint(self, parking_spot):
+        reservation = ReservationFactory(parking_spot=parking_spot)
+
+        # assertions: the db rejects overlapping unpaid reservations of a parking spot
+        with pytest.raises(IntegrityError), transaction.atomic():
+            ReservationFactory(parking_spot=parking_spot)
+
+        reservation.paid = True
+        reservation.save()
+        ReservationFactory(parking_spot=parking_spot)
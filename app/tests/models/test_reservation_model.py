@@ -3,13 +3,21 @@ Testing the reservation model
 """
 
 import pprint
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
 
 import pytest
+from django.core.management import call_command
 from django.db.models import ProtectedError
+from django.utils import timezone
 
+from app.models.archived_reservation import ArchivedReservation
+from app.models.failed_charge import FailedCharge
 from app.models.parking_spot import ParkingSpot
 from app.models.reservation import Reservation
 from app.models.user import User
+from app.tests.factories import ReservationFactory
 
 pytestmark = pytest.mark.django_db
 pp = pprint.PrettyPrinter(indent=4)
@@ -67,3 +75,75 @@ class TestParkingSpotModel:
 
     def test_method_duration(self, reservation_unauth):
         assert reservation_unauth.duration == 10
+
+    @patch("app.tasks.tasks.end_reservations")
+    def test_explain_reservation_queries_command(self, end_reservations):
+        now = timezone.now()
+        due_reservation = ReservationFactory(
+            start_time=now - timedelta(minutes=70), end_time=now - timedelta(minutes=10)
+        )
+        stdout = StringIO()
+
+        call_command(
+            "explain_reservation_queries",
+            users=3,
+            reservations_per_user=60,
+            parking_spots=20,
+            stdout=stdout,
+        )
+        output = stdout.getvalue()
+
+        # assertions: each query is explained, the seeded rows are rolled back, and the due
+        # reservation is only looked up, it is not ended
+        assert "expired reservations page: Execution Time" in output
+        assert "due reservations: Execution Time" in output
+        assert output.splitlines()[-1].endswith("sequential scans")
+        assert list(Reservation.objects.all()) == [due_reservation]
+        assert not end_reservations.called
+
+    def test_archive_reservations_command(self, settings):
+        settings.RESERVATION_ARCHIVE_AFTER_DAYS = 30
+        now = timezone.now()
+        old_reservations = [
+            ReservationFactory(
+                paid=True,
+                start_time=now - timedelta(days=31 + i),
+                end_time=now - timedelta(days=31 + i) + timedelta(hours=1),
+            )
+            for i in range(5)
+        ]
+        recent_reservation = ReservationFactory(
+            paid=True, start_time=now - timedelta(days=1), end_time=now - timedelta(hours=23)
+        )
+        active_reservation = ReservationFactory()
+        stdout = StringIO()
+
+        call_command("archive_reservations", batch_size=2, stdout=stdout)
+
+        # assertions: only the paid reservations older than 30 days are moved, unchanged
+        assert "Archived 5 reservations" in stdout.getvalue()
+        assert set(Reservation.objects.values_list("id", flat=True)) == {
+            recent_reservation.id,
+            active_reservation.id,
+        }
+        archived_reservation = ArchivedReservation.objects.get(id=old_reservations[0].id)
+        assert archived_reservation.email == old_reservations[0].email
+        assert archived_reservation.parking_spot_id == old_reservations[0].parking_spot_id
+        assert archived_reservation.end_time == old_reservations[0].end_time
+        assert archived_reservation.archived_at is not None
+
+    def test_archive_reservations_command_failed_charge(self, settings):
+        settings.RESERVATION_ARCHIVE_AFTER_DAYS = 30
+        start_time = timezone.now() - timedelta(days=31)
+        reservations = [
+            ReservationFactory(
+                paid=True, start_time=start_time, end_time=start_time + timedelta(hours=1)
+            )
+            for _ in range(2)
+        ]
+        FailedCharge.objects.create(reservation=reservations[0], permanent=True, error="declined")
+
+        call_command("archive_reservations", stdout=StringIO())
+
+        # assertions: the reservation whose charge has not been resolved is kept for re-driving
+        assert list(Reservation.objects.all()) == [reservations[0]]
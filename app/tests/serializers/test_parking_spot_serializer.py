@@ -66,7 +66,7 @@ class TestParkingSpotSerializer(TestCase):
         assert str(deserialized_data["lat"]) == self.serialized_data["lat"]
         assert str(deserialized_data["lng"]) == self.serialized_data["lng"]
         assert str(deserialized_data["rate"]) == self.serialized_data["rate"]
-        assert deserialized_data["reserved"] == self.serialized_data["reserved"]
+        assert "reserved" not in deserialized_data
 
     def test_deserialize_invalid_lat(self):
         """
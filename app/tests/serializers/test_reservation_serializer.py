@@ -7,11 +7,14 @@ from decimal import Decimal
 
 import pytest
 from django.contrib.auth.models import AnonymousUser
+from django.utils import timezone
 from rest_framework.test import APIRequestFactory
 
 from app.models.parking_spot import ParkingSpot
+from app.models.reservation import Reservation
 from app.models.user import User
 from app.serializers.reservation_serializer import ReservationSerializer
+from app.tests.factories import ReservationFactory
 
 pytestmark = pytest.mark.django_db
 
@@ -38,13 +41,26 @@ class TestReservationSerializer:
         assert Decimal(data["rate"]) == parking_spot.rate
         assert data["paid"] is False
 
+    def test_serializing_many(self, reservation_auth_user):
+        ReservationFactory(user=None, paid=True)
+        ReservationFactory(start_time=timezone.now().replace(microsecond=0), rate=Decimal("5"))
+        reservations = Reservation.objects.order_by("id")
+
+        expected_data = [ReservationSerializer(reservation).data for reservation in reservations]
+
+        # assertions: the lean list serializer renders querysets, model instances, and rows
+        # returned by values() like ReservationSerializer renders each reservation
+        assert ReservationSerializer(reservations, many=True).data == expected_data
+        assert ReservationSerializer(list(reservations), many=True).data == expected_data
+        assert ReservationSerializer(reservations.values(), many=True).data == expected_data
+
     def test_deserializing(self, reservation_auth_user):
         """
         Not testing datetime due to difficulties parsing the serialized datetime string
         """
-        # use the fixture field values as raw inputs into the serializer
-
-        start_time = datetime.now()
+        # use the fixture field values as raw inputs into the serializer, the new reservation of
+        # the parking spot starts when the reservation of the fixture ends
+        start_time = reservation_auth_user.end_time
         end_time = start_time + timedelta(minutes=10)
 
         data = {
@@ -164,14 +180,17 @@ class TestReservationSerializer:
 
     def test_validate_parking_spot_method_reserved(self, user, parking_spot):
         """
-        Reserved parking spot cannot be reserved
+        Reserved parking spot cannot be reserved for an overlapping period
         """
 
-        # render parking spot commercially unavailable
-        parking_spot.reserved = True
-        parking_spot.save()
+        # reserve the parking spot until five minutes from now
+        start_time = timezone.now()
+        ReservationFactory(
+            parking_spot=parking_spot,
+            start_time=start_time,
+            end_time=start_time + timedelta(minutes=5),
+        )
 
-        start_time = datetime.now()
         end_time = start_time + timedelta(minutes=10)
 
         data = {
@@ -188,6 +207,27 @@ class TestReservationSerializer:
         # assertions
         assert serializer.is_valid() is False
 
+    def test_validate_extension_into_next_reservation(self, reservation_auth_user):
+        """
+        A reservation cannot be extended into the next reservation of the same parking spot
+        """
+
+        ReservationFactory(
+            parking_spot=reservation_auth_user.parking_spot,
+            start_time=reservation_auth_user.end_time,
+            end_time=reservation_auth_user.end_time + timedelta(minutes=10),
+        )
+
+        # ending the reservation when the next one starts is fine, extending it is not
+        data = {"end_time": reservation_auth_user.end_time}
+        serializer = ReservationSerializer(reservation_auth_user, data=data, partial=True)
+        assert serializer.is_valid() is True
+
+        data = {"end_time": reservation_auth_user.end_time + timedelta(minutes=1)}
+        serializer = ReservationSerializer(reservation_auth_user, data=data, partial=True)
+        assert serializer.is_valid() is False
+        assert serializer.errors == {"parking_spot": ["This parking spot is already reserved"]}
+
     def test_validate_email_method_existing_account(self, user, parking_spot):
         """
         The usage of an email by an unauthenticated user, attempting to reserve a parking spot,
@@ -0,0 +1,142 @@
+"""
+Testing the Redis schedule of the reservation expiry, against an in-memory Redis and a fake clock
+"""
+
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from unittest.mock import patch
+
+import pytest
+from django.conf import settings
+from redis.exceptions import ConnectionError
+
+from app import expiry_schedule
+from app.models.reservation import Reservation
+from app.tasks.tasks import expire_reservations
+from app.tests.factories import ReservationFactory
+
+pytestmark = pytest.mark.django_db
+
+# the fake clock, a timestamp with a fractional second
+NOW = 1_700_000_000.25
+
+
+def create_reservation(seconds):
+    """
+    Return a new reservation which ends seconds after NOW
+    """
+
+    end_time = datetime.fromtimestamp(NOW + seconds, tz=dt_timezone.utc)
+    return ReservationFactory(start_time=end_time - timedelta(hours=1), end_time=end_time)
+
+
+def schedule(django_capture_on_commit_callbacks, *reservations):
+    """
+    Schedule the reservations, the schedule is written once the transaction has been committed
+    """
+
+    with django_capture_on_commit_callbacks(execute=True):
+        expiry_schedule.schedule(*reservations)
+
+
+@patch("app.expiry_schedule.expire_reservations.delay")
+class TestExpirySchedule:
+    def test_dispatch_due(self, delay, django_capture_on_commit_callbacks):
+        reservations = [create_reservation(seconds) for seconds in (0.5, 1.5)]
+        schedule(django_capture_on_commit_callbacks, *reservations)
+
+        # assertions: each reservation is dispatched once, within a second of its end_time
+        assert expiry_schedule.dispatch_due(now=NOW) == 0
+        assert expiry_schedule.dispatch_due(now=NOW + 0.5) == 1
+        delay.assert_called_once_with([reservations[0].id], NOW + 0.5)
+        assert expiry_schedule.dispatch_due(now=NOW + 1) == 0
+        assert expiry_schedule.dispatch_due(now=NOW + 2) == 1
+        delay.assert_called_with([reservations[1].id], NOW + 2)
+        assert expiry_schedule.dispatch_due(now=NOW + 3) == 0
+
+    def test_amendment_rescores_reservation(
+        self, delay, django_capture_on_commit_callbacks, redis_connection
+    ):
+        reservation = create_reservation(1)
+        schedule(django_capture_on_commit_callbacks, reservation)
+
+        reservation.end_time += timedelta(seconds=10)
+        schedule(django_capture_on_commit_callbacks, reservation)
+
+        # assertions: the amendment replaces the score, it does not add another member
+        assert redis_connection.zcard(settings.RESERVATION_EXPIRY_SCHEDULE_KEY) == 1
+        assert expiry_schedule.dispatch_due(now=NOW + 2) == 0
+        assert expiry_schedule.dispatch_due(now=NOW + 11) == 1
+        delay.assert_called_once_with([reservation.id], NOW + 11)
+
+    def test_dispatch_due_in_batches(self, delay, django_capture_on_commit_callbacks):
+        reservations = [create_reservation(seconds / 10) for seconds in range(5)]
+        schedule(django_capture_on_commit_callbacks, *reservations)
+
+        # assertions: the batches are dispatched in order of the end_time
+        assert expiry_schedule.dispatch_due(now=NOW + 1, batch_size=2) == 5
+        assert [call.args[0] for call in delay.call_args_list] == [
+            [reservations[0].id, reservations[1].id],
+            [reservations[2].id, reservations[3].id],
+            [reservations[4].id],
+        ]
+
+    def test_schedule_redis_unreachable(
+        self, delay, django_capture_on_commit_callbacks, redis_connection, caplog
+    ):
+        reservation = create_reservation(1)
+
+        # the reservation is left to the expire_due_reservations sweeper
+        with patch.object(redis_connection, "zadd", side_effect=ConnectionError()):
+            schedule(django_capture_on_commit_callbacks, reservation)
+
+        # assertions
+        assert "Failed to schedule the expiry of 1 reservations" in caplog.text
+        assert expiry_schedule.dispatch_due(now=NOW + 2) == 0
+
+    def test_create_reservation_view(
+        self, delay, client, parking_spot, django_capture_on_commit_callbacks, redis_connection
+    ):
+        path = f"/reservation-unauth/{parking_spot.id}/"
+        data = {"reservation": {"reservation_length": 10, "email": "test@test.com"}}
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(path=path, data=data, format="json")
+
+        # assertions: the reservation is scored by its end_time
+        reservation = Reservation.objects.get(id=response.json()["id"])
+        assert redis_connection.zscore(
+            settings.RESERVATION_EXPIRY_SCHEDULE_KEY, reservation.id
+        ) == pytest.approx(reservation.end_time.timestamp())
+
+
+class TestExpireReservations:
+    @patch("app.tasks.tasks.end_reservations")
+    def test_expire_reservations(self, end_reservations):
+        now = datetime.now(tz=dt_timezone.utc)
+        due_reservation = ReservationFactory(
+            start_time=now - timedelta(minutes=70), end_time=now - timedelta(minutes=10)
+        )
+        amended_reservation = ReservationFactory(end_time=now + timedelta(minutes=10))
+
+        # the amended reservation has been dispatched with its previous end_time
+        released = expire_reservations([due_reservation.id, amended_reservation.id, 1234567])
+
+        # assertions: only the due reservation is ended
+        assert released == 1
+        end_reservations.assert_called_once_with([due_reservation])
+        assert list(Reservation.objects.filter(paid=True)) == [due_reservation]
+
+    @patch("app.tasks.tasks.end_reservations")
+    def test_expire_reservations_clock_skew(self, end_reservations):
+        # the reservation is due by the clock of the scheduler, which is ahead of the worker's
+        end_time = datetime.now(tz=dt_timezone.utc) + timedelta(seconds=1)
+        reservation = ReservationFactory(
+            start_time=end_time - timedelta(hours=1), end_time=end_time
+        )
+
+        released = expire_reservations([reservation.id], end_time.timestamp())
+
+        # assertions: the reservation is ended rather than left to the sweeper
+        assert released == 1
+        end_reservations.assert_called_once_with([reservation])
@@ -0,0 +1,126 @@
+"""
+Testing the transactional outbox and its relay
+"""
+
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from django.db import connection
+from django.utils import timezone
+
+from app import outbox
+from app.models.outbox_message import OutboxMessage
+from app.tasks.tasks import relay_outbox_messages
+
+pytestmark = pytest.mark.django_db
+
+
+class TestOutbox:
+    @patch("app.outbox.send_reservation_amendment_confirmation_mail")
+    @patch("app.outbox.get_stripe_payment_method_object")
+    def test_relay(self, get_payment_method, send_mail, reservation_unauth):
+        get_payment_method.return_value.card = {"last4": "4242"}
+        message = outbox.enqueue(
+            "reservation_amendment_mail",
+            reservation_id=reservation_unauth.id,
+            end_time=reservation_unauth.end_time,
+        )
+
+        # assertions: the email is sent, the JSON payload holds the end_time to the millisecond
+        assert outbox.relay() == 1
+        send_mail.assert_called_once_with(
+            reservation_unauth,
+            end_time=reservation_unauth.end_time.replace(
+                microsecond=reservation_unauth.end_time.microsecond // 1000 * 1000
+            ),
+            last4card="4242",
+        )
+        message.refresh_from_db()
+        assert message.published_at is not None
+
+        # published messages are not published again
+        assert outbox.relay() == 0
+        send_mail.assert_called_once()
+
+    @patch("app.outbox.get_stripe_payment_method_object")
+    def test_relay_failure(self, get_payment_method, reservation_unauth, settings):
+        settings.OUTBOX_MAX_ATTEMPTS = 2
+        get_payment_method.side_effect = ConnectionError("Stripe unreachable")
+        message = outbox.enqueue(
+            "reservation_confirmation_mail", reservation_id=reservation_unauth.id
+        )
+
+        # assertions: the message stays pending until it has failed OUTBOX_MAX_ATTEMPTS times
+        for _ in range(3):
+            assert outbox.relay() == 0
+        message.refresh_from_db()
+        assert message.published_at is None
+        assert message.attempts == 2
+        assert "Stripe unreachable" in message.last_error
+        assert get_payment_method.call_count == 2
+
+    @patch("app.outbox.send_reservation_confirmation_mail")
+    @patch("app.outbox.get_stripe_payment_method_object")
+    def test_relay_outbox_messages_drains_outbox_in_batches(
+        self, get_payment_method, send_mail, reservation_unauth, settings
+    ):
+        settings.OUTBOX_RELAY_BATCH_SIZE = 2
+        for _ in range(5):
+            outbox.enqueue("reservation_confirmation_mail", reservation_id=reservation_unauth.id)
+
+        relay_outbox_messages()
+
+        # assertions
+        assert not OutboxMessage.objects.filter(published_at__isnull=True).exists()
+        assert send_mail.call_count == 5
+
+    @patch("app.outbox.send_reservation_confirmation_mail")
+    @patch("app.outbox.get_stripe_payment_method_object")
+    def test_relay_db_error(self, get_payment_method, send_mail, reservation_unauth):
+        messages = [
+            outbox.enqueue("reservation_confirmation_mail", reservation_id=reservation_unauth.id)
+            for _ in range(2)
+        ]
+
+        def send(*args, **kwargs):
+            if send_mail.call_count == 1:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT * FROM missing_table")
+
+        send_mail.side_effect = send
+
+        # assertions: the db error only fails its own message, the other one is published
+        assert outbox.relay() == 1
+        for message in messages:
+            message.refresh_from_db()
+        assert messages[0].published_at is None
+        assert messages[0].attempts == 1
+        assert "missing_table" in messages[0].last_error
+        assert messages[1].published_at is not None
+
+    @patch("app.outbox.send_reservation_confirmation_mail")
+    @patch("app.outbox.get_stripe_payment_method_object")
+    def test_relay_claimed_messages(self, get_payment_method, send_mail, reservation_unauth):
+        messages = [
+            outbox.enqueue("reservation_confirmation_mail", reservation_id=reservation_unauth.id)
+            for _ in range(2)
+        ]
+        # the messages have been claimed by another relay, whose claim of the second one expired
+        now = timezone.now()
+        OutboxMessage.objects.filter(id=messages[0].id).update(
+            claimed_until=now + timedelta(minutes=1)
+        )
+        OutboxMessage.objects.filter(id=messages[1].id).update(
+            claimed_until=now - timedelta(minutes=1)
+        )
+
+        # assertions: only the message whose claim expired is published
+        assert outbox.relay() == 1
+        assert list(
+            OutboxMessage.objects.filter(published_at__isnull=False).values_list("id", flat=True)
+        ) == [messages[1].id]
+
+    def test_enqueue_unknown_topic(self):
+        with pytest.raises(ValueError):
+            outbox.enqueue("unknown")
@@ -2,37 +2,356 @@
 Testing Celery tasks
 """
 
-from unittest.mock import patch
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import MagicMock, patch
 
 import pytest
+import stripe
+from django.conf import settings
+from django.core import mail
+from django.core.management import call_command
+from django.utils import timezone
 
-from app.models.parking_spot import ParkingSpot
-from app.tasks.tasks import unreserve_parking_spot
+from app.models.failed_charge import FailedCharge
+from app.models.reservation import Reservation
+from app.tasks.tasks import (
+    charge_reservation,
+    charge_reservations,
+    expire_due_reservations,
+    notify_reservations,
+    unreserve_parking_spot,
+)
+from app.tests.factories import ReservationFactory
+from secure_my_spot.celeryconf import app as celery_app
+from utils.payments import PermanentChargeError, TransientChargeError
 
 pytestmark = pytest.mark.django_db
 
 
+def create_due_reservation(**kwargs):
+    """
+    Return a new reservation which ended ten minutes ago
+    """
+
+    now = timezone.now()
+    return ReservationFactory(
+        start_time=now - timedelta(minutes=70), end_time=now - timedelta(minutes=10), **kwargs
+    )
+
+
+@pytest.fixture
+def celery_eager():
+    """
+    Run the tasks published by the tested task in the same process, rather than on the workers
+    """
+
+    celery_app.conf.task_always_eager = True
+    yield
+    celery_app.conf.task_always_eager = False
+
+
+@pytest.mark.usefixtures("celery_eager")
 class TestTasks:
     @patch("app.tasks.tasks.send_reservation_has_ended_mail")
     @patch("app.tasks.tasks.charge_customer")
-    def test_unreserve_parking_spot(
-        self, charge_customer, send_reservation_has_ended_mail, reservation_unauth
+    def test_expire_due_reservations(self, charge_customer, send_reservation_has_ended_mail):
+        due_reservation = create_due_reservation()
+        pending_reservation = ReservationFactory(end_time=timezone.now() + timedelta(minutes=10))
+
+        released = expire_due_reservations()
+
+        # assertions: only the due reservation is released, charged and notified
+        assert released == 1
+        charge_customer.assert_called_once_with(due_reservation, 0)
+        send_reservation_has_ended_mail.assert_called_once_with(due_reservation)
+        due_reservation.refresh_from_db()
+        pending_reservation.refresh_from_db()
+        assert due_reservation.paid is True
+        assert due_reservation.version == 2
+        assert pending_reservation.paid is False
+
+    @patch("app.tasks.tasks.send_reservation_has_ended_mail")
+    @patch("app.tasks.tasks.charge_customer")
+    def test_expire_due_reservations_in_batches(
+        self, charge_customer, send_reservation_has_ended_mail
+    ):
+        for _ in range(5):
+            create_due_reservation()
+
+        # assertions: one run sweeps all batches and a second run finds nothing to end
+        assert expire_due_reservations(batch_size=2) == 5
+        assert expire_due_reservations(batch_size=2) == 0
+        assert charge_customer.call_count == 5
+        assert not Reservation.objects.filter(paid=False).exists()
+
+    @patch("app.tasks.tasks.notify_reservations.s")
+    @patch("app.tasks.tasks.charge_reservations.s")
+    def test_expire_due_reservations_pipeline(self, charge_reservations, notify_reservations):
+        reservations = [create_due_reservation() for _ in range(3)]
+
+        with patch("app.tasks.tasks.chain") as chain:
+            expire_due_reservations(batch_size=2)
+
+        # assertions: each batch is passed on to the payments and then the notifications queue
+        charge_reservations.assert_any_call([reservation.id for reservation in reservations[:2]])
+        charge_reservations.assert_called_with([reservations[2].id])
+        chain.assert_called_with(
+            charge_reservations.return_value, notify_reservations.return_value
+        )
+        assert chain.return_value.apply_async.call_count == 2
+
+    @patch("app.tasks.tasks.send_reservation_has_ended_mail")
+    @patch("app.tasks.tasks.charge_customer")
+    def test_charge_reservations_failure(
+        self, charge_customer, send_reservation_has_ended_mail, caplog
     ):
-        # extract arguments for unreserve_parking_spot task
-        parking_spot_id = reservation_unauth.parking_spot.id
-        reservation_id = reservation_unauth.id
+        failing_reservation = create_due_reservation(paid=True)
+        reservations = [create_due_reservation(paid=True) for _ in range(3)]
+
+        def charge(reservation, charge_attempt):
+            if reservation == failing_reservation:
+                raise Exception("Stripe is down")
 
-        # set parking spot reserved field to true
-        parking_spot = ParkingSpot.objects.get(id=parking_spot_id)
-        parking_spot.reserved = True
-        parking_spot.save()
+        charge_customer.side_effect = charge
 
-        # call method to be tested
-        unreserve_parking_spot(parking_spot_id, reservation_id)
+        report = charge_reservations(
+            [failing_reservation.id] + [reservation.id for reservation in reservations]
+        )
+        notify_reservations(report)
+
+        # assertions: the failure is reported and logged, does not stop the batch, and only the
+        # customers which have been charged are notified
+        assert sorted(report["reservation_ids"]) == [
+            reservation.id for reservation in reservations
+        ]
+        assert report["failed"] == [
+            {"reservation_id": failing_reservation.id, "error": "Exception('Stripe is down')"}
+        ]
+        assert f"Failed to charge reservation {failing_reservation.id}" in caplog.text
+        notified = [call.args[0] for call in send_reservation_has_ended_mail.call_args_list]
+        assert sorted(reservation.id for reservation in notified) == [
+            reservation.id for reservation in reservations
+        ]
+
+    @patch("app.tasks.tasks.send_reservation_has_ended_mail")
+    @patch("app.tasks.tasks.charge_customer")
+    def test_charge_reservations_concurrency(
+        self, charge_customer, send_reservation_has_ended_mail, settings
+    ):
+        settings.RESERVATION_EXPIRY_WORKERS = 3
+        reservations = [create_due_reservation(paid=True) for _ in range(10)]
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def charge(reservation, charge_attempt):
+            # a slow Stripe call
+            with lock:
+                running.append(reservation)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(reservation)
+
+        charge_customer.side_effect = charge
+
+        report = charge_reservations([reservation.id for reservation in reservations])
+
+        # assertions: the customers are charged concurrently by at most 3 threads
+        assert len(report["reservation_ids"]) == 10
+        assert max(peak) == 3
+
+    @patch("app.tasks.tasks.send_reservation_has_ended_mail")
+    @patch("app.tasks.tasks.charge_customer")
+    def test_charge_reservations_transient_error(
+        self, charge_customer, send_reservation_has_ended_mail
+    ):
+        reservation = create_due_reservation(paid=True)
+        charge_customer.side_effect = [TransientChargeError("rate limited"), None]
+
+        report = charge_reservations([reservation.id])
+
+        # assertions: the charge is retried by charge_reservation, which notifies the customer
+        assert report["reservation_ids"] == []
+        assert charge_customer.call_count == 2
+        send_reservation_has_ended_mail.assert_called_once_with(reservation)
+        assert not FailedCharge.objects.exists()
+
+    @patch("app.tasks.tasks.send_reservation_has_ended_mail")
+    @patch("app.tasks.tasks.charge_customer")
+    def test_charge_reservations_retries_exhausted(
+        self, charge_customer, send_reservation_has_ended_mail
+    ):
+        reservation = create_due_reservation(paid=True)
+        charge_customer.side_effect = TransientChargeError("Stripe is down")
+
+        # the eager retries raise the last error in the calling task
+        with pytest.raises(TransientChargeError):
+            charge_reservations([reservation.id])
+
+        # assertions: the first attempt and the retries of charge_reservation failed, and the
+        # charge has been recorded as a dead letter
+        assert charge_customer.call_count == 2 + settings.CHARGE_MAX_RETRIES
+        assert not send_reservation_has_ended_mail.called
+        failed_charge = FailedCharge.objects.get()
+        assert failed_charge.reservation_id == reservation.id
+        assert failed_charge.permanent is False
+        assert failed_charge.resolved_at is None
+
+    @patch("app.tasks.tasks.send_reservation_has_ended_mail")
+    @patch("app.tasks.tasks.charge_customer")
+    def test_charge_reservations_permanent_error(
+        self, charge_customer, send_reservation_has_ended_mail
+    ):
+        reservation = create_due_reservation(paid=True)
+        charge_customer.side_effect = PermanentChargeError("declined", code="card_declined")
+
+        charge_reservations([reservation.id])
+        charge_reservations([reservation.id])
+
+        # assertions: the charge is not retried, each attempt is recorded on one dead letter and
+        # uses a new idempotency key, as Stripe would replay the declined charge otherwise
+        assert [call.args[1] for call in charge_customer.call_args_list] == [0, 1]
+        failed_charge = FailedCharge.objects.get()
+        assert failed_charge.permanent is True
+        assert failed_charge.code == "card_declined"
+        assert failed_charge.attempts == 2
+        assert failed_charge.charge_attempt == 2
+
+    @pytest.mark.parametrize(
+        "error, keys",
+        [
+            (
+                stripe.error.APIError("internal error", http_status=500),
+                ["charge-0", "charge-1"],
+            ),
+            (stripe.error.APIConnectionError("network error"), ["charge-0", "charge-0"]),
+        ],
+    )
+    @patch("app.tasks.tasks.send_reservation_has_ended_mail")
+    @patch("utils.payments.stripe.PaymentIntent.create")
+    @patch("utils.payments.stripe.SetupIntent.retrieve")
+    def test_charge_reservations_retry_idempotency_key(
+        self, retrieve, create, send_reservation_has_ended_mail, error, keys
+    ):
+        reservation = create_due_reservation(paid=True)
+        create.side_effect = [error, None]
+
+        charge_reservations([reservation.id])
+
+        # assertions: the retry of an error Stripe has answered uses a new idempotency key, the
+        # retry of a charge whose outcome is unknown reuses it
+        assert [call.kwargs["idempotency_key"] for call in create.call_args_list] == [
+            f"reservation-{reservation.id}-{key}" for key in keys
+        ]
+        send_reservation_has_ended_mail.assert_called_once_with(reservation)
+
+    @patch("app.tasks.tasks.charge_customer")
+    def test_charge_reservation_deleted(self, charge_customer):
+        reservation = create_due_reservation(paid=True)
+        reservation.delete()
+
+        report = charge_reservation(reservation.id, 0)
+
+        # assertions: the deleted reservation is skipped rather than recorded as a dead letter
+        assert report == {"reservation_ids": [], "failed": []}
+        assert not charge_customer.called
+        assert not FailedCharge.objects.exists()
+
+    @patch("app.tasks.tasks.send_reservation_has_ended_mail")
+    @patch("app.tasks.tasks.charge_customer")
+    def test_redrive_failed_charges_command(
+        self, charge_customer, send_reservation_has_ended_mail
+    ):
+        reservations = [create_due_reservation(paid=True) for _ in range(3)]
+        for reservation in reservations:
+            FailedCharge.objects.create(
+                reservation=reservation,
+                permanent=True,
+                code="card_declined",
+                error="declined",
+                charge_attempt=1,
+            )
+        stdout = StringIO()
+
+        call_command("redrive_failed_charges", batch_size=2, stdout=stdout)
+
+        # assertions: the customers are charged with the idempotency key of their dead letter and
+        # notified, which resolves the dead letters
+        assert "Re-drove 3 failed charges" in stdout.getvalue()
+        assert [call.args[1] for call in charge_customer.call_args_list] == [1, 1, 1]
+        assert send_reservation_has_ended_mail.call_count == 3
+        assert not FailedCharge.objects.filter(resolved_at__isnull=True).exists()
+
+    @patch("app.tasks.tasks.charge_customer")
+    def test_redrive_failed_charges_command_deleted_reservation(self, charge_customer):
+        reservation = create_due_reservation(paid=True)
+        FailedCharge.objects.create(
+            reservation=reservation, permanent=True, code="card_declined", error="declined"
+        )
+        reservation.delete()
+        stdout = StringIO()
+
+        call_command("redrive_failed_charges", stdout=stdout)
+
+        # assertions: the dead letter of the deleted reservation is resolved rather than re-driven
+        assert "resolved 1 failed charges of deleted reservations" in stdout.getvalue()
+        assert not charge_customer.called
+        assert not FailedCharge.objects.filter(resolved_at__isnull=True).exists()
+
+    @patch("app.tasks.tasks.send_reservation_has_ended_mail")
+    @patch("app.tasks.tasks.charge_customer")
+    def test_unreserve_parking_spot(self, charge_customer, send_reservation_has_ended_mail):
+        due_reservation = create_due_reservation()
+
+        # a task scheduled before the sweeper replaced it ends the due reservations
+        unreserve_parking_spot(due_reservation.parking_spot_id, due_reservation.id)
+
+        # assertions
+        charge_customer.assert_called_once_with(due_reservation, 0)
+
+    @pytest.mark.parametrize(
+        "task, queue",
+        [
+            ("expire_due_reservations", "release"),
+            ("expire_reservations", "release"),
+            ("charge_reservations", "payments"),
+            ("charge_reservation", "payments"),
+            ("notify_reservations", "notifications"),
+            ("relay_outbox_messages", "notifications"),
+        ],
+    )
+    def test_task_routes(self, task, queue):
+        route = celery_app.amqp.router.route({}, f"app.tasks.tasks.{task}")
+
+        # assertions
+        assert route["queue"].name == queue
+
+    @pytest.mark.parametrize("count", [1, 5])
+    @patch("utils.payments.stripe")
+    def test_expire_due_reservations_query_count(
+        self, stripe, count, django_assert_num_queries
+    ):
+        stripe.PaymentMethod.retrieve.return_value = MagicMock(card={"last4": "4242"})
+        for _ in range(count):
+            create_due_reservation()
 
-        # retrieve parking spot from db
-        reserved_parking_spot = ParkingSpot.objects.get(id=parking_spot_id)
+        # the due reservations are locked and released by one update, plus the savepoints of the
+        # atomic block, the charge and the notification task load them with one query each, and
+        # the charge task resolves their dead letters with one update
+        with django_assert_num_queries(7):
+            expire_due_reservations()
 
         # assertions
-        assert reserved_parking_spot.reserved is False
-        assert send_reservation_has_ended_mail.called
+        assert Reservation.objects.filter(paid=True).count() == count
+        assert stripe.PaymentIntent.create.call_count == count
+        assert len(mail.outbox) == count
+        # the emails are sent concurrently, hence in any order
+        for reservation in Reservation.objects.all():
+            assert any(
+                f"parking spot {reservation.parking_spot_id} has now ended" in message.body
+                for message in mail.outbox
+            )
@@ -0,0 +1,44 @@
+"""
+Testing the versioned cache of the available parking spots
+"""
+
+import pytest
+from django.core.cache import cache
+
+from utils.cache import (
+    AVAILABLE_PARKING_SPOTS_VERSION_KEY,
+    bump_available_parking_spots_version,
+    get_available_parking_spots_version,
+)
+
+from ..factories import ParkingSpotFactory
+
+
+class TestCache:
+    """
+    Test suite for the version of the available parking spots
+    """
+
+    def test_bump_version(self):
+        version = get_available_parking_spots_version()
+
+        # assertions
+        assert bump_available_parking_spots_version() == version + 1
+        assert get_available_parking_spots_version() == version + 1
+
+    def test_bump_evicted_version(self):
+        version = get_available_parking_spots_version()
+        cache.delete(AVAILABLE_PARKING_SPOTS_VERSION_KEY)
+
+        # assertions: the new version is not one that has been used before
+        assert bump_available_parking_spots_version() > version
+
+    @pytest.mark.django_db(transaction=True)
+    def test_saving_and_deleting_parking_spots_bumps_version(self):
+        version = get_available_parking_spots_version()
+
+        parking_spot = ParkingSpotFactory()
+        assert get_available_parking_spots_version() == version + 1
+
+        parking_spot.delete()
+        assert get_available_parking_spots_version() == version + 2
@@ -0,0 +1,52 @@
+"""
+Testing the geohash utility functions
+"""
+
+import pytest
+
+from utils.geohash import encode, get_cell_size, get_covering_cells
+from utils.utils import get_bounding_box
+
+
+class TestGeohash:
+    """
+    Test suite for encoding GPS coordinates as geohashes
+    """
+
+    @pytest.mark.parametrize(
+        "lat, lng, geohash",
+        [
+            # https://en.wikipedia.org/wiki/Geohash
+            (57.64911, 10.40744, "u4pruydqqvj"),
+            (40.7128, -74.006, "dr5regw3ppyz"),
+            (-90, -180, "000000000000"),
+        ],
+    )
+    def test_encode(self, lat, lng, geohash):
+        assert encode(lat, lng, len(geohash)) == geohash
+
+    def test_get_cell_size(self):
+        # assertions: 5 lng bits and 5 lat bits for 2 characters
+        assert get_cell_size(1) == (45, 45)
+        assert get_cell_size(2) == (180 / 32, 360 / 32)
+
+    def test_covering_cells_contain_bounding_box(self):
+        lat, lng = 40.7128, -74.006
+        min_lat, max_lat, lng_ranges = get_bounding_box(lat, lng, 1, "km")
+
+        cells = get_covering_cells(min_lat, max_lat, lng_ranges)
+
+        # assertions: the corners of the bounding box are inside the covering cells
+        assert len(cells) <= 16
+        for corner_lat in (min_lat, max_lat):
+            for corner_lng in lng_ranges[0]:
+                assert any(encode(corner_lat, corner_lng).startswith(cell) for cell in cells)
+
+    def test_covering_cells_across_antimeridian(self):
+        min_lat, max_lat, lng_ranges = get_bounding_box(0, 179.99, 10, "km")
+
+        cells = get_covering_cells(min_lat, max_lat, lng_ranges)
+
+        # assertions
+        assert any(encode(0, 179.99).startswith(cell) for cell in cells)
+        assert any(encode(0, -179.99).startswith(cell) for cell in cells)
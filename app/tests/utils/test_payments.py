@@ -0,0 +1,82 @@
+"""
+Testing the classification of the errors of the charges
+"""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+import stripe
+
+from utils.payments import (
+    PermanentChargeError,
+    TransientChargeError,
+    charge_customer,
+    classify_stripe_error,
+    get_next_charge_attempt,
+)
+
+
+class TestClassifyStripeError:
+    @pytest.mark.parametrize(
+        "error",
+        [
+            stripe.error.APIConnectionError("network error"),
+            stripe.error.RateLimitError("too many requests", http_status=429),
+            stripe.error.APIError("internal error", http_status=500),
+            stripe.error.InvalidRequestError("bad gateway", None, http_status=502),
+        ],
+    )
+    def test_transient(self, error):
+        assert isinstance(classify_stripe_error(error), TransientChargeError)
+
+    @pytest.mark.parametrize(
+        "error",
+        [
+            stripe.error.CardError("declined", None, "card_declined", http_status=402),
+            stripe.error.InvalidRequestError("no such setup intent", None, http_status=404),
+            stripe.error.AuthenticationError("invalid api key", http_status=401),
+        ],
+    )
+    def test_permanent(self, error):
+        assert isinstance(classify_stripe_error(error), PermanentChargeError)
+
+
+class TestChargeCustomer:
+    @patch("utils.payments.stripe.PaymentIntent.create")
+    @patch("utils.payments.stripe.SetupIntent.retrieve")
+    def test_charge_customer(self, retrieve, create):
+        reservation = MagicMock(id=1, duration=60, rate=10)
+
+        charge_customer(reservation)
+
+        # assertions: a retried charge is not carried out twice by Stripe
+        assert create.call_args.kwargs["amount"] == 1000
+        assert create.call_args.kwargs["idempotency_key"] == "reservation-1-charge-0"
+
+    @patch("utils.payments.stripe.PaymentIntent.create")
+    @patch("utils.payments.stripe.SetupIntent.retrieve")
+    def test_charge_customer_declined(self, retrieve, create):
+        create.side_effect = stripe.error.CardError(
+            "Your card was declined.", None, "card_declined", http_status=402
+        )
+
+        with pytest.raises(PermanentChargeError) as error:
+            charge_customer(MagicMock(id=1, duration=60, rate=10))
+
+        # assertions
+        assert error.value.code == "card_declined"
+
+
+class TestGetNextChargeAttempt:
+    @pytest.mark.parametrize(
+        "error, charge_attempt",
+        [
+            # Stripe has answered, hence it would replay the error for the same key
+            (stripe.error.APIError("internal error", http_status=500), 3),
+            (stripe.error.CardError("declined", None, "card_declined", http_status=402), 3),
+            # the payment intent may have been created, hence the key is reused
+            (stripe.error.APIConnectionError("network error"), 2),
+        ],
+    )
+    def test_get_next_charge_attempt(self, error, charge_attempt):
+        assert get_next_charge_attempt(2, classify_stripe_error(error)) == charge_attempt
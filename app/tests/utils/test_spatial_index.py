@@ -0,0 +1,153 @@
+"""
+Testing the process-local spatial index of parking spots
+"""
+
+import pytest
+from django.db import transaction
+
+from app.models.parking_spot import ParkingSpot
+from app.tests.factories import ParkingSpotFactory
+from utils.spatial_index import ParkingSpotIndex, parking_spot_index
+from utils.utils import haversine_distance
+
+pytestmark = pytest.mark.django_db
+
+
+class TestParkingSpotIndex:
+    """
+    Test suite for the spatial index of parking spots
+    """
+
+    def test_search_returns_active_parking_spots_within_distance(self):
+        near = ParkingSpotFactory.create(lat=40.7128, lng=-74.006)
+        ParkingSpotFactory.create(lat=40.7128, lng=-74.006, reserved=True)
+        ParkingSpotFactory.create(lat=40.7128, lng=-74.006, active=False)
+        ParkingSpotFactory.create(lat=40.8, lng=-74.006)
+
+        results = dict(parking_spot_index.search(40.7128, -74.006, 1, "km"))
+
+        # assertions: reserved parking spots are only filtered out by the db
+        assert len(results) == 2
+        assert results[near.id] == pytest.approx(0)
+
+    def test_search_across_antimeridian(self):
+        east = ParkingSpotFactory.create(lat=0, lng=180)
+        west = ParkingSpotFactory.create(lat=0, lng=-179.99)
+
+        results = dict(parking_spot_index.search(0, 179.995, 2, "km"))
+
+        # assertions
+        assert set(results) == {east.id, west.id}
+
+    def test_search_with_more_cells_than_parking_spots(self):
+        parking_spot = ParkingSpotFactory.create(lat=10, lng=10)
+
+        results = dict(parking_spot_index.search(0, 0, 2000, "km"))
+
+        # assertions
+        assert set(results) == {parking_spot.id}
+
+    def test_saving_parking_spots_updates_built_index(self, django_capture_on_commit_callbacks):
+        parking_spot = ParkingSpotFactory.create(lat=0, lng=0)
+        parking_spot_index.rebuild()
+
+        # a new parking spot and a moved parking spot are picked up by the signal receivers, once
+        # the transaction has been committed
+        with django_capture_on_commit_callbacks(execute=True):
+            new_parking_spot = ParkingSpotFactory.create(lat=1, lng=1)
+            parking_spot.lat = 1
+            parking_spot.lng = 1
+            parking_spot.save()
+
+        # assertions
+        assert {spot_id for spot_id, _ in parking_spot_index.search(1, 1, 1, "km")} == {
+            parking_spot.id,
+            new_parking_spot.id,
+        }
+        assert parking_spot_index.search(0, 0, 1, "km") == []
+
+    def test_deactivating_and_deleting_parking_spots_updates_built_index(
+        self, django_capture_on_commit_callbacks
+    ):
+        inactive_parking_spot = ParkingSpotFactory.create(lat=0, lng=0)
+        deleted_parking_spot = ParkingSpotFactory.create(lat=0, lng=0)
+        parking_spot_index.rebuild()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            inactive_parking_spot.active = False
+            inactive_parking_spot.save()
+            deleted_parking_spot.delete()
+
+        # assertions
+        assert len(parking_spot_index) == 0
+        assert parking_spot_index.search(0, 0, 1, "km") == []
+
+    def test_rolled_back_save_does_not_update_built_index(self):
+        parking_spot = ParkingSpotFactory.create(lat=0, lng=0)
+        parking_spot_index.rebuild()
+
+        with transaction.atomic():
+            parking_spot.lat = 1
+            parking_spot.save()
+            ParkingSpotFactory.create(lat=1, lng=0)
+            transaction.set_rollback(True)
+
+        # assertions: the index still holds the committed parking spot only
+        assert [spot_id for spot_id, _ in parking_spot_index.search(0, 0, 1, "km")] == [
+            parking_spot.id
+        ]
+        assert parking_spot_index.search(1, 0, 1, "km") == []
+
+    def test_stale_index_is_rebuilt(self):
+        index = ParkingSpotIndex(max_age=60)
+        index.rebuild()
+
+        # bypass the signal receivers as if another process had created the parking spot
+        ParkingSpot.objects.bulk_create([ParkingSpotFactory.build(lat=0, lng=0)])
+        assert index.search(0, 0, 1, "km") == []
+
+        index._built_at -= 60
+
+        # assertions
+        assert len(index.search(0, 0, 1, "km")) == 1
+
+    @pytest.mark.parametrize("lat, lng", [(40.7128, -74.006), (0, 179.999), (89.999, 0)])
+    def test_nearest_yields_parking_spots_in_ascending_distance(self, lat, lng):
+        index = ParkingSpotIndex(cell_size=0.1)
+        offsets = [(0.05, 0), (-0.3, 0.2), (0, -0.01), (0.001, 0.5), (-1, -1), (0.0005, 180)]
+        ParkingSpot.objects.bulk_create(
+            [
+                ParkingSpotFactory.build(
+                    lat=round(lat + dlat, 6), lng=round((lng + dlng + 180) % 360 - 180, 6)
+                )
+                for dlat, dlng in offsets
+                if -90 <= lat + dlat <= 90
+            ]
+        )
+        expected = sorted(
+            haversine_distance(lat, lng, float(spot.lat), float(spot.lng), "km")
+            for spot in ParkingSpot.objects.all()
+        )
+
+        distances = [distance for _, distance in index.nearest(lat, lng, "km")]
+
+        # assertions
+        assert distances == pytest.approx(expected)
+
+    def test_nearest_stops_at_max_distance(self):
+        ParkingSpotFactory.create(lat=0, lng=0)
+        ParkingSpotFactory.create(lat=0, lng=0.1)
+
+        results = list(parking_spot_index.nearest(0, 0, "km", max_distance=5))
+
+        # assertions
+        assert len(results) == 1
+
+    def test_nearest_is_lazy(self):
+        first = ParkingSpotFactory.create(lat=0, lng=0)
+        ParkingSpotFactory.create(lat=50, lng=50)
+
+        nearest = parking_spot_index.nearest(0, 0.001, "km")
+
+        # assertions: the first parking spot is yielded before the far away cells are visited
+        assert next(nearest)[0] == first.id
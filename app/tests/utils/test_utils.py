@@ -0,0 +1,148 @@
+"""
+Testing utility functions
+"""
+
+import numpy as np
+import pytest
+from hypothesis import given
+from hypothesis import strategies as st
+
+from utils.utils import (
+    chord_length_to_distance,
+    get_bounding_box,
+    get_chord_length,
+    get_unit_vector,
+    haversine_distance,
+    haversine_distances,
+)
+
+latitudes = st.floats(min_value=-90, max_value=90)
+longitudes = st.floats(min_value=-180, max_value=180)
+
+
+class TestHaversineDistances:
+    """
+    Test suite for the vectorised haversine distance calculation
+    """
+
+    @given(
+        user_lat=latitudes,
+        user_lng=longitudes,
+        coordinates=st.lists(st.tuples(latitudes, longitudes), min_size=1, max_size=50),
+        unit=st.sampled_from(["km", "mil"]),
+    )
+    def test_matches_scalar_haversine_distance(self, user_lat, user_lng, coordinates, unit):
+        lats = np.array([lat for lat, _ in coordinates])
+        lngs = np.array([lng for _, lng in coordinates])
+
+        distances = haversine_distances(user_lat, user_lng, lats, lngs, unit)
+
+        # assertions
+        assert distances.shape == lats.shape
+        for distance, (lat, lng) in zip(distances, coordinates):
+            assert distance == pytest.approx(
+                haversine_distance(user_lat, user_lng, lat, lng, unit), rel=1e-9, abs=1e-3
+            )
+
+    def test_empty_arrays(self):
+        distances = haversine_distances(0, 0, np.array([]), np.array([]), "km")
+
+        # assertions
+        assert distances.size == 0
+
+
+class TestUnitVectors:
+    """
+    Test suite for the distance calculation based on unit vectors
+    """
+
+    @given(
+        user_lat=latitudes,
+        user_lng=longitudes,
+        lat=latitudes,
+        lng=longitudes,
+        unit=st.sampled_from(["km", "mil"]),
+    )
+    def test_matches_haversine_distance(self, user_lat, user_lng, lat, lng, unit):
+        chord_length = np.linalg.norm(
+            np.subtract(get_unit_vector(user_lat, user_lng), get_unit_vector(lat, lng))
+        )
+
+        # assertions
+        assert chord_length_to_distance(chord_length, unit) == pytest.approx(
+            haversine_distance(user_lat, user_lng, lat, lng, unit), rel=1e-9, abs=1e-6
+        )
+
+    @pytest.mark.parametrize(
+        "user_lat, user_lng, lat, lng",
+        [
+            # across the North Pole and the South Pole
+            (89.9999, 0, 89.9999, 180),
+            (-89.9999, 45, -89.9999, -135),
+            # across the antimeridian
+            (0, 179.9999, 0, -179.9999),
+            (60, -180, 60, 180),
+        ],
+    )
+    def test_matches_haversine_distance_near_poles_and_antimeridian(
+        self, user_lat, user_lng, lat, lng
+    ):
+        chord_length = np.linalg.norm(
+            np.subtract(get_unit_vector(user_lat, user_lng), get_unit_vector(lat, lng))
+        )
+
+        # assertions
+        assert chord_length_to_distance(chord_length, "km") == pytest.approx(
+            haversine_distance(user_lat, user_lng, lat, lng, "km"), rel=1e-6, abs=1e-9
+        )
+
+    @given(distance=st.floats(min_value=0, max_value=20_000), unit=st.sampled_from(["km", "mil"]))
+    def test_chord_length_round_trip(self, distance, unit):
+        # assertions: no two points on Earth are further apart than half its circumference
+        assert chord_length_to_distance(get_chord_length(distance, unit), unit) == pytest.approx(
+            min(distance, chord_length_to_distance(2, unit)), rel=1e-9, abs=1e-6
+        )
+
+
+class TestGetBoundingBox:
+    """
+    Test suite for the bounding box of the radial parking spot search
+    """
+
+    def test_bounding_box_contains_search_circle(self):
+        lat, lng, dist = 40.7128, -74.006, 5
+
+        min_lat, max_lat, lng_ranges = get_bounding_box(lat, lng, dist, "km")
+
+        # assertions
+        assert len(lng_ranges) == 1
+        min_lng, max_lng = lng_ranges[0]
+        assert haversine_distance(lat, lng, min_lat, lng, "km") == pytest.approx(dist)
+        assert haversine_distance(lat, lng, max_lat, lng, "km") == pytest.approx(dist)
+        assert haversine_distance(lat, lng, lat, min_lng, "km") >= dist
+        assert haversine_distance(lat, lng, lat, max_lng, "km") >= dist
+
+    def test_bounding_box_in_miles_is_larger(self):
+        km_box = get_bounding_box(0, 0, 10, "km")
+        mil_box = get_bounding_box(0, 0, 10, "mil")
+
+        # assertions
+        assert mil_box[1] - mil_box[0] == pytest.approx((km_box[1] - km_box[0]) * 1.609344)
+
+    def test_bounding_box_across_antimeridian(self):
+        min_lat, max_lat, lng_ranges = get_bounding_box(0, 179.99, 10, "km")
+
+        # assertions
+        assert len(lng_ranges) == 2
+        assert lng_ranges[0][1] == 180
+        assert lng_ranges[1][0] == -180
+        assert lng_ranges[0][0] < 179.99
+        assert -180 < lng_ranges[1][1] < -179.9
+
+    def test_bounding_box_including_pole(self):
+        min_lat, max_lat, lng_ranges = get_bounding_box(89.99, 0, 10, "km")
+
+        # assertions
+        assert max_lat == 90
+        assert min_lat < 89.99
+        assert lng_ranges == [(-180, 180)]
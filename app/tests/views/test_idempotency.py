@@ -0,0 +1,169 @@
+"""
+Testing the Idempotency-Key support of the POST endpoints
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.test import APIClient
+
+from app.idempotency import get_idempotency_cache_key
+from app.models.reservation import Reservation
+from app.serializers.reservation_serializer import ReservationVersionConflict
+from app.views.reservation_views import create_reservation
+
+pytestmark = pytest.mark.django_db
+
+
+class TestIdempotency:
+    """
+    Testing replays and concurrent duplicates of requests with an Idempotency-Key header
+    """
+
+    def test_replay_reservation(self, client, parking_spot, django_assert_num_queries):
+        path = f"/reservation-unauth/{parking_spot.id}/"
+        data = {"reservation": {"reservation_length": 10, "email": "test@test.com"}}
+
+        response = client.post(path=path, data=data, format="json", HTTP_IDEMPOTENCY_KEY="key")
+
+        # the retry does not touch the db
+        with django_assert_num_queries(0):
+            replayed_response = client.post(
+                path=path, data=data, format="json", HTTP_IDEMPOTENCY_KEY="key"
+            )
+
+        # assertions
+        assert response.status_code == 200
+        assert replayed_response.status_code == 200
+        assert replayed_response.content == response.content
+        assert replayed_response["Idempotent-Replayed"] == "true"
+        # the client can amend the reservation with If-Match
+        assert replayed_response["ETag"] == response["ETag"]
+        assert Reservation.objects.count() == 1
+
+    def test_replay_different_body(self, client, parking_spot):
+        path = f"/reservation-unauth/{parking_spot.id}/"
+        data = {"reservation": {"reservation_length": 10, "email": "test@test.com"}}
+
+        client.post(path=path, data=data, format="json", HTTP_IDEMPOTENCY_KEY="key")
+        data["reservation"]["reservation_length"] = 20
+        response = client.post(path=path, data=data, format="json", HTTP_IDEMPOTENCY_KEY="key")
+
+        # assertions
+        assert response.status_code == 422
+        assert Reservation.objects.count() == 1
+
+    @patch("app.views.payment_views.get_customer_id")
+    @patch("app.views.payment_views.stripe.SetupIntent.create")
+    def test_replay_payment_intent(
+        self, create_setup_intent, get_customer_id, client, reservation_unauth
+    ):
+        create_setup_intent.return_value = MagicMock(id="seti_1", client_secret="secret")
+        path = (
+            f"/create-payment-intent-unauth/{reservation_unauth.id}/{reservation_unauth.email}/"
+        )
+
+        responses = [
+            client.post(path=path, format="json", HTTP_IDEMPOTENCY_KEY="key") for _ in range(2)
+        ]
+
+        # assertions: a single Stripe SetupIntent is created
+        assert [response.status_code for response in responses] == [201, 201]
+        assert responses[1].json() == {"clientSecret": "secret"}
+        create_setup_intent.assert_called_once()
+
+    @patch("app.views.payment_views.get_customer_id")
+    @patch("app.views.payment_views.stripe.SetupIntent.create")
+    def test_conflict_not_stored(
+        self, create_setup_intent, get_customer_id, client, reservation_unauth
+    ):
+        create_setup_intent.side_effect = [
+            ReservationVersionConflict(),
+            MagicMock(id="seti_1", client_secret="secret"),
+        ]
+        path = (
+            f"/create-payment-intent-unauth/{reservation_unauth.id}/{reservation_unauth.email}/"
+        )
+
+        responses = [
+            client.post(path=path, format="json", HTTP_IDEMPOTENCY_KEY="key") for _ in range(2)
+        ]
+
+        # assertions: the retry is processed rather than replaying the conflict
+        assert [response.status_code for response in responses] == [409, 201]
+        assert not responses[1].has_header("Idempotent-Replayed")
+
+    @pytest.mark.django_db(transaction=True)
+    def test_concurrent_duplicate_waits_for_first_request(self, parking_spot):
+        path = f"/reservation-unauth/{parking_spot.id}/"
+        data = {"reservation": {"reservation_length": 10, "email": "test@test.com"}}
+        barrier = threading.Barrier(2)
+
+        def slow_create_reservation(*args):
+            # keep the first request in progress while the duplicate arrives
+            time.sleep(0.3)
+            return create_reservation(*args)
+
+        def post(i):
+            barrier.wait()
+            try:
+                return APIClient().post(
+                    path=path, data=data, format="json", HTTP_IDEMPOTENCY_KEY="key"
+                )
+            finally:
+                # each thread opens its own db connection
+                connection.close()
+
+        with patch(
+            "app.views.reservation_views.create_reservation", side_effect=slow_create_reservation
+        ):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                responses = list(executor.map(post, range(2)))
+
+        # assertions: the duplicate received the response of the first request
+        assert [response.status_code for response in responses] == [200, 200]
+        assert responses[0].content == responses[1].content
+        assert sorted(response.has_header("Idempotent-Replayed") for response in responses) == [
+            False,
+            True,
+        ]
+        assert Reservation.objects.count() == 1
+
+    def test_concurrent_duplicate_times_out(
+        self, client, parking_spot, settings, redis_connection
+    ):
+        settings.IDEMPOTENCY_LOCK_TIMEOUT = 0.2
+        path = f"/reservation-unauth/{parking_spot.id}/"
+
+        # a request with the same key is in progress and does not finish in time
+        request = RequestFactory().post(path)
+        redis_connection.set(f"{get_idempotency_cache_key(request, 'key')}:lock", "token")
+
+        response = client.post(path=path, data={}, format="json", HTTP_IDEMPOTENCY_KEY="key")
+
+        # assertions
+        assert response.status_code == 409
+        assert not Reservation.objects.exists()
+
+    def test_expired_lock_not_released(self, client, parking_spot, redis_connection):
+        path = f"/reservation-unauth/{parking_spot.id}/"
+        data = {"reservation": {"reservation_length": 10, "email": "test@test.com"}}
+        lock_key = f"{get_idempotency_cache_key(RequestFactory().post(path), 'key')}:lock"
+
+        def slow_create_reservation(*args, **kwargs):
+            # the lock expires while the request is processed and a retry takes it
+            redis_connection.set(lock_key, "token of the retry")
+            return create_reservation(*args, **kwargs)
+
+        with patch(
+            "app.views.reservation_views.create_reservation", side_effect=slow_create_reservation
+        ):
+            client.post(path=path, data=data, format="json", HTTP_IDEMPOTENCY_KEY="key")
+
+        # assertions: the lock of the retry is left in place
+        assert redis_connection.get(lock_key) == b"token of the retry"
@@ -1,11 +1,13 @@
 import json
+from datetime import timedelta
+from urllib.parse import urlencode
 
 import pytest
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
 
-from ..factories import ParkingSpotFactory
+from ..factories import ParkingSpotFactory, ReservationFactory
 
 pytestmark = pytest.mark.django_db
 
@@ -84,3 +86,344 @@ class TestParkingSpotViews(TestCase):
         for i in range(0, 3):
             assert response_list[i].status_code == 200
             assert len(json.loads(response_list[i].content)) == 1 + i
+
+    def test_get_available_parking_spots_filtered_view_across_antimeridian(self):
+        # one parking spot either side of the antimeridian, ~2.2km apart, and one far away
+        ParkingSpotFactory.create(lat=0, lng=180)
+        ParkingSpotFactory.create(lat=0, lng=-179.99)
+        ParkingSpotFactory.create(lat=0, lng=179)
+
+        response = self.client.get(
+            reverse("api-available-parking-spots-filter")
+            + "?lat=0&lng=179.995&unit=km&dist=2"
+        )
+
+        # assertions
+        assert response.status_code == 200
+        assert len(json.loads(response.content)) == 2
+
+    def test_get_available_parking_spots_filtered_view_excludes_unavailable(self):
+        ParkingSpotFactory.create(lat=0, lng=0)
+        ParkingSpotFactory.create(lat=0, lng=0, reserved=True)
+        ParkingSpotFactory.create(lat=0, lng=0, active=False)
+
+        response = self.client.get(
+            reverse("api-available-parking-spots-filter") + "?lat=0&lng=0&unit=km&dist=1"
+        )
+
+        # assertions
+        assert response.status_code == 200
+        assert len(json.loads(response.content)) == 1
+
+    def test_get_nearest_available_parking_spots_view(self):
+        # five parking spots along the equator, 0.01 deg (~1.1km) apart, the nearest is reserved
+        parking_spots = [ParkingSpotFactory.create(lat=0, lng=0.01 * i) for i in range(5)]
+        ReservationFactory(parking_spot=parking_spots[0])
+
+        response = self.client.get(
+            reverse("api-available-parking-spots-nearest") + "?lat=0&lng=0&k=3"
+        )
+        decoded_response = json.loads(response.content)
+
+        # assertions
+        assert response.status_code == 200
+        assert [spot["id"] for spot in decoded_response] == [
+            parking_spot.id for parking_spot in parking_spots[1:4]
+        ]
+        assert decoded_response[0]["distance"] == pytest.approx(1.11, abs=0.01)
+
+    def test_get_nearest_available_parking_spots_view_max_distance(self):
+        [ParkingSpotFactory.create(lat=0, lng=0.01 * i) for i in range(5)]
+
+        response = self.client.get(
+            reverse("api-available-parking-spots-nearest")
+            + "?lat=0&lng=0&k=10&unit=km&dist=2.5"
+        )
+
+        # assertions
+        assert response.status_code == 200
+        assert len(json.loads(response.content)) == 3
+
+    def test_get_nearest_available_parking_spots_view_invalid_k(self):
+        response = self.client.get(
+            reverse("api-available-parking-spots-nearest") + "?lat=0&lng=0&k=0"
+        )
+
+        # assertions
+        assert response.status_code == 400
+
+    def test_get_nearest_available_parking_spots_view_invalid_params(self):
+        for query in [
+            "?lng=0",
+            "?lat=0",
+            "?lat=north&lng=0",
+            "?lat=nan&lng=0",
+            "?lat=91&lng=0",
+            "?lat=0&lng=0&k=1.5",
+            "?lat=0&lng=0&dist=far",
+            "?lat=0&lng=0&dist=-1",
+        ]:
+            with self.subTest(query=query):
+                response = self.client.get(reverse("api-available-parking-spots-nearest") + query)
+
+                # assertions: a missing or malformed query param is a client error
+                assert response.status_code == 400
+
+    def test_get_available_parking_spots_view_geohash_filter(self):
+        # one parking spot in Manhattan (geohash dr5r...) and one in London (gcpv...)
+        manhattan = ParkingSpotFactory.create(lat=40.7128, lng=-74.006)
+        ParkingSpotFactory.create(lat=51.5074, lng=-0.1278)
+
+        response = self.client.get(reverse("api-available-parking-spots") + "?geohash=dr5r")
+
+        # assertions
+        assert response.status_code == 200
+        assert [spot["id"] for spot in json.loads(response.content)] == [manhattan.id]
+
+    def test_get_available_parking_spots_view_fields(self):
+        parking_spots = [ParkingSpotFactory() for _ in range(3)]
+        ParkingSpotFactory(reserved=True)
+
+        # the lean response is read in a single query without building model instances
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("api-available-parking-spots") + "?fields=id,lat,lng,rate"
+            )
+
+        # assertions: each field is represented as in the full response
+        assert response.status_code == 200
+        assert json.loads(response.content) == [
+            {
+                "id": parking_spot.id,
+                "lat": f"{parking_spot.lat:.6f}",
+                "lng": f"{parking_spot.lng:.6f}",
+                "rate": f"{parking_spot.rate:.2f}",
+            }
+            for parking_spot in parking_spots
+        ]
+
+    def test_get_available_parking_spots_view_unknown_fields(self):
+        response = self.client.get(reverse("api-available-parking-spots") + "?fields=id,geohash")
+
+        # assertions
+        assert response.status_code == 400
+        assert json.loads(response.content) == {"fields": ["Unknown fields: geohash"]}
+
+    def test_get_available_parking_spots_view_period(self):
+        # the first parking spot is reserved for the next ten minutes
+        parking_spots = [ParkingSpotFactory() for _ in range(2)]
+        reservation = ReservationFactory(parking_spot=parking_spots[0])
+
+        def get_ids(start_time, end_time):
+            params = urlencode(
+                {"start_time": start_time.isoformat(), "end_time": end_time.isoformat()}
+            )
+            response = self.client.get(reverse("api-available-parking-spots") + "?" + params)
+            assert response.status_code == 200
+            return [parking_spot["id"] for parking_spot in json.loads(response.content)]
+
+        # assertions
+        assert get_ids(reservation.start_time, reservation.end_time) == [parking_spots[1].id]
+        assert get_ids(
+            reservation.end_time, reservation.end_time + timedelta(hours=1)
+        ) == [parking_spot.id for parking_spot in parking_spots]
+
+    def test_get_available_parking_spots_view_invalid_period(self):
+        response = self.client.get(
+            reverse("api-available-parking-spots") + "?start_time=2024-01-01T12:00Z&end_time=2024"
+        )
+
+        # assertions
+        assert response.status_code == 400
+        assert "end_time" in json.loads(response.content)
+
+    def test_get_available_parking_spots_view_keyset_pagination(self):
+        parking_spot_ids = [ParkingSpotFactory().id for _ in range(5)]
+
+        url = reverse("api-available-parking-spots") + "?limit=2"
+        pages = []
+        while url:
+            response = self.client.get(url)
+            assert response.status_code == 200
+            page = json.loads(response.content)
+            pages.append([parking_spot["id"] for parking_spot in page["results"]])
+            url = page["next"]
+
+        # assertions: the pages hold all parking spots in order of their ids
+        assert pages == [parking_spot_ids[:2], parking_spot_ids[2:4], parking_spot_ids[4:]]
+
+    def test_get_available_parking_spots_view_invalid_limit(self):
+        response = self.client.get(reverse("api-available-parking-spots") + "?limit=0")
+
+        # assertions
+        assert response.status_code == 400
+        assert "limit" in json.loads(response.content)
+
+    def test_get_available_parking_spots_view_compact(self):
+        parking_spots = [ParkingSpotFactory() for _ in range(3)]
+
+        response = self.client.get(
+            reverse("api-available-parking-spots")
+            + f"?compact=1&limit=2&after={parking_spots[0].id}"
+        )
+
+        # assertions: one array per field
+        assert response.status_code == 200
+        assert json.loads(response.content) == {
+            "next": None,
+            "results": {
+                "id": [parking_spot.id for parking_spot in parking_spots[1:]],
+                "lat": [f"{parking_spot.lat:.6f}" for parking_spot in parking_spots[1:]],
+                "lng": [f"{parking_spot.lng:.6f}" for parking_spot in parking_spots[1:]],
+                "rate": [f"{parking_spot.rate:.2f}" for parking_spot in parking_spots[1:]],
+            },
+        }
+
+    def test_get_available_parking_spots_filtered_view_compact_pagination(self):
+        parking_spots = [ParkingSpotFactory.create(lat=0, lng=0.001 * i) for i in range(3)]
+        ParkingSpotFactory.create(lat=1, lng=0)
+
+        response = self.client.get(
+            reverse("api-available-parking-spots-filter")
+            + "?lat=0&lng=0&unit=km&dist=1&compact=1&fields=id&limit=2"
+        )
+
+        # assertions
+        assert response.status_code == 200
+        page = json.loads(response.content)
+        assert page["results"] == {"id": [parking_spot.id for parking_spot in parking_spots[:2]]}
+        assert f"after={parking_spots[1].id}" in page["next"]
+
+    def test_get_available_parking_spots_viewport_view_clusters(self):
+        # two available parking spots and a reserved one close to each other in Manhattan, and
+        # one in Brooklyn
+        ParkingSpotFactory.create(lat=40.7128, lng=-74.006, rate=10)
+        ParkingSpotFactory.create(lat=40.7130, lng=-74.004, rate=5)
+        ParkingSpotFactory.create(lat=40.7129, lng=-74.005, rate=1, reserved=True)
+        ParkingSpotFactory.create(lat=40.6782, lng=-73.9442, rate=7)
+
+        url = (
+            reverse("api-available-parking-spots-viewport")
+            + "?min_lat=40.6&min_lng=-74.1&max_lat=40.8&max_lng=-73.9&zoom=11"
+        )
+        response = self.client.get(url)
+
+        # assertions
+        assert response.status_code == 200
+        data = json.loads(response.content)
+        assert data["parking_spots"] == []
+        assert sorted((c["count"], c["min_rate"]) for c in data["clusters"]) == [
+            (1, "7.00"),
+            (2, "5.00"),
+        ]
+        manhattan = next(c for c in data["clusters"] if c["count"] == 2)
+        assert manhattan["lat"] == pytest.approx(40.7129)
+        assert manhattan["lng"] == pytest.approx(-74.005)
+
+        # the clusters of all tiles are served from the cache
+        with self.assertNumQueries(0):
+            assert json.loads(self.client.get(url).content) == data
+
+    def test_get_available_parking_spots_viewport_view_spots(self):
+        parking_spot = ParkingSpotFactory.create(lat=40.7128, lng=-74.006)
+        ParkingSpotFactory.create(lat=40.7128, lng=-74.006, active=False)
+        ParkingSpotFactory.create(lat=40.7228, lng=-74.006)
+
+        response = self.client.get(
+            reverse("api-available-parking-spots-viewport")
+            + "?min_lat=40.71&min_lng=-74.01&max_lat=40.72&max_lng=-74&zoom=17"
+        )
+
+        # assertions
+        assert response.status_code == 200
+        data = json.loads(response.content)
+        assert data["clusters"] == []
+        assert [spot["id"] for spot in data["parking_spots"]] == [parking_spot.id]
+
+    def test_get_available_parking_spots_viewport_view_too_large(self):
+        response = self.client.get(
+            reverse("api-available-parking-spots-viewport")
+            + "?min_lat=-80&min_lng=-170&max_lat=80&max_lng=170&zoom=12"
+        )
+
+        # assertions
+        assert response.status_code == 400
+
+    def test_get_available_parking_spots_viewport_view_spots_too_large(self):
+        # the whole world at the zoom level of individual parking spots
+        response = self.client.get(
+            reverse("api-available-parking-spots-viewport")
+            + "?min_lat=-90&min_lng=-180&max_lat=90&max_lng=180&zoom=16"
+        )
+
+        # assertions
+        assert response.status_code == 400
+
+    def test_get_available_parking_spots_viewport_view_invalid_params(self):
+        for query in [
+            "?min_lat=nan&min_lng=-74.1&max_lat=40.8&max_lng=-73.9&zoom=11",
+            "?min_lat=-inf&min_lng=-74.1&max_lat=40.8&max_lng=-73.9&zoom=11",
+            "?min_lat=40.6&min_lng=-74.1&max_lat=40.8&max_lng=inf&zoom=11",
+            "?min_lat=40.6&min_lng=-74.1&max_lat=91&max_lng=-73.9&zoom=11",
+            "?min_lat=40.6&min_lng=-181&max_lat=40.8&max_lng=-73.9&zoom=11",
+            # an inverted box
+            "?min_lat=40.8&min_lng=-74.1&max_lat=40.6&max_lng=-73.9&zoom=11",
+        ]:
+            with self.subTest(query=query):
+                response = self.client.get(reverse("api-available-parking-spots-viewport") + query)
+
+                # assertions: the viewport is a client error rather than a server error or an
+                # empty response
+                assert response.status_code == 400
+
+    def test_get_available_parking_spots_viewport_view_clusters_invalidated(self):
+        parking_spot = ParkingSpotFactory.create(lat=40.7128, lng=-74.006)
+        url = (
+            reverse("api-available-parking-spots-viewport")
+            + "?min_lat=40.6&min_lng=-74.1&max_lat=40.8&max_lng=-73.9&zoom=11"
+        )
+        assert len(json.loads(self.client.get(url).content)["clusters"]) == 1
+
+        # reserving the parking spot bumps the version once the transaction is committed
+        with self.captureOnCommitCallbacks(execute=True):
+            ReservationFactory(parking_spot=parking_spot)
+
+        # assertions: the cached clusters are not served anymore
+        assert json.loads(self.client.get(url).content)["clusters"] == []
+
+    def test_get_available_parking_spots_view_cache(self):
+        ParkingSpotFactory()
+
+        response = self.client.get(reverse("api-available-parking-spots"))
+
+        # the cached response data is served without querying the db
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(reverse("api-available-parking-spots"))
+
+        # assertions
+        assert cached_response.status_code == 200
+        assert cached_response.content == response.content
+        assert cached_response["ETag"] == response["ETag"]
+
+    def test_get_available_parking_spots_view_etag(self):
+        parking_spot = ParkingSpotFactory()
+
+        etag = self.client.get(reverse("api-available-parking-spots"))["ETag"]
+        not_modified_response = self.client.get(
+            reverse("api-available-parking-spots"), HTTP_IF_NONE_MATCH=etag
+        )
+
+        # reserving the parking spot bumps the version once the transaction is committed
+        with self.captureOnCommitCallbacks(execute=True):
+            ReservationFactory(parking_spot=parking_spot)
+
+        modified_response = self.client.get(
+            reverse("api-available-parking-spots"), HTTP_IF_NONE_MATCH=etag
+        )
+
+        # assertions
+        assert not_modified_response.status_code == 304
+        assert not_modified_response["ETag"] == etag
+        assert modified_response.status_code == 200
+        assert modified_response["ETag"] != etag
+        assert json.loads(modified_response.content) == []
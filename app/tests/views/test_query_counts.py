@@ -0,0 +1,137 @@
+"""
+Pinning the number of queries of the reservation and payment endpoints, which must not grow with
+the number of reservations of a user
+"""
+
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from app.tests.factories import ParkingSpotFactory, ReservationFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def auth_client(client, user):
+    """
+    The APIClient authenticated as user, without the query of the token authentication
+    """
+
+    client.force_authenticate(user=user)
+    return client
+
+
+class TestQueryCounts:
+    """
+    Each test requests an endpoint and asserts its number of queries, including the savepoints
+    of atomic blocks
+    """
+
+    def test_create_reservation_unauth(self, client, parking_spot, django_assert_num_queries):
+        path = f"/reservation-unauth/{parking_spot.id}/"
+        data = {"reservation": {"reservation_length": 10, "email": "test@test.com"}}
+
+        # parking spot, email check, overlap check, savepoints and insert of the reservation
+        with django_assert_num_queries(6):
+            response = client.post(path=path, data=data, format="json")
+
+        assert response.status_code == 200
+
+    def test_create_reservation_auth(self, auth_client, parking_spot, django_assert_num_queries):
+        path = f"/reservation-auth/{parking_spot.id}/"
+        data = {"reservation": {"reservation_length": 10}}
+
+        # as above, without the email check, the user is not looked up again
+        with django_assert_num_queries(5):
+            response = auth_client.post(path=path, data=data, format="json")
+
+        assert response.status_code == 200
+
+    @pytest.mark.parametrize("count", [1, 10])
+    def test_create_batch_reservation(self, auth_client, count, django_assert_num_queries):
+        parking_spots = [ParkingSpotFactory() for _ in range(count)]
+        path = "/reservation-auth/batch/"
+        data = {
+            "reservations": [
+                {"parking_spot": parking_spot.id, "reservation_length": 10}
+                for parking_spot in parking_spots
+            ]
+        }
+
+        # parking spots, overlap check, savepoints and bulk insert
+        with django_assert_num_queries(9):
+            response = auth_client.post(path=path, data=data, format="json")
+
+        assert response.status_code == 200
+
+    @pytest.mark.parametrize("count", [1, 10])
+    def test_get_active_reservations(self, auth_client, user, count, django_assert_num_queries):
+        for _ in range(count):
+            ReservationFactory(user=user)
+
+        with django_assert_num_queries(1):
+            response = auth_client.get(path="/reservation-auth/")
+
+        assert len(response.json()) == count
+
+    @pytest.mark.parametrize("query_params", [{}, {"limit": 5}])
+    def test_get_expired_reservations(
+        self, auth_client, user, query_params, django_assert_num_queries
+    ):
+        for i in range(10):
+            ReservationFactory(
+                user=user, paid=True, start_time=timezone.now() - timedelta(days=i + 1)
+            )
+
+        with django_assert_num_queries(1):
+            response = auth_client.get(path="/expired-reservations-auth/", data=query_params)
+
+        assert response.status_code == 200
+
+    def test_get_reservation_unauth(self, client, reservation_unauth, django_assert_num_queries):
+        path = f"/reservation-unauth/{reservation_unauth.id}/{reservation_unauth.email}/"
+
+        with django_assert_num_queries(1):
+            response = client.get(path=path)
+
+        assert response.status_code == 200
+
+    def test_update_reservation_unauth(
+        self, client, reservation_unauth, django_assert_num_queries
+    ):
+        path = f"/update-reservation-unauth/{reservation_unauth.id}/{reservation_unauth.email}/"
+        end_time = reservation_unauth.end_time + timedelta(minutes=10)
+        data = {"reservation": {"end_time": end_time.strftime("%Y-%m-%dT%H:%M:%S.%fZ")}}
+
+        # reservation, overlap check, savepoints and conditional update, outbox message
+        with django_assert_num_queries(8):
+            response = client.patch(path=path, data=data, format="json")
+
+        assert response.status_code == 200
+
+    def test_delete_reservation_unauth(
+        self, client, reservation_unauth, django_assert_num_queries
+    ):
+        path = f"/delete-reservation-unauth/{reservation_unauth.id}/{reservation_unauth.email}/"
+
+        # reservation, delete
+        with django_assert_num_queries(2):
+            response = client.delete(path=path)
+
+        assert response.status_code == 204
+
+    def test_confirm_setup_intent_unauth(
+        self, client, reservation_unauth, django_assert_num_queries
+    ):
+        path = (
+            f"/confirm-successful-setup-intent-unauth/{reservation_unauth.id}/"
+            f"{reservation_unauth.email}/"
+        )
+
+        # reservation, outbox message
+        with django_assert_num_queries(2):
+            response = client.get(path=path)
+
+        assert response.status_code == 204
@@ -2,9 +2,26 @@
 Testing reservation views
 """
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
 import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
 
+from app.management.commands.archive_reservations import archive_batch
+from app.models.archived_reservation import ArchivedReservation
+from app.models.outbox_message import OutboxMessage
+from app.models.parking_spot import ParkingSpot
 from app.models.reservation import Reservation
+from app.tests.factories import ParkingSpotFactory, ReservationFactory
+from app.views.reservation_views import create_reservation
 
 pytestmark = pytest.mark.django_db
 
@@ -40,3 +57,308 @@ class TestReservationViews:
         # assertions
         assert response.status_code == 200
         assert reservation.email == user.email
+
+    def test_create_reservation_view_reserved_parking_spot(self, client, parking_spot):
+        ReservationFactory(parking_spot=parking_spot)
+
+        path = f"/reservation-unauth/{parking_spot.id}/"
+        data = {"reservation": {"reservation_length": 10, "email": "test@test.com"}}
+
+        response = client.post(path=path, data=data, format="json")
+
+        # assertions
+        assert response.status_code == 400
+        assert response.json() == {"parking_spot": ["This parking spot is already reserved"]}
+        assert Reservation.objects.count() == 1
+
+    def test_create_reservation_view_invalid_reservation_leaves_parking_spot_available(
+        self, client, parking_spot, user
+    ):
+        # the email belongs to an account, hence the reservation is invalid
+        path = f"/reservation-unauth/{parking_spot.id}/"
+        data = {"reservation": {"reservation_length": 10, "email": user.email}}
+
+        response = client.post(path=path, data=data, format="json")
+
+        # assertions
+        assert response.status_code == 400
+        assert not ParkingSpot.objects.get(id=parking_spot.id).reserved
+        assert not Reservation.objects.exists()
+
+    def test_create_reservation_view_missing_parking_spot(self, client):
+        path = "/reservation-unauth/1234567/"
+        data = {"reservation": {"reservation_length": 10, "email": "test@test.com"}}
+
+        response = client.post(path=path, data=data, format="json")
+
+        # assertions
+        assert response.status_code == 404
+
+    @pytest.mark.django_db(transaction=True)
+    def test_concurrent_reservations_of_one_parking_spot(self, parking_spot):
+        thread_count = 20
+        start_time = datetime.now()
+        barrier = threading.Barrier(thread_count)
+
+        def reserve(i):
+            # release all threads at once to maximise contention
+            barrier.wait()
+            try:
+                create_reservation(
+                    parking_spot.id,
+                    {
+                        "email": f"user{i}@test.com",
+                        "start_time": start_time,
+                        "end_time": start_time + timedelta(minutes=10),
+                    },
+                    AnonymousUser(),
+                )
+                return True
+            except ValidationError:
+                return False
+            finally:
+                # each thread opens its own db connection
+                connection.close()
+
+        # the throughput is measured by the benchmark_concurrent_reservations command
+        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+            results = list(executor.map(reserve, range(thread_count)))
+
+        # assertions: exactly one winner
+        assert results.count(True) == 1
+        assert Reservation.objects.filter(parking_spot=parking_spot).count() == 1
+        assert ParkingSpot.objects.get(id=parking_spot.id).reserved
+
+    def test_reservations_of_consecutive_periods(self, parking_spot):
+        start_time = datetime.now()
+
+        def reserve(start_minute, end_minute):
+            return create_reservation(
+                parking_spot.id,
+                {
+                    "email": "test@test.com",
+                    "start_time": start_time + timedelta(minutes=start_minute),
+                    "end_time": start_time + timedelta(minutes=end_minute),
+                },
+                AnonymousUser(),
+            )
+
+        # the parking spot can be reserved ahead of time, back to back with the current reservation
+        reserve(0, 10)
+        reserve(10, 20)
+        with pytest.raises(ValidationError):
+            reserve(15, 25)
+
+        # a paid reservation has ended and no longer blocks its period
+        Reservation.objects.filter(parking_spot=parking_spot).update(paid=True)
+        reserve(15, 25)
+
+        # assertions
+        assert Reservation.objects.filter(parking_spot=parking_spot, paid=False).count() == 1
+
+    def test_create_batch_reservation_view(self, client, user):
+        client.force_authenticate(user=user)
+        parking_spots = [ParkingSpotFactory() for _ in range(3)]
+
+        path = "/reservation-auth/batch/"
+        data = {
+            "reservations": [
+                {"parking_spot": parking_spot.id, "reservation_length": 10 * (i + 1)}
+                for i, parking_spot in enumerate(parking_spots)
+            ]
+        }
+
+        response = client.post(path=path, data=data, format="json")
+        results = response.json()["results"]
+
+        # assertions: no task is scheduled, the sweeper ends the reservations
+        assert response.status_code == 200
+        assert [result["reserved"] for result in results] == [True, True, True]
+        assert [result["reservation"]["parking_spot"] for result in results] == [
+            parking_spot.id for parking_spot in parking_spots
+        ]
+        assert Reservation.objects.filter(user=user).count() == 3
+        assert not OutboxMessage.objects.exists()
+
+    def test_create_batch_reservation_view_all_or_nothing(self, client, user):
+        client.force_authenticate(user=user)
+        parking_spot, reserved_parking_spot = ParkingSpotFactory(), ParkingSpotFactory()
+        ReservationFactory(parking_spot=reserved_parking_spot)
+
+        path = "/reservation-auth/batch/"
+        data = {
+            "reservations": [
+                {"parking_spot": parking_spot.id, "reservation_length": 10},
+                {"parking_spot": reserved_parking_spot.id, "reservation_length": 10},
+                {"parking_spot": 1234567, "reservation_length": 10},
+            ]
+        }
+
+        response = client.post(path=path, data=data, format="json")
+
+        # assertions: nothing has been reserved
+        assert response.status_code == 400
+        assert response.json()["results"] == [
+            {"parking_spot": parking_spot.id, "reserved": False},
+            {
+                "parking_spot": reserved_parking_spot.id,
+                "reserved": False,
+                "errors": {"parking_spot": ["This parking spot is already reserved"]},
+            },
+            {
+                "parking_spot": 1234567,
+                "reserved": False,
+                "errors": {"parking_spot": ["Not found."]},
+            },
+        ]
+        assert not Reservation.objects.filter(user=user).exists()
+        assert not OutboxMessage.objects.exists()
+
+    def test_create_batch_reservation_view_best_effort(self, client, user):
+        client.force_authenticate(user=user)
+        parking_spot = ParkingSpotFactory()
+
+        # the second item reserves the same parking spot again
+        path = "/reservation-auth/batch/"
+        data = {
+            "reservations": [
+                {"parking_spot": parking_spot.id, "reservation_length": 10},
+                {"parking_spot": parking_spot.id, "reservation_length": 10},
+            ],
+            "all_or_nothing": False,
+        }
+
+        response = client.post(path=path, data=data, format="json")
+
+        # assertions
+        assert response.status_code == 200
+        assert [result["reserved"] for result in response.json()["results"]] == [True, False]
+        assert Reservation.objects.filter(user=user).count() == 1
+
+    def test_create_batch_reservation_view_invalid(self, client, user):
+        client.force_authenticate(user=user)
+
+        path = "/reservation-auth/batch/"
+        data = {"reservations": [{"parking_spot": 1, "reservation_length": 0}]}
+
+        response = client.post(path=path, data=data, format="json")
+
+        # assertions
+        assert response.status_code == 400
+        assert "reservations" in response.json()
+
+    def test_update_reservation_view_if_match(self, client, reservation_unauth):
+        path = f"/update-reservation-unauth/{reservation_unauth.id}/{reservation_unauth.email}/"
+        end_time = reservation_unauth.end_time + timedelta(minutes=10)
+        data = {"reservation": {"end_time": end_time.strftime("%Y-%m-%dT%H:%M:%S.%fZ")}}
+
+        etag = client.get(
+            f"/reservation-unauth/{reservation_unauth.id}/{reservation_unauth.email}/"
+        )["ETag"]
+        response = client.patch(path=path, data=data, format="json", HTTP_IF_MATCH=etag)
+        stale_response = client.patch(path=path, data=data, format="json", HTTP_IF_MATCH=etag)
+
+        # assertions: the second amendment is based on the previous version
+        assert etag == '"1"'
+        assert response.status_code == 200
+        assert response["ETag"] == '"2"'
+        assert response.json()["version"] == 2
+        assert stale_response.status_code == 409
+        assert Reservation.objects.get(id=reservation_unauth.id).version == 2
+        assert list(OutboxMessage.objects.values_list("topic", flat=True)) == [
+            "reservation_amendment_mail"
+        ]
+
+    @pytest.mark.django_db(transaction=True)
+    def test_concurrent_updates_of_one_reservation(self, reservation_unauth):
+        thread_count = 20
+        path = f"/update-reservation-unauth/{reservation_unauth.id}/{reservation_unauth.email}/"
+        barrier = threading.Barrier(thread_count)
+
+        def amend(i):
+            end_time = reservation_unauth.end_time + timedelta(minutes=i + 1)
+            data = {"reservation": {"end_time": end_time.strftime("%Y-%m-%dT%H:%M:%S.%fZ")}}
+
+            # release all threads at once to maximise contention, half of them send If-Match
+            barrier.wait()
+            try:
+                headers = {"HTTP_IF_MATCH": '"1"'} if i % 2 else {}
+                response = APIClient().patch(path=path, data=data, format="json", **headers)
+                return response.status_code, end_time.replace(second=0, microsecond=0)
+            finally:
+                # each thread opens its own db connection
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+            results = list(executor.map(amend, range(thread_count)))
+
+        reservation = Reservation.objects.get(id=reservation_unauth.id)
+        amended_end_times = [end_time for status, end_time in results if status == 200]
+
+        # assertions: every amendment either applied on top of the version it read or failed
+        # with a 409, hence the version counts the amendments and the end_time belongs to the
+        # last amendment, which is confirmed like each other one
+        assert {status for status, _ in results} <= {200, 409}
+        assert 409 in {status for status, _ in results}
+        assert reservation.version == 1 + len(amended_end_times)
+        assert reservation.end_time in amended_end_times
+        assert OutboxMessage.objects.filter(topic="reservation_amendment_mail").count() == len(
+            amended_end_times
+        )
+
+    @patch("app.views.payment_views.get_customer_id")
+    @patch("app.views.payment_views.stripe.SetupIntent.create")
+    def test_create_payment_intent_view_concurrent_amendment(
+        self, create_setup_intent, get_customer_id, client, reservation_unauth
+    ):
+        path = (
+            f"/create-payment-intent-unauth/{reservation_unauth.id}/{reservation_unauth.email}/"
+        )
+
+        def create(**kwargs):
+            # the reservation is amended while Stripe creates the SetupIntent
+            Reservation.objects.filter(id=reservation_unauth.id).update(version=F("version") + 1)
+            return MagicMock(id="seti_1", client_secret="secret")
+
+        create_setup_intent.side_effect = create
+
+        response = client.post(path=path, format="json")
+
+        # assertions: the SetupIntent is saved on top of the amendment rather than orphaned
+        reservation = Reservation.objects.get(id=reservation_unauth.id)
+        assert response.status_code == 201
+        assert reservation.stripe_setup_intent_id == "seti_1"
+        assert reservation.version == 3
+
+    @pytest.mark.parametrize("archived", [0, 3])
+    def test_get_expired_reservations_view_pagination(self, client, user, archived):
+        client.force_authenticate(user=user)
+        start_time = timezone.now() - timedelta(days=1)
+        for i in range(5):
+            # two reservations share each start time, the page order falls back to the ids
+            ReservationFactory(
+                user=user, paid=True, start_time=start_time + timedelta(hours=i // 2)
+            )
+        ReservationFactory(paid=True)
+        expected_ids = list(
+            Reservation.objects.filter(user=user)
+            .order_by("-start_time", "-id")
+            .values_list("id", flat=True)
+        )
+
+        # the oldest reservations are moved to the archive, the history spans both tables
+        archive_batch(start_time + timedelta(hours=2), batch_size=archived)
+
+        path = "/expired-reservations-auth/"
+        pages = [client.get(path=path, data={"limit": 2}).json()]
+        while pages[-1]["next"]:
+            pages.append(client.get(pages[-1]["next"]).json())
+        unpaginated_response = client.get(path=path)
+
+        # assertions
+        assert ArchivedReservation.objects.count() == archived
+        assert [len(page["results"]) for page in pages] == [2, 2, 1]
+        assert [
+            reservation["id"] for page in pages for reservation in page["results"]
+        ] == expected_ids
+        assert [reservation["id"] for reservation in unpaginated_response.json()] == expected_ids
@@ -8,9 +8,12 @@ from .views.auth_views import ChangePw, SignInView, SignOutView, SignUpView
 from .views.parking_spot_views import (
     GetAvailableParkingSpotsFilterView,
     GetAvailableParkingSpotsView,
+    GetAvailableParkingSpotsViewportView,
+    GetNearestAvailableParkingSpotsView,
 )
 from .views.payment_views import PaymentViewAuth, PaymentViewUnauth
 from .views.reservation_views import (
+    BatchReservationViewAuth,
     GetExpiredReservationsAuth,
     ReservationViewAuth,
     ReservationViewUnauth,
@@ -37,12 +40,34 @@ urlpatterns = [
         GetAvailableParkingSpotsFilterView.as_view(),
         name="api-available-parking-spots-filter",
     ),
+    # the k available parking spots nearest to the GPS point, sorted by distance and optionally
+    # within a maximum distance; k defaults to 10 and the unit to km
+    # available-parking-spots-nearest?lat=0.123456&lng=0.123456&k=10&unit=km&dist=0.5
+    path(
+        "available-parking-spots-nearest",
+        GetNearestAvailableParkingSpotsView.as_view(),
+        name="api-available-parking-spots-nearest",
+    ),
+    # the available parking spots inside the bounding box of a map viewport, clustered unless the
+    # zoom level is high enough to show individual parking spots
+    # available-parking-spots-viewport?min_lat=0.1&min_lng=0.1&max_lat=0.2&max_lng=0.2&zoom=13
+    path(
+        "available-parking-spots-viewport",
+        GetAvailableParkingSpotsViewportView.as_view(),
+        name="api-available-parking-spots-viewport",
+    ),
     # create reservation for authenticated user
     path(
         "reservation-auth/<int:parking_spot_id>/",
         ReservationViewAuth.as_view(),
         name="api-create-reservation-auth",
     ),
+    # reserve many parking spots at once for an authenticated user
+    path(
+        "reservation-auth/batch/",
+        BatchReservationViewAuth.as_view(),
+        name="api-create-batch-reservation-auth",
+    ),
     # create reservation for unauthenticated user
     path(
         "reservation-unauth/<int:parking_spot_id>/",
@@ -2,39 +2,224 @@
 This module includes all the parking spots views
 """
 
+import itertools
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, Min, QuerySet
+from django.db.models.functions import Left
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
 from rest_framework import generics
+from rest_framework.exceptions import ValidationError
 from rest_framework.mixins import ListModelMixin
+from rest_framework.response import Response
 
-from utils.utils import haversine_distance
+from utils.cache import get_available_parking_spots_version
+from utils.geohash import get_cell_count, get_cells, get_covering_cells, get_precision
+from utils.spatial_index import parking_spot_index
+from utils.utils import get_bounding_box
 
 from ..models.parking_spot import ParkingSpot
-from ..serializers.parking_spot_serializer import ParkingSpotSerializer
+from ..pagination import KeysetPagination
+from ..serializers.parking_spot_serializer import (
+    ParkingSpotDistanceSerializer,
+    ParkingSpotSerializer,
+)
+
+
+class LeanParkingSpotListMixin:
+    """
+    Mixin for the parking spot list views which adds opt-in keyset pagination ordered by id (see
+    app.pagination.KeysetPagination) and two lean response modes for map clients:
 
+    fields: a comma separated subset of the serializer fields, each parking spot is a dict of
+        these fields
+    compact: if set to 1, the response is a dict of parallel arrays, one per field. The fields
+        default to id, lat, lng, and rate.
 
-class GetAvailableParkingSpotsView(generics.ListAPIView, ListModelMixin):
+    In both modes the values are rendered by the serializer fields, hence the representation of
+    each value is the same as in the full response.
+
+    By default the parking spots available now are listed. The optional ISO 8601 start_time and
+    end_time query params list the parking spots available at start_time, or during the whole
+    period [start_time, end_time):
+    available-parking-spots/?start_time=2024-01-01T10:00Z&end_time=2024-01-01T12:00Z
     """
-    View to list all available, that is unreserved, parking spots.
+
+    pagination_class = KeysetPagination
+
+    # the fields of the compact response if the fields query param is missing
+    compact_fields = ["id", "lat", "lng", "rate"]
+
+    def get_available_parking_spots(self):
+        """
+        Return the parking spots available for the period requested by the client
+        """
+
+        params = self.request.query_params
+        period = []
+        for name in ["start_time", "end_time"]:
+            value = params.get(name)
+            try:
+                period.append(parse_datetime(value) if value else None)
+            except ValueError:
+                period.append(None)
+            if value and period[-1] is None:
+                raise ValidationError({name: ["A valid ISO 8601 datetime is required."]})
+
+        # datetimes without a UTC offset are in the default time zone
+        start_time, end_time = [
+            timezone.make_aware(value) if value and timezone.is_naive(value) else value
+            for value in period
+        ]
+        if end_time is not None and (start_time is None or end_time <= start_time):
+            raise ValidationError({"end_time": ["end_time must be later than start_time"]})
+
+        return ParkingSpot.objects.available(start_time, end_time)
+
+    def get_fields(self):
+        """
+        Return the list of fields requested by the client, or None for the full response
+        """
+
+        params = self.request.query_params
+        fields = params.get("fields")
+        if not fields:
+            return self.compact_fields if params.get("compact") == "1" else None
+
+        fields = list(dict.fromkeys(fields.split(",")))
+        unknown_fields = [field for field in fields if field not in self.get_serializer().fields]
+        if unknown_fields:
+            raise ValidationError(
+                {"fields": [f"Unknown fields: {', '.join(unknown_fields)}"]}
+            )
+
+        return fields
+
+    def get_lean_data(self, parking_spots, fields: list):
+        """
+        Return the representation of the fields of the parking spots, which are either model
+        instances or rows returned by QuerySet.values()
+        """
+
+        serializer_fields = self.get_serializer().fields
+        columns = {}
+        for field in fields:
+            to_representation = serializer_fields[field].to_representation
+            columns[field] = [
+                to_representation(
+                    parking_spot[field]
+                    if isinstance(parking_spot, dict)
+                    else getattr(parking_spot, field)
+                )
+                for parking_spot in parking_spots
+            ]
+
+        if self.request.query_params.get("compact") == "1":
+            return columns
+
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+    def list(self, request, *args, **kwargs):
+        """
+        List the parking spots, see the class docstring for the optional query params
+        """
+
+        fields = self.get_fields()
+        if fields is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+
+        # only read the requested columns and the id for the keyset pagination from the db,
+        # without building model instances
+        if isinstance(queryset, QuerySet):
+            queryset = queryset.values("id", *fields)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_lean_data(page, fields))
+
+        return Response(self.get_lean_data(queryset, fields))
+
+
+class GetAvailableParkingSpotsView(
+    LeanParkingSpotListMixin, generics.ListAPIView, ListModelMixin
+):
+    """
+    View to list all available, that is unreserved, parking spots ordered by id, optionally
+    limited to a geohash cell. See LeanParkingSpotListMixin for pagination and the lean response
+    modes.
+
+    The response data is cached under the version of the available parking spots (see
+    utils.cache), which is bumped whenever a parking spot or a reservation changes, and the
+    current cache period. Reservations start and end without a change to the db, hence the
+    cache period bounds how long the response is stale. The version and the period make up the
+    ETag of the response, hence clients which poll with If-None-Match receive a 304 response
+    until a parking spot or a reservation changes or the period is over.
 
     * This is a public route that does not require token authentication
     """
 
-    # query set containing all available parking spots that are commercially available (active)
-    queryset = ParkingSpot.objects.filter(reserved=False, active=True)
     serializer_class = ParkingSpotSerializer
-    # turning pagination off
-    pagination_class = None
 
+    def get_queryset(self):
+        """
+        Return all available parking spots. The optional geohash query param limits them to a
+        geohash cell, which is a range scan on the geohash index:
+        available-parking-spots/?geohash=dr5r
+
+        The selection of id, lat, lng, and rate is an index-only scan on the partial index of
+        available parking spots.
+        """
 
-class GetAvailableParkingSpotsFilterView(generics.ListAPIView, ListModelMixin):
+        # query set containing all available parking spots that are commercially available
+        # (active)
+        queryset = self.get_available_parking_spots().order_by("id")
+
+        cell = self.request.query_params.get("geohash")
+        if cell:
+            queryset = queryset.within_geohash_cells([cell.lower()])
+
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """
+        Return a 304 response if the client holds the current version, otherwise return the
+        cached response data of the query params or cache it on a miss
+        """
+
+        timeout = settings.AVAILABLE_PARKING_SPOTS_CACHE_TIMEOUT
+        version = f"{get_available_parking_spots_version()}-{int(time.time() // timeout)}"
+        etag = f'"{version}"'
+        etags = parse_etags(request.headers.get("If-None-Match", ""))
+        if etag in etags or "*" in etags:
+            return Response(status=304, headers={"ETag": etag})
+
+        cache_key = f"available-parking-spots:{version}:{request.query_params.urlencode()}"
+        data = cache.get(cache_key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(cache_key, data, timeout=timeout)
+
+        return Response(data, headers={"ETag": etag})
+
+
+class GetAvailableParkingSpotsFilterView(
+    LeanParkingSpotListMixin, generics.ListAPIView, ListModelMixin
+):
     """
-    View to list all available parking spots within a user specified radius.
+    View to list all available parking spots within a user specified radius ordered by id. See
+    LeanParkingSpotListMixin for pagination and the lean response modes.
 
     * This is a public route that does not require token authentication
     """
 
-    # queryset = ParkingSpot.objects.filter(reserved=False)
     serializer_class = ParkingSpotSerializer
-    pagination_class = None
 
     def get_queryset(self):
         """
@@ -44,34 +229,238 @@ class GetAvailableParkingSpotsFilterView(generics.ListAPIView, ListModelMixin):
         available-parking-spots-radial-filter?lat=0.123456&long=0.123456&unit=miles&dist=0.1
         """
 
-        # query set containing all available parking spots that are commercially available (active)
-        available_parking_spots = ParkingSpot.objects.filter(
-            reserved=False, active=True
-        )
-
         # retrieve query params; evaluation of query param completeness is overlooked as it is
         # assumed that the client front-end implementation will submit complete query strings
         # string values
         params = self.request.query_params
-        lat = params["lat"]
-        lng = params["lng"]
+        lat = float(params["lat"])
+        lng = float(params["lng"])
         unit = params["unit"]
-        distance = params["dist"]
-
-        # define a new filtered array of parking spot query sets
-        available_parking_spots_filtered = []
-
-        for parking_spot in available_parking_spots:
-            if (
-                haversine_distance(
-                    user_lat=float(lat),
-                    user_lng=float(lng),
-                    parking_spot_lat=float(parking_spot.lat),
-                    parking_spot_lng=float(parking_spot.lng),
-                    unit=unit,
-                )
-                <= float(distance)
-            ):
-                available_parking_spots_filtered.append(parking_spot)
+        distance = float(params["dist"])
+
+        # narrow the available parking spots down to the candidates inside the bounding box of
+        # the search circle; the geohash cells covering the box turn the query into a few range
+        # scans on the geohash index
+        min_lat, max_lat, lng_ranges = get_bounding_box(
+            lat=lat, lng=lng, distance=distance, unit=unit
+        )
+
+        # the corners of the bounding box are outside the search circle, hence the exact check,
+        # which the db runs on the precomputed unit vectors of the candidates
+        return (
+            self.get_available_parking_spots()
+            .within_geohash_cells(get_covering_cells(min_lat, max_lat, lng_ranges))
+            .within_bounding_box(min_lat=min_lat, max_lat=max_lat, lng_ranges=lng_ranges)
+            .within_distance(lat=lat, lng=lng, distance=distance, unit=unit)
+            .order_by("id")
+        )
+
+
+class GetNearestAvailableParkingSpotsView(generics.ListAPIView, ListModelMixin):
+    """
+    View to list the k available parking spots nearest to the user, sorted by their distance
+    from the user, optionally within a user specified radius.
+
+    * This is a public route that does not require token authentication
+    """
+
+    serializer_class = ParkingSpotDistanceSerializer
+    pagination_class = None
+
+    # upper bound of the number of parking spots that can be requested
+    max_k = 100
+
+    def get_queryset(self):
+        """
+        Return the list of the k nearest available parking spots, each with its distance from the
+        user. The request url could look like this:
+        available-parking-spots-nearest?lat=0.123456&lng=0.123456&k=10
+        available-parking-spots-nearest?lat=0.123456&lng=0.123456&k=10&unit=km&dist=0.5
+        """
+
+        params = self.request.query_params
+        try:
+            lat = float(params["lat"])
+            lng = float(params["lng"])
+            k = int(params.get("k", 10))
+            max_distance = float(params.get("dist", math.inf))
+        except (KeyError, ValueError):
+            raise ValidationError("lat and lng are required numbers, k and dist optional numbers")
+        unit = params.get("unit", "km")
+
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValidationError("lat must be between -90 and 90, lng between -180 and 180")
+        if not 0 < k <= self.max_k:
+            raise ValidationError({"k": [f"k must be between 1 and {self.max_k}"]})
+        if not max_distance > 0:
+            raise ValidationError({"dist": ["dist must be greater than 0"]})
+
+        # active parking spots in ascending order of distance, the index searches outward and
+        # only visits as many grid cells as are needed for the parking spots consumed
+        nearest = parking_spot_index.nearest(
+            lat=lat, lng=lng, unit=unit, max_distance=max_distance
+        )
+
+        nearest_parking_spots = []
+
+        # check the availability of the next k nearest active parking spots in the db until k
+        # available parking spots have been found or no parking spot is left within max_distance
+        while len(nearest_parking_spots) < k:
+            distances = dict(itertools.islice(nearest, k))
+            if not distances:
+                break
+
+            available_parking_spots = ParkingSpot.objects.available().in_bulk(distances)
+
+            for parking_spot_id, distance in distances.items():
+                parking_spot = available_parking_spots.get(parking_spot_id)
+                if parking_spot is not None:
+                    parking_spot.distance = distance
+                    nearest_parking_spots.append(parking_spot)
+
+        return nearest_parking_spots[:k]
+
+
+class GetAvailableParkingSpotsViewportView(generics.GenericAPIView):
+    """
+    View to list the available parking spots inside the viewport of a map, clustered by geohash
+    cell unless the zoom level is high enough to show individual parking spots.
+
+    * This is a public route that does not require token authentication
+    """
+
+    serializer_class = ParkingSpotSerializer
+
+    # the largest map zoom level and the largest number of tiles per request
+    max_zoom = 22
+    max_tiles = 64
+
+    def get(self, request):
+        """
+        Return the clusters or parking spots inside the viewport. The request url could look like
+        this:
+        available-parking-spots-viewport?min_lat=40.7&min_lng=-74&max_lat=40.8&max_lng=-73.9&zoom=13
+
+        A cluster holds the count, centroid, and minimum rate of the available parking spots in a
+        geohash cell about a quarter of a map tile wide. The clusters are computed and cached per
+        tile, i.e. per geohash cell one character shorter than the cluster cells, hence viewports
+        which overlap share their cached tiles and the response holds whole tiles, which may
+        extend beyond the viewport. A viewport which crosses the antimeridian has min_lng >
+        max_lng.
+        """
+
+        params = request.query_params
+        try:
+            min_lat = float(params["min_lat"])
+            min_lng = float(params["min_lng"])
+            max_lat = float(params["max_lat"])
+            max_lng = float(params["max_lng"])
+            zoom = int(params["zoom"])
+        except (KeyError, ValueError):
+            raise ValidationError(
+                "min_lat, min_lng, max_lat, max_lng, and zoom are required numbers"
+            )
+
+        # the range checks also reject nan and infinite values
+        if not (-90 <= min_lat <= 90 and -90 <= max_lat <= 90):
+            raise ValidationError("min_lat and max_lat must be between -90 and 90")
+        if not (-180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+            raise ValidationError("min_lng and max_lng must be between -180 and 180")
+        if min_lat > max_lat:
+            raise ValidationError({"max_lat": ["max_lat must not be less than min_lat"]})
+        if not 0 <= zoom <= self.max_zoom:
+            raise ValidationError({"zoom": [f"zoom must be between 0 and {self.max_zoom}"]})
+
+        lng_ranges = (
+            [(min_lng, max_lng)] if min_lng <= max_lng else [(min_lng, 180), (-180, max_lng)]
+        )
+
+        # a map tile at zoom level z is 360 / 2^z degrees of longitude wide
+        cluster_precision = get_precision(360 / 2 ** (zoom + 2))
+        tile_precision = max(cluster_precision - 1, 0)
+
+        # bounds the response at every zoom level, including the individual parking spots
+        if get_cell_count(min_lat, max_lat, lng_ranges, tile_precision) > self.max_tiles:
+            raise ValidationError("The viewport is too large for the zoom level")
+
+        if zoom >= settings.PARKING_SPOT_VIEWPORT_SPOT_ZOOM:
+            parking_spots = (
+                ParkingSpot.objects.available()
+                .within_bounding_box(min_lat=min_lat, max_lat=max_lat, lng_ranges=lng_ranges)
+                .order_by("id")
+            )
+            return Response(
+                {
+                    "zoom": zoom,
+                    "clusters": [],
+                    "parking_spots": self.get_serializer(parking_spots, many=True).data,
+                }
+            )
+
+        tiles = get_cells(min_lat, max_lat, lng_ranges, tile_precision)
+        clusters = self.get_clusters(tiles, cluster_precision)
+
+        return Response(
+            {
+                "zoom": zoom,
+                "clusters": [cluster for tile in tiles for cluster in clusters[tile]],
+                "parking_spots": [],
+            }
+        )
+
+    @staticmethod
+    def get_clusters(tiles: list, precision: int) -> dict:
+        """
+        Return a dictionary which maps each tile to its list of clusters with precision
+        characters. The clusters of all tiles missing from the cache are computed in a single
+        query, which groups the available parking spots by their geohash prefix. The clusters are
+        cached under the version of the available parking spots, hence they are invalidated by any
+        change of a parking spot or a reservation.
+        """
+
+        version = get_available_parking_spots_version()
+        cache_keys = {
+            tile: f"parking-spot-clusters:{version}:{precision}:{tile}" for tile in tiles
+        }
+        cached_clusters = cache.get_many(cache_keys.values())
+        clusters = {
+            tile: cached_clusters[key] for tile, key in cache_keys.items() if key in cached_clusters
+        }
+
+        missing_tiles = [tile for tile in tiles if tile not in clusters]
+        if not missing_tiles:
+            return clusters
+
+        # empty tiles are cached too
+        clusters.update({tile: [] for tile in missing_tiles})
+        tile_precision = len(missing_tiles[0])
+        cells = (
+            ParkingSpot.objects.available()
+            .within_geohash_cells(missing_tiles)
+            .annotate(cell=Left("geohash", precision))
+            .values("cell")
+            .annotate(
+                count=Count("id"),
+                centroid_lat=Avg("lat"),
+                centroid_lng=Avg("lng"),
+                min_rate=Min("rate"),
+            )
+            .order_by("cell")
+        )
+        for cell in cells:
+            clusters[cell["cell"][:tile_precision]].append(
+                {
+                    "geohash": cell["cell"],
+                    "count": cell["count"],
+                    "lat": round(float(cell["centroid_lat"]), 6),
+                    "lng": round(float(cell["centroid_lng"]), 6),
+                    "min_rate": f"{cell['min_rate']:.2f}",
+                }
+            )
+
+        cache.set_many(
+            {cache_keys[tile]: clusters[tile] for tile in missing_tiles},
+            timeout=settings.PARKING_SPOT_VIEWPORT_CACHE_TIMEOUT,
+        )
 
-        return available_parking_spots_filtered
+        return clusters
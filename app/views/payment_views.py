@@ -6,6 +6,7 @@ Module for creating Stripe payment intent
 import os
 
 import stripe
+from django.db.models import F
 from django.shortcuts import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -14,19 +15,19 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 # Import Django models / serializers
+from app import outbox
+from app.idempotency import IdempotentPostMixin
 from app.models.reservation import Reservation
-from app.serializers.reservation_serializer import ReservationSerializer
-from utils.payments import get_customer_id, get_stripe_payment_method_object
 
 # Import utility modules
-from utils.send_mail import send_reservation_confirmation_mail
+from utils.payments import get_customer_id
 
 # set secret test API key
 
 stripe.api_key = os.getenv("STRIPE_API_TEST_KEY")
 
 
-class PaymentViewAuth(APIView):
+class PaymentViewAuth(IdempotentPostMixin, APIView):
     """
     Stripe payment views for authenticated users
     """
@@ -51,11 +52,11 @@ class PaymentViewAuth(APIView):
             payment_method_types=["card"],
         )
 
-        # add setup_intent_id to reservation resource
-        data = {"stripe_setup_intent_id": intent.id}
-        serializer = ReservationSerializer(reservation, data=data, partial=True)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        # add setup_intent_id to reservation resource, whatever its version, hence an amendment
+        # or release since it was read does not orphan the SetupIntent created above
+        Reservation.objects.filter(id=reservation.id).update(
+            stripe_setup_intent_id=intent.id, version=F("version") + 1
+        )
 
         return Response({"clientSecret": intent.client_secret}, status=201)
 
@@ -67,31 +68,13 @@ class PaymentViewAuth(APIView):
 
         reservation = get_object_or_404(Reservation, id=reservation_id)
 
-        payment_method = get_stripe_payment_method_object(reservation_id)
-
-        # send reservation confirmation email to user
-        # pass datetime format instead of stringified time from response object
-        print(reservation.email)
-        print(reservation.parking_spot.id)
-        print(reservation.rate)
-        print(reservation.id)
-        print(reservation.start_time)
-        print(reservation.end_time)
-        print(payment_method.card["last4"])
-        send_reservation_confirmation_mail(
-            user_mail_address=reservation.email,
-            parking_spot_id=reservation.parking_spot.id,
-            rate=reservation.rate,
-            reservation_id=reservation.id,
-            start_time=reservation.start_time,
-            end_time=reservation.end_time,
-            last4card=payment_method.card["last4"],
-        )
+        # send reservation confirmation email to user, see app.outbox
+        outbox.enqueue("reservation_confirmation_mail", reservation_id=reservation.id)
 
         return Response(status=204)
 
 
-class PaymentViewUnauth(APIView):
+class PaymentViewUnauth(IdempotentPostMixin, APIView):
     """
     Stripe payment views for unauthenticated users
     """
@@ -116,11 +99,11 @@ class PaymentViewUnauth(APIView):
             payment_method_types=["card"],
         )
 
-        # add setup_intent_id to reservation resource
-        data = {"stripe_setup_intent_id": intent.id}
-        serializer = ReservationSerializer(reservation, data=data, partial=True)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        # add setup_intent_id to reservation resource, whatever its version, hence an amendment
+        # or release since it was read does not orphan the SetupIntent created above
+        Reservation.objects.filter(id=reservation.id).update(
+            stripe_setup_intent_id=intent.id, version=F("version") + 1
+        )
 
         return Response({"clientSecret": intent.client_secret}, status=201)
 
@@ -132,18 +115,7 @@ class PaymentViewUnauth(APIView):
 
         reservation = get_object_or_404(Reservation, id=reservation_id, email=email)
 
-        payment_method = get_stripe_payment_method_object(reservation_id)
-
-        # send reservation confirmation email to user
-        # pass datetime format instead of stringified time from response object
-        send_reservation_confirmation_mail(
-            user_mail_address=reservation.email,
-            parking_spot_id=reservation.parking_spot.id,
-            rate=reservation.rate,
-            reservation_id=reservation.id,
-            start_time=reservation.start_time,
-            end_time=reservation.end_time,
-            last4card=payment_method.card["last4"],
-        )
+        # send reservation confirmation email to user, see app.outbox
+        outbox.enqueue("reservation_confirmation_mail", reservation_id=reservation.id)
 
         return Response(status=204)
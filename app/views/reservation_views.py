@@ -4,26 +4,192 @@ Module for all reservation views
 
 # import Python modules
 import datetime
+from collections import defaultdict
 
 # import Django / RestFramework modules
-from django.core.cache import cache
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import serializers
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 # import utils
-from utils.payments import get_stripe_payment_method_object
-from utils.send_mail import send_reservation_amendment_confirmation_mail
+from utils.cache import bump_available_parking_spots_version
 
 # import custom modules
+from .. import expiry_schedule, outbox
+from ..idempotency import IdempotentPostMixin
+from ..models.archived_reservation import ArchivedReservation
 from ..models.parking_spot import ParkingSpot
 from ..models.reservation import Reservation
-from ..serializers.reservation_serializer import ReservationSerializer
-from ..tasks.tasks import unreserve_parking_spot
+from ..pagination import StartTimeKeysetPagination
+from ..serializers.reservation_serializer import (
+    BatchReservationSerializer,
+    ReservationSerializer,
+    ReservationVersionConflict,
+)
 
 
-class ReservationViewAuth(APIView):
+def get_etag(reservation) -> str:
+    """
+    Return the ETag of the reservation, which is its version
+    """
+
+    return f'"{reservation.version}"'
+
+
+def check_if_match(request, reservation):
+    """
+    Raise ReservationVersionConflict if the request has an If-Match header which does not match
+    the ETag of the reservation, i.e. the client has read a previous version of the reservation.
+    Without the header the update is conditional on the version read by the view.
+    """
+
+    if_match = request.headers.get("If-Match")
+    if not if_match:
+        return
+
+    etags = parse_etags(if_match)
+    if "*" not in etags and get_etag(reservation) not in etags:
+        raise ReservationVersionConflict()
+
+
+def send_amendment_mail(reservation, end_time):
+    """
+    Enqueue the email to the user confirming the amended reservation details. If end_time is
+    within the next minute, do not send an amendment confirmation email, instead just rely on the
+    expiration email.
+    """
+
+    if end_time - datetime.datetime.now() > datetime.timedelta(minutes=1):
+        outbox.enqueue(
+            "reservation_amendment_mail",
+            reservation_id=reservation.id,
+            end_time=reservation.end_time,
+        )
+
+
+def create_reservation(parking_spot_id, data, user):
+    """
+    Create the reservation of the parking spot described by data at the going rate of the parking
+    spot and return its serializer. The exclusion constraint on the reservation periods ensures
+    that two concurrent requests cannot both reserve the same parking spot for overlapping
+    periods, the second one fails validation.
+    """
+
+    parking_spot = get_object_or_404(ParkingSpot, id=parking_spot_id)
+
+    serializer = ReservationSerializer(
+        data={**data, "parking_spot": parking_spot, "rate": parking_spot.rate},
+        context={"user": user},
+    )
+
+    # throw a validation exception and send a response if validation fails
+    serializer.is_valid(raise_exception=True)
+
+    # otherwise save the new reservation
+    serializer.save()
+
+    return serializer
+
+
+def create_reservations(items, user, all_or_nothing=True):
+    """
+    Reserve the parking spots of a batch for the authenticated user, starting now, and return a
+    list with one result per item of the batch and the list of the new reservations. Each item is
+    a dict of a parking spot id and a reservation length in minutes.
+
+    The parking spots and their current reservations are read with one query each and the new
+    reservations are inserted with a single bulk_create(). If all_or_nothing is True, no
+    parking spot is reserved unless all of them can be reserved.
+    """
+
+    start_time = timezone.now().replace(second=0, microsecond=0)
+    parking_spot_ids = [item["parking_spot"] for item in items]
+    end_times = [
+        start_time + datetime.timedelta(minutes=item["reservation_length"]) for item in items
+    ]
+
+    parking_spots = ParkingSpot.objects.in_bulk(parking_spot_ids)
+
+    # the start times of the reservations which overlap the batch, all of them end after now
+    reserved_start_times = defaultdict(list)
+    for parking_spot_id, reserved_start_time in (
+        Reservation.objects.filter(parking_spot_id__in=parking_spot_ids)
+        .overlapping(start_time, max(end_times))
+        .values_list("parking_spot_id", "start_time")
+    ):
+        reserved_start_times[parking_spot_id].append(reserved_start_time)
+
+    errors = {}
+    reservations = {}
+    for i, (parking_spot_id, end_time) in enumerate(zip(parking_spot_ids, end_times)):
+        parking_spot = parking_spots.get(parking_spot_id)
+        if parking_spot is None:
+            errors[i] = {"parking_spot": ["Not found."]}
+        elif not parking_spot.active:
+            errors[i] = {
+                "parking_spot": ["This parking spot is currently not commercially available"]
+            }
+        elif any(reserved < end_time for reserved in reserved_start_times[parking_spot_id]):
+            errors[i] = ReservationSerializer.overlap_error
+        else:
+            reservations[i] = Reservation(
+                user=user,
+                email=user.email,
+                parking_spot=parking_spot,
+                rate=parking_spot.rate,
+                start_time=start_time,
+                end_time=end_time,
+            )
+            # a parking spot which appears twice in the batch is only reserved once
+            reserved_start_times[parking_spot_id].append(start_time)
+
+    if all_or_nothing and errors:
+        reservations = {}
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                Reservation.objects.bulk_create(reservations.values())
+        except IntegrityError:
+            # a concurrent request has reserved one of the parking spots since the check above,
+            # insert the reservations one by one to find out which
+            for i, reservation in list(reservations.items()):
+                try:
+                    ReservationSerializer().save_atomically(reservation.save)
+                except serializers.ValidationError as error:
+                    errors[i] = error.detail
+                    del reservations[i]
+
+            if all_or_nothing and errors:
+                transaction.set_rollback(True)
+                reservations = {}
+
+        # bulk_create() does not send the post_save signal which invalidates the cache
+        if reservations:
+            transaction.on_commit(bump_available_parking_spots_version)
+
+    serialized_reservations = dict(
+        zip(reservations, ReservationSerializer(reservations.values(), many=True).data)
+    )
+
+    results = []
+    for i, parking_spot_id in enumerate(parking_spot_ids):
+        result = {"parking_spot": parking_spot_id, "reserved": i in reservations}
+        if i in reservations:
+            result["reservation"] = serialized_reservations[i]
+        elif i in errors:
+            result["errors"] = errors[i]
+        results.append(result)
+
+    return results, list(reservations.values())
+
+
+class ReservationViewAuth(IdempotentPostMixin, APIView):
     """
     API view for creating a new reservation, retrieving all open reservations and changing a
     reservation.
@@ -37,55 +203,31 @@ class ReservationViewAuth(APIView):
         """
 
         # setup the components that make up the data object that needs serializing
-        rate = ParkingSpot.objects.get(id=parking_spot_id).rate
         # create datetime object and strip seconds and microseconds off
         time_now = datetime.datetime.now().replace(second=0, microsecond=0)
         reservation_duration = int(request.data["reservation"]["reservation_length"])
         time_delta = datetime.timedelta(minutes=reservation_duration)
         # storing the user's email on the reservation makes sending notification emails easier
         data = {
-            "user": request.user.id,
+            "user": request.user,
             "email": request.user.email,
-            "parking_spot": parking_spot_id,
-            "rate": rate,
             "start_time": time_now,
             "end_time": time_now + time_delta,
         }
 
-        # serialize the data stream
-        serializer = ReservationSerializer(data=data, context={"user": request.user})
-
-        # throw a validation exception and send a response if validation fails
-        serializer.is_valid(raise_exception=True)
-
-        # otherwise save the new reservation
-        serializer.save()
-
-        # and set the related parking spot status to reserved=true
-        parking_spot = get_object_or_404(ParkingSpot, id=parking_spot_id)
-        parking_spot.reserved = True
-        parking_spot.save()
-
-        # set a task that makes the same parking spot available for reservation again after the
-        # reservation length is up
-        task = unreserve_parking_spot.apply_async(
-            args=[parking_spot_id, serializer.data["id"]],
-            countdown=float(reservation_duration * 60),
-        )
-
-        print("============= task object START =============")
-        print(dir(task))
-        print("============= task object END =============")
+        # reserve the parking spot and save the new reservation
+        serializer = create_reservation(parking_spot_id, data, request.user)
 
-        # save key / value pair of reservation_id / task_id
-        cache.set(serializer.data["id"], task.task_id)
+        # make the same parking spot available for reservation again after the reservation length
+        # is up, see app.expiry_schedule
+        expiry_schedule.schedule(serializer.instance)
 
         # declare the response variable such that the email or user key can be removed before
         # sending a JSON response
         response = serializer.data
 
         # send the response
-        return Response(data=response)
+        return Response(data=response, headers={"ETag": get_etag(serializer.instance)})
 
     def get(self, request):
         """
@@ -120,52 +262,26 @@ class ReservationViewAuth(APIView):
         # set end_time on data dictionary
         data = {"end_time": end_time}
 
+        # reject the amendment if the client has read a previous version of the reservation
+        check_if_match(request, reservation)
+
         serializer = ReservationSerializer(reservation, data=data, partial=True)
 
         serializer.is_valid(raise_exception=True)
 
-        serializer.save()
-
-        # retrieve task_id associated with reservation_id from Redis cache
-        cache.get(serializer.data["id"])
+        with transaction.atomic():
+            # the update is conditional on the version, a concurrent amendment results in a 409
+            serializer.save()
 
-        # revoke existing task to reset availability of reserved parking spot
-        # this feature did not work because the worker got shut down automatically by Heroku
-        # https://stackoverflow.com/questions/8920643/cancel-an-already-executing-task-with-celery
-        # app.control.revoke(task_id=task_id, terminate=True)
+            # re-score the reservation in the expiry schedule rather than revoking its task, see
+            # app.expiry_schedule
+            expiry_schedule.schedule(reservation)
+            send_amendment_mail(reservation, end_time)
 
-        # set new task with new end_time param
-        task = unreserve_parking_spot.apply_async(
-            args=[reservation.parking_spot.id, reservation.id],
-            eta=reservation.end_time,
+        return Response(
+            data=serializer.data, status=200, headers={"ETag": get_etag(reservation)}
         )
 
-        print("============= task object START =============")
-        print(dir(task))
-        print("============= task object END =============")
-
-        # save reservation_id / task_id key / value pair in Redis cache
-        cache.set(serializer.data["id"], task.task_id)
-
-        # send email to user, confirming amended reservation details
-        # if end_time is within the next two minutes, do not send an amendment confirmation email,
-        # instead just rely on expiration email
-        if end_time - datetime.datetime.now() > datetime.timedelta(minutes=1):
-            payment_method = get_stripe_payment_method_object(reservation_id)
-
-            # send email to user, confirming amended reservation details
-            send_reservation_amendment_confirmation_mail(
-                user_mail_address=reservation.email,
-                parking_spot_id=reservation.parking_spot.id,
-                rate=reservation.rate,
-                reservation_id=reservation.id,
-                start_time=reservation.start_time,
-                end_time=reservation.end_time,
-                last4card=payment_method.card["last4"],
-            )
-
-        return Response(data=serializer.data, status=200)
-
     def delete(self, request, reservation_id):
         """
         This end-point is called if a reservation was made but the payment process was not
@@ -176,16 +292,56 @@ class ReservationViewAuth(APIView):
         reservation = get_object_or_404(
             Reservation, id=reservation_id, email=request.user.email
         )
-        # reset parking spot availability
-        reservation.parking_spot.reserved = False
 
-        # delete reservation
+        # delete reservation, which makes the parking spot available again
         reservation.delete()
 
         return Response(status=204)
 
 
-class ReservationViewUnauth(APIView):
+class BatchReservationViewAuth(IdempotentPostMixin, APIView):
+    """
+    API view for reserving many parking spots at once, e.g. for fleet accounts
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Reserve the parking spots of the batch for the authenticated user. The request body could
+        look like this:
+        {"reservations": [{"parking_spot": 1, "reservation_length": 60}, ...],
+         "all_or_nothing": false}
+
+        The response holds one result per item of the batch, in the same order. Each result
+        holds the parking spot id, whether it has been reserved, and either the new reservation
+        or the errors. If all_or_nothing is true and any parking spot cannot be reserved, none
+        is and the response status is 400.
+
+        The expiry of all reservations of the batch is scheduled at once, see
+        app.expiry_schedule.
+        """
+
+        serializer = BatchReservationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            results, reservations = create_reservations(
+                serializer.validated_data["reservations"],
+                request.user,
+                all_or_nothing=serializer.validated_data["all_or_nothing"],
+            )
+
+            if not reservations:
+                return Response(data={"results": results}, status=400)
+
+            # one round trip to Redis for the whole batch
+            expiry_schedule.schedule(*reservations)
+
+        return Response(data={"results": results})
+
+
+class ReservationViewUnauth(IdempotentPostMixin, APIView):
     """
     API view for creating a new reservation, retrieving a specific reservation and changing a
     specific reservation.
@@ -200,52 +356,28 @@ class ReservationViewUnauth(APIView):
         """
 
         # setup the components that make up the data object that needs serializing
-        rate = ParkingSpot.objects.get(id=parking_spot_id).rate
         # create datetime object and strip seconds and microseconds off
         time_now = datetime.datetime.now().replace(second=0, microsecond=0)
         reservation_duration = int(request.data["reservation"]["reservation_length"])
         time_delta = datetime.timedelta(minutes=reservation_duration)
         data = {
             "email": request.data["reservation"]["email"],
-            "parking_spot": parking_spot_id,
-            "rate": rate,
             "start_time": time_now,
             "end_time": time_now + time_delta,
         }
 
-        # serialize the data stream
-        serializer = ReservationSerializer(data=data, context={"user": request.user})
-
-        # throw a validation exception and send a response if validation fails
-        serializer.is_valid(raise_exception=True)
-
-        # otherwise save the new reservation
-        serializer.save()
+        # reserve the parking spot and save the new reservation
+        serializer = create_reservation(parking_spot_id, data, request.user)
 
-        # set the related parking spot status to reserved=true
-        parking_spot = get_object_or_404(ParkingSpot, id=parking_spot_id)
-        parking_spot.reserved = True
-        parking_spot.save()
-
-        # set a task that makes the same parking spot available for reservation again after the
-        # reservation length is up
-        task = unreserve_parking_spot.apply_async(
-            args=[parking_spot_id, serializer.data["id"]],
-            eta=time_now + time_delta,
-        )
-
-        print("============= task object START =============")
-        print(dir(task))
-        print("============= task object END =============")
-
-        # save key / value pair of reservation_id / task_id to Redis cache
-        cache.set(serializer.data["id"], task.task_id)
+        # make the same parking spot available for reservation again after the reservation length
+        # is up, see app.expiry_schedule
+        expiry_schedule.schedule(serializer.instance)
 
         # declare the response variable
         response = serializer.data
 
         # send the response to the client
-        return Response(data=response)
+        return Response(data=response, headers={"ETag": get_etag(serializer.instance)})
 
     def get(self, request, reservation_id, email):
         """
@@ -258,7 +390,7 @@ class ReservationViewUnauth(APIView):
         reservation = get_object_or_404(Reservation, id=reservation_id, email=email)
 
         # if the reservation was made by an authenticated user reject the request
-        if reservation.user:
+        if reservation.user_id:
             return Response(
                 {
                     "error": "This reservation belongs to an authenticated account. "
@@ -270,8 +402,8 @@ class ReservationViewUnauth(APIView):
         # serialize the data
         serializer = ReservationSerializer(reservation)
 
-        # send the response
-        return Response(serializer.data, status=200)
+        # send the response, the ETag is the version to send with If-Match to amend the reservation
+        return Response(serializer.data, status=200, headers={"ETag": get_etag(reservation)})
 
     def patch(self, request, reservation_id, email):
         """
@@ -293,46 +425,26 @@ class ReservationViewUnauth(APIView):
         # set end_time on data dictionary
         data = {"end_time": end_time}
 
+        # reject the amendment if the client has read a previous version of the reservation
+        check_if_match(request, reservation)
+
         serializer = ReservationSerializer(reservation, data=data, partial=True)
 
         serializer.is_valid(raise_exception=True)
 
-        # save the new reservation instance
-        serializer.save()
-
-        # retrieve task_id associated with reservation_id from Redis cache
-        cache.get(serializer.data["id"])
+        with transaction.atomic():
+            # save the new reservation instance, the update is conditional on the version and a
+            # concurrent amendment results in a 409
+            serializer.save()
 
-        # set new task with new end_time param
-        task = unreserve_parking_spot.apply_async(
-            args=[reservation.parking_spot.id, reservation.id],
-            eta=reservation.end_time,
-        )
-
-        print("============= task object START =============")
-        print(dir(task))
-        print("============= task object END =============")
-
-        # save reservation_id / task_id key / value pair in Redis cache
-        cache.set(serializer.data["id"], task.task_id)
-
-        # send email to user, confirming amended reservation details
-        # if end_time is within the next two minutes, do not send an amendment confirmation email,
-        # instead just rely on expiration email
-        if end_time - datetime.datetime.now() > datetime.timedelta(minutes=1):
-            payment_method = get_stripe_payment_method_object(reservation.id)
-            send_reservation_amendment_confirmation_mail(
-                user_mail_address=reservation.email,
-                parking_spot_id=reservation.parking_spot.id,
-                rate=reservation.rate,
-                reservation_id=reservation.id,
-                start_time=reservation.start_time,
-                end_time=reservation.end_time,
-                last4card=payment_method.card["last4"],
-            )
+            # end the reservation at the new end_time and confirm the amendment
+            expiry_schedule.schedule(reservation)
+            send_amendment_mail(reservation, end_time)
 
         # return response to client
-        return Response(data=serializer.data, status=200)
+        return Response(
+            data=serializer.data, status=200, headers={"ETag": get_etag(reservation)}
+        )
 
     def delete(self, request, reservation_id, email):
         """
@@ -343,12 +455,7 @@ class ReservationViewUnauth(APIView):
 
         reservation = get_object_or_404(Reservation, id=reservation_id, email=email)
 
-        # reset parking spot availability
-        parking_spot = ParkingSpot.objects.get(id=reservation.parking_spot.id)
-        parking_spot.reserved = False
-        parking_spot.save()
-
-        # delete reservation
+        # delete reservation, which makes the parking spot available again
         reservation.delete()
 
         return Response(status=204)
@@ -363,11 +470,30 @@ class GetExpiredReservationsAuth(APIView):
 
     def get(self, request):
         """
-        Retrieve all expired reservations owned by authenticated user and return the serialized
-        result
+        Retrieve all expired reservations owned by authenticated user, from the reservation table
+        and from the archive of expired reservations, and return the serialized result. The
+        history is paginated if the limit query param is provided, see
+        StartTimeKeysetPagination.
         """
 
-        expired_reservations = Reservation.objects.filter(paid=True, user=request.user)
-        sorted_expired_reservations = expired_reservations.order_by("-start_time")
-        serializer = ReservationSerializer(sorted_expired_reservations, many=True)
+        # the rows of both tables are read with values() and serialized without building model
+        # instances, the archive has the columns of the reservation table
+        columns = [field.attname for field in Reservation._meta.concrete_fields]
+        expired_reservations = [
+            Reservation.objects.filter(paid=True, user=request.user).values(*columns),
+            ArchivedReservation.objects.filter(user=request.user).values(*columns),
+        ]
+
+        paginator = StartTimeKeysetPagination()
+        page = paginator.paginate_queryset(expired_reservations, request, self)
+        if page is not None:
+            serializer = ReservationSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+
+        sorted_expired_reservations = (
+            expired_reservations[0]
+            .union(expired_reservations[1], all=True)
+            .order_by(*StartTimeKeysetPagination.ordering)
+        )
+        serializer = ReservationSerializer(list(sorted_expired_reservations), many=True)
         return Response(serializer.data)
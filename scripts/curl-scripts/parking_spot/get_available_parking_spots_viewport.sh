@@ -0,0 +1,14 @@
+#!/bin/bash
+
+curl "http://localhost:8000/available-parking-spots-viewport?"`
+      `"min_lat=40.70&"`
+      `"min_lng=-74.02&"`
+      `"max_lat=40.80&"`
+      `"max_lng=-73.93&"`
+      `"zoom=13" \
+  --include \
+  --request GET \
+  --header "Content-Type: application/json" \
+
+echo
+echo
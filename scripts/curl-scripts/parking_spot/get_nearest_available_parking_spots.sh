@@ -0,0 +1,14 @@
+#!/bin/bash
+
+curl "http://localhost:8000/available-parking-spots-nearest?"`
+      `"lat=40.767208&"`
+      `"lng=-73.992041&"`
+      `"k=10&"`
+      `"unit=km&"`
+      `"dist=1" \
+  --include \
+  --request GET \
+  --header "Content-Type: application/json" \
+
+echo
+echo
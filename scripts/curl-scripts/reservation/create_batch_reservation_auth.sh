@@ -0,0 +1,17 @@
+#!/bin/bash
+
+curl "http://localhost:8000/reservation-auth/batch/" \
+  --include \
+  --request POST \
+  --header "Content-Type: application/json" \
+  --header "Authorization: Token ${token}" \
+  --data '{
+    "reservations": [
+      {"parking_spot": '"${spot_id_1}"', "reservation_length": '"${length}"'},
+      {"parking_spot": '"${spot_id_2}"', "reservation_length": '"${length}"'}
+    ],
+    "all_or_nothing": '"${all_or_nothing:-true}"'
+  }'
+
+echo
+echo
@@ -303,6 +303,87 @@ else:
     # https://devcenter.heroku.com/articles/cloudamqp#celery
     CELERY_BROKER_POOL_LIMIT = 1
 
+# Queues of the tasks, hence a slow Stripe API or SMTP relay never delays the release of parking
+# spots: release (the expiry of reservations), payments (charging customers) and notifications
+# (emails, including those relayed from the outbox). Tasks which are not routed go to the default
+# celery queue.
+CELERY_TASK_ROUTES = {
+    "app.tasks.tasks.expire_due_reservations": {"queue": "release"},
+    "app.tasks.tasks.expire_reservations": {"queue": "release"},
+    "app.tasks.tasks.unreserve_parking_spot": {"queue": "release"},
+    "app.tasks.tasks.unreserve_parking_spots": {"queue": "release"},
+    "app.tasks.tasks.charge_reservations": {"queue": "payments"},
+    "app.tasks.tasks.charge_reservation": {"queue": "payments"},
+    "app.tasks.tasks.notify_reservations": {"queue": "notifications"},
+    "app.tasks.tasks.relay_outbox_messages": {"queue": "notifications"},
+}
+
+# The worker of each queue (see the celery_autoload command and the docker-compose files), the
+# queues it consumes, its number of processes and its prefetch multiplier. The release tasks are
+# short, hence the worker prefetches several of them per process, whereas a payments or
+# notifications process reserves one task at a time, such that the tasks behind a slow one are
+# taken by an idle process instead of waiting.
+CELERY_WORKER_QUEUES = {
+    "release": {"queues": ["release"], "concurrency": 2, "prefetch_multiplier": 4},
+    "payments": {"queues": ["payments"], "concurrency": 4, "prefetch_multiplier": 1},
+    "notifications": {
+        "queues": ["notifications", "celery"],
+        "concurrency": 4,
+        "prefetch_multiplier": 1,
+    },
+}
+
+# Transactional outbox of the side effects of the reservation and payment views (see app.outbox)
+# the number of seconds between two runs of the relay, the number of messages published per
+# batch, and the number of failed attempts after which a message is no longer published
+OUTBOX_RELAY_INTERVAL = 2
+OUTBOX_RELAY_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+# the number of seconds a relay has to publish the batch it has claimed, after which another
+# relay may claim the messages it has not published
+OUTBOX_CLAIM_TIMEOUT = 300
+
+# Archive of expired reservations (see app.models.archived_reservation), the number of days
+# after which a paid reservation is moved to the archive, and the number of reservations moved
+# per batch by the archive_reservations command
+RESERVATION_ARCHIVE_AFTER_DAYS = 90
+RESERVATION_ARCHIVE_BATCH_SIZE = 1000
+
+# Expiry of reservations (see app.tasks.tasks.expire_due_reservations), the number of seconds
+# between two sweeps for reservations whose end_time has passed, i.e. the longest a parking spot
+# stays reserved after the end of its reservation, the number of reservations ended per batch,
+# and the number of threads which charge and notify the customers of a batch concurrently
+RESERVATION_EXPIRY_INTERVAL = 10
+RESERVATION_EXPIRY_BATCH_SIZE = 100
+RESERVATION_EXPIRY_WORKERS = 8
+
+# Retries of the charges which failed with a transient error (see
+# app.tasks.tasks.charge_reservation), the number of retries before the charge is recorded as a
+# dead letter (see app.models.failed_charge), and the factor and the maximum in seconds of the
+# exponential backoff between two retries, which is jittered
+CHARGE_MAX_RETRIES = 5
+CHARGE_RETRY_BACKOFF = 10
+CHARGE_RETRY_BACKOFF_MAX = 600
+
+# Redis schedule of the reservation expiry (see app.expiry_schedule), the key of the sorted set of
+# the reservations by end_time in the Redis instance of the cache, and the number of seconds the
+# run_expiry_scheduler command waits between two polls, i.e. its precision
+RESERVATION_EXPIRY_SCHEDULE_KEY = "reservation-expiry-schedule"
+RESERVATION_EXPIRY_SCHEDULER_INTERVAL = 0.2
+
+# the relay and the expiry sweeper run on Celery beat, which is embedded in the release worker
+# (celery worker --beat)
+CELERY_BEAT_SCHEDULE = {
+    "relay-outbox-messages": {
+        "task": "app.tasks.tasks.relay_outbox_messages",
+        "schedule": OUTBOX_RELAY_INTERVAL,
+    },
+    "expire-due-reservations": {
+        "task": "app.tasks.tasks.expire_due_reservations",
+        "schedule": RESERVATION_EXPIRY_INTERVAL,
+    },
+}
+
 # Email client settings
 # https://www.sitepoint.com/django-send-email/
 EMAIL_HOST = "smtp-relay.sendinblue.com"
@@ -321,3 +402,28 @@ CACHES = {
         "KEY_PREFIX": "django",
     }
 }
+
+# Process-local spatial index of all active parking spots (see utils.spatial_index)
+# the side length of a grid cell in degrees (~1.1km of latitude)
+PARKING_SPOT_INDEX_CELL_SIZE = 0.01
+# the number of seconds after which the index is rebuilt from the db to pick up changes saved by
+# other processes
+PARKING_SPOT_INDEX_MAX_AGE = 300
+
+# Viewport (map tile) endpoint with clustered parking spots (see app.views.parking_spot_views)
+# the zoom level from which on individual parking spots are returned instead of clusters
+PARKING_SPOT_VIEWPORT_SPOT_ZOOM = 16
+# the number of seconds for which the clusters of a tile are cached
+PARKING_SPOT_VIEWPORT_CACHE_TIMEOUT = 30
+
+# the number of seconds for which a payload of the available parking spots list is cached under
+# its version (see utils.cache), which is also the longest time the list misses reservations
+# starting or ending
+AVAILABLE_PARKING_SPOTS_CACHE_TIMEOUT = 60
+
+# Idempotency-Key support of the POST endpoints (see app.idempotency)
+# the number of seconds for which the response to a request with an idempotency key is replayed
+IDEMPOTENCY_KEY_TIMEOUT = 24 * 60 * 60
+# the number of seconds after which the lock of a request in progress expires, which is also the
+# longest time a concurrent retry waits for the response
+IDEMPOTENCY_LOCK_TIMEOUT = 30
@@ -0,0 +1,40 @@
+"""
+Module for the versioned cache of the available parking spots
+"""
+
+import time
+
+from django.core.cache import cache
+
+# the key of the version of the available parking spots, which is bumped whenever a parking spot
+# changes
+AVAILABLE_PARKING_SPOTS_VERSION_KEY = "available-parking-spots-version"
+
+
+def get_available_parking_spots_version() -> int:
+    """
+    Return the current version of the available parking spots
+    """
+
+    version = cache.get(AVAILABLE_PARKING_SPOTS_VERSION_KEY)
+    if version is None:
+        # the initial version is time based, hence versions are not reused after the key has been
+        # evicted, which could otherwise match stale ETags held by clients
+        cache.add(AVAILABLE_PARKING_SPOTS_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(AVAILABLE_PARKING_SPOTS_VERSION_KEY)
+
+    return version
+
+
+def bump_available_parking_spots_version() -> int:
+    """
+    Atomically increment the version of the available parking spots and return the new version.
+    Payloads cached under previous versions are no longer read and expire.
+    """
+
+    try:
+        return cache.incr(AVAILABLE_PARKING_SPOTS_VERSION_KEY)
+    except ValueError:
+        # the key does not exist yet or has been evicted
+        cache.add(AVAILABLE_PARKING_SPOTS_VERSION_KEY, time.time_ns(), timeout=None)
+        return cache.incr(AVAILABLE_PARKING_SPOTS_VERSION_KEY)
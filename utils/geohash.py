@@ -0,0 +1,128 @@
+"""
+Module for encoding GPS coordinates as geohashes
+Source: https://en.wikipedia.org/wiki/Geohash
+"""
+
+import math
+
+# the geohash alphabet omits the letters a, i, l, and o
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# the maximum precision stored on the parking spot model (~3.7cm x 1.9cm cells)
+MAX_PRECISION = 12
+
+
+def encode(lat: float, lng: float, precision: int = MAX_PRECISION) -> str:
+    """
+    Return the geohash of the GPS coordinate (lat, lng) with precision characters. Each character
+    interleaves 5 bits of the bisected longitude and latitude intervals, starting with longitude.
+    """
+
+    lat_interval = [-90.0, 90.0]
+    lng_interval = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    is_lng_bit = True
+
+    while len(geohash) < precision:
+        interval, value = (lng_interval, lng) if is_lng_bit else (lat_interval, lat)
+        mid = (interval[0] + interval[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            interval[0] = mid
+        else:
+            bits = bits * 2
+            interval[1] = mid
+
+        is_lng_bit = not is_lng_bit
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(geohash)
+
+
+def get_cell_size(precision: int) -> tuple:
+    """
+    Return the (height, width) in degrees of a geohash cell with precision characters
+    """
+
+    lat_bits = 5 * precision // 2
+    lng_bits = 5 * precision - lat_bits
+    return 180 / 2 ** lat_bits, 360 / 2 ** lng_bits
+
+
+def get_precision(width: float) -> int:
+    """
+    Return the lowest precision whose cells are no wider than width degrees of longitude
+    """
+
+    for precision in range(MAX_PRECISION + 1):
+        if get_cell_size(precision)[1] <= width:
+            return precision
+
+    return MAX_PRECISION
+
+
+def get_cells(min_lat: float, max_lat: float, lng_ranges: list, precision: int) -> list:
+    """
+    Return the geohashes with precision characters of the cells which cover the lat/lng bounding
+    box, see utils.utils.get_bounding_box
+    """
+
+    height, width = get_cell_size(precision)
+    min_row, max_row = math.floor((min_lat + 90) / height), math.floor((max_lat + 90) / height)
+    col_ranges = [
+        (math.floor((min_lng + 180) / width), math.floor((max_lng + 180) / width))
+        for min_lng, max_lng in lng_ranges
+    ]
+
+    # encode the centre of each cell, clamped to the valid range of coordinates
+    return sorted(
+        {
+            encode(
+                min(-90 + (row + 0.5) * height, 90), min(-180 + (col + 0.5) * width, 180), precision
+            )
+            for row in range(min_row, max_row + 1)
+            for min_col, max_col in col_ranges
+            for col in range(min_col, max_col + 1)
+        }
+    )
+
+
+def get_cell_count(min_lat: float, max_lat: float, lng_ranges: list, precision: int) -> int:
+    """
+    Return the number of cells with precision characters needed to cover the lat/lng bounding box
+    """
+
+    height, width = get_cell_size(precision)
+    row_count = math.floor((max_lat + 90) / height) - math.floor((min_lat + 90) / height) + 1
+    col_count = sum(
+        math.floor((max_lng + 180) / width) - math.floor((min_lng + 180) / width) + 1
+        for min_lng, max_lng in lng_ranges
+    )
+    return row_count * col_count
+
+
+def get_covering_cells(
+    min_lat: float, max_lat: float, lng_ranges: list, max_cells: int = 16
+) -> list:
+    """
+    Return the geohashes of the cells which cover the lat/lng bounding box, see
+    utils.utils.get_bounding_box. The precision is the highest one for which no more than
+    max_cells cells are needed.
+    """
+
+    precision = next(
+        (
+            precision
+            for precision in range(MAX_PRECISION, 0, -1)
+            if get_cell_count(min_lat, max_lat, lng_ranges, precision) <= max_cells
+        ),
+        1,
+    )
+
+    return get_cells(min_lat, max_lat, lng_ranges, precision)
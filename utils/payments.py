@@ -3,17 +3,15 @@ Module for payments processing
 """
 
 import os
-from app.models.reservation import Reservation
 import stripe
 
 
-def get_total_reservation_fee(reservation_id):
+def get_total_reservation_fee(reservation):
     """
     Return the total reservation fee based on the reservation duration and the hourly rate,
     formatted to two decimal places
     """
 
-    reservation = Reservation.objects.get(id=reservation_id)
     duration_minutes = reservation.duration
     rate_per_hour = reservation.rate
     return round(duration_minutes * rate_per_hour / 60, 2)
@@ -45,65 +43,112 @@ def get_customer_id(email):
     raise Exception("Two or more Stripe customers have the same email address")
 
 
-def charge_customer(reservation_id):
+class ChargeError(Exception):
     """
-    Retrieve stripe_setup_intent_id from database. Use that id to retrieve the setup intent
-    object which includes the customer id. Retrieve the payment method id with the customer_id.
-    Create a payment intent with the customer_id and payment_method_id.
+    Raised if the customer of a reservation could not be charged. The code is the Stripe error
+    code, e.g. card_declined. The outcome is unknown if Stripe has not answered, e.g. the
+    connection dropped, hence the payment intent may have been created.
     """
 
-    # retrieve stripe_setup_intent_id from reservation resource
-    reservation = Reservation.objects.get(id=reservation_id)
-    stripe_setup_intent_id = reservation.stripe_setup_intent_id
+    def __init__(self, message, code="", outcome_unknown=False):
+        super().__init__(message)
+        self.code = code or ""
+        self.outcome_unknown = outcome_unknown
+
+
+class TransientChargeError(ChargeError):
+    """
+    Raised if the charge failed for a reason which may go away, e.g. a Stripe outage or rate
+    limit, hence the charge is retried
+    """
 
-    # set secret test API key
-    stripe.api_key = os.getenv("STRIPE_API_TEST_KEY")
 
-    # retrieve setup_intent object
-    setup_intent = stripe.SetupIntent.retrieve(id=stripe_setup_intent_id)
+class PermanentChargeError(ChargeError):
+    """
+    Raised if the charge failed for a reason which does not go away by retrying, e.g. a declined
+    card or an invalid request, hence the charge is not retried
+    """
 
-    # assign customer_id and payment_method_id
-    stripe_customer_id = setup_intent.customer
-    stripe_payment_method_id = setup_intent.payment_method
 
-    payment_amount = int(get_total_reservation_fee(reservation_id) * 100)
+def classify_stripe_error(error) -> ChargeError:
+    """
+    Return the transient or permanent ChargeError of the Stripe error
+    """
 
-    if payment_amount >= 1:
-        try:
-            #  create payment intent
-            stripe.PaymentIntent.create(
-                amount=payment_amount,
-                currency="usd",
-                customer=stripe_customer_id,
-                payment_method=stripe_payment_method_id,
-                off_session=True,
-                confirm=True,
-            )
+    if isinstance(error, stripe.error.APIConnectionError):
+        return TransientChargeError(str(error), code=error.code, outcome_unknown=True)
 
-            # set paid field to True
-            reservation = Reservation.objects.get(id=reservation_id)
-            reservation.paid = True
-            reservation.save()
-        except stripe.error.CardError as e:
-            err = e.error
+    if isinstance(error, (stripe.error.RateLimitError, stripe.error.APIError)) or (
+        error.http_status is not None and error.http_status >= 500
+    ):
+        return TransientChargeError(str(error), code=error.code)
 
-            # Error code will be authentication_required if authentication is needed
-            msg_string = "Attempt to collect from customer {customer} threw error code {code}"
-            print(msg_string.format(customer=stripe_customer_id, code=err.code))
-    else:
+    # card errors, invalid requests and authentication errors
+    return PermanentChargeError(str(error), code=error.code)
 
-        # set paid field to True
-        reservation = Reservation.objects.get(id=reservation_id)
-        reservation.paid = True
-        reservation.save()
 
+def get_next_charge_attempt(attempt: int, error) -> int:
+    """
+    Return the attempt, i.e. the idempotency key (see charge_customer), of the charge which
+    follows the attempt which failed with error.
 
-def get_stripe_payment_method_object(reservation_id):
+    Stripe replays the saved response of a key, errors included, for 24 hours, hence the key is
+    only reused if the outcome of the failed attempt is unknown, in which case the payment intent
+    may have been created and must not be created twice. An error Stripe has answered, e.g. a 5xx
+    or a declined card, is followed by a new key, hence the next attempt is carried out.
     """
-    Return the stripe payment method object
+
+    if isinstance(error, ChargeError) and not error.outcome_unknown:
+        return attempt + 1
+    return attempt
+
+
+def charge_customer(reservation, attempt: int = 0):
+    """
+    Retrieve stripe_setup_intent_id from the reservation. Use that id to retrieve the setup intent
+    object which includes the customer id. Retrieve the payment method id with the customer_id.
+    Create a payment intent with the customer_id and payment_method_id.
+
+    The reservation is released before its customer is charged, see
+    app.tasks.tasks.release_due_reservations. Raise a TransientChargeError or a
+    PermanentChargeError if Stripe fails to charge the customer. The payment intent is created
+    with an idempotency key of the reservation and the attempt, hence retrying a charge whose
+    outcome is unknown with the same attempt does not charge the customer twice (see
+    get_next_charge_attempt).
     """
 
-    reservation = Reservation.objects.get(id=reservation_id)
+    # retrieve stripe_setup_intent_id from reservation resource
+    stripe_setup_intent_id = reservation.stripe_setup_intent_id
+
+    # set secret test API key
+    stripe.api_key = os.getenv("STRIPE_API_TEST_KEY")
+
+    payment_amount = int(get_total_reservation_fee(reservation) * 100)
+    if payment_amount < 1:
+        return
+
+    try:
+        # retrieve setup_intent object
+        setup_intent = stripe.SetupIntent.retrieve(id=stripe_setup_intent_id)
+
+        #  create payment intent
+        stripe.PaymentIntent.create(
+            amount=payment_amount,
+            currency="usd",
+            customer=setup_intent.customer,
+            payment_method=setup_intent.payment_method,
+            off_session=True,
+            confirm=True,
+            idempotency_key=f"reservation-{reservation.id}-charge-{attempt}",
+        )
+    except stripe.error.StripeError as error:
+        raise classify_stripe_error(error) from error
+
+
+def get_stripe_payment_method_object(reservation):
+    """
+    Return the stripe payment method object
+    """
 
     stripe_setup_intent_id = reservation.stripe_setup_intent_id
 
@@ -0,0 +1,305 @@
+"""
+Module for the process-local spatial index of parking spots
+"""
+
+import heapq
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .utils import get_bounding_box, get_earth_radius, haversine_distances
+
+
+class ParkingSpotIndex:
+    """
+    A fixed grid index of the coordinates of all active parking spots, held in the memory of the
+    current process. Each grid cell is cell_size degrees of latitude high and cell_size degrees of
+    longitude wide and maps the ids of the parking spots inside it to their coordinates.
+
+    The index is built lazily by the first search and kept up to date incrementally through
+    update() / remove(), which are called by the ParkingSpot post_save / post_delete signals
+    (see app.signals). Saves in other processes, e.g. a different gunicorn worker or a Celery
+    worker, cannot reach this index. Hence, the index is rebuilt from the db once it is older
+    than max_age seconds, and it only stores the commercially available (active) parking spots
+    rather than the unreserved ones: reservations are made and run out all the time across
+    processes, so the reservations must always be checked against the db.
+    """
+
+    def __init__(self, cell_size: float = None, max_age: float = None):
+        self.cell_size = cell_size or settings.PARKING_SPOT_INDEX_CELL_SIZE
+        self.max_age = max_age or settings.PARKING_SPOT_INDEX_MAX_AGE
+        self._lock = threading.RLock()
+        # (row, col) -> {parking_spot_id: (lat, lng)}
+        self._cells = {}
+        # parking_spot_id -> (row, col)
+        self._locations = {}
+        self._built_at = None
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    @property
+    def is_built(self) -> bool:
+        """
+        Returns True if the index has been built and is not older than max_age
+        """
+
+        return self._built_at is not None and time.monotonic() - self._built_at < self.max_age
+
+    def get_cell(self, lat: float, lng: float) -> tuple:
+        """
+        Return the (row, col) key of the grid cell containing the GPS coordinate (lat, lng)
+        """
+
+        # the 180th meridian belongs to the same cell as the -180th meridian
+        if lng >= 180:
+            lng -= 360
+
+        return math.floor(lat / self.cell_size), math.floor(lng / self.cell_size)
+
+    def rebuild(self):
+        """
+        Replace the content of the index with the coordinates of all active parking spots in the
+        db. This is the cold start path.
+        """
+
+        # avoid a circular import, the models are not needed to import this module
+        from app.models.parking_spot import ParkingSpot
+
+        cells = {}
+        locations = {}
+        for parking_spot_id, lat, lng in ParkingSpot.objects.filter(active=True).values_list(
+            "id", "lat", "lng"
+        ):
+            lat, lng = float(lat), float(lng)
+            cell = self.get_cell(lat, lng)
+            cells.setdefault(cell, {})[parking_spot_id] = (lat, lng)
+            locations[parking_spot_id] = cell
+
+        with self._lock:
+            self._cells = cells
+            self._locations = locations
+            self._built_at = time.monotonic()
+
+    def clear(self):
+        """
+        Empty the index. The next search rebuilds it.
+        """
+
+        with self._lock:
+            self._cells = {}
+            self._locations = {}
+            self._built_at = None
+
+    def update(self, parking_spot):
+        """
+        Add, move or remove a single parking spot after it has been saved. Inactive parking spots
+        are removed from the index.
+        """
+
+        with self._lock:
+            # a cold index picks up the change when it is being built
+            if self._built_at is None:
+                return
+
+            self.remove(parking_spot.id)
+
+            if parking_spot.active:
+                lat, lng = float(parking_spot.lat), float(parking_spot.lng)
+                cell = self.get_cell(lat, lng)
+                self._cells.setdefault(cell, {})[parking_spot.id] = (lat, lng)
+                self._locations[parking_spot.id] = cell
+
+    def remove(self, parking_spot_id: int):
+        """
+        Remove a single parking spot from the index
+        """
+
+        with self._lock:
+            cell = self._locations.pop(parking_spot_id, None)
+            if cell is not None:
+                del self._cells[cell][parking_spot_id]
+                if not self._cells[cell]:
+                    del self._cells[cell]
+
+    def get_cells_in_bounding_box(self, min_lat: float, max_lat: float, lng_ranges: list):
+        """
+        Return the keys of all non-empty grid cells which overlap the lat/lng bounding box
+        """
+
+        min_row = math.floor(min_lat / self.cell_size)
+        max_row = math.floor(max_lat / self.cell_size)
+        col_ranges = [
+            (math.floor(min_lng / self.cell_size), math.floor(max_lng / self.cell_size))
+            for min_lng, max_lng in lng_ranges
+        ]
+        cell_count = (max_row - min_row + 1) * sum(
+            max_col - min_col + 1 for min_col, max_col in col_ranges
+        )
+
+        # for large search circles it is cheaper to visit each non-empty cell once
+        if cell_count > len(self._cells):
+            return [
+                (row, col)
+                for row, col in self._cells
+                if min_row <= row <= max_row
+                and any(min_col <= col <= max_col for min_col, max_col in col_ranges)
+            ]
+
+        return [
+            (row, col)
+            for row in range(min_row, max_row + 1)
+            for min_col, max_col in col_ranges
+            for col in range(min_col, max_col + 1)
+            if (row, col) in self._cells
+        ]
+
+    def search(self, lat: float, lng: float, distance: float, unit: str) -> list:
+        """
+        Return a list of (parking_spot_id, distance) tuples for all active parking spots within
+        distance of the GPS coordinate (lat, lng). Only the grid cells which overlap the bounding
+        box of the search circle are visited.
+        """
+
+        if not self.is_built:
+            self.rebuild()
+
+        min_lat, max_lat, lng_ranges = get_bounding_box(lat, lng, distance, unit)
+
+        with self._lock:
+            candidates = [
+                (parking_spot_id, spot_lat, spot_lng)
+                for cell in self.get_cells_in_bounding_box(min_lat, max_lat, lng_ranges)
+                for parking_spot_id, (spot_lat, spot_lng) in self._cells[cell].items()
+            ]
+
+        if not candidates:
+            return []
+
+        ids, lats, lngs = zip(*candidates)
+        distances = haversine_distances(lat, lng, np.array(lats), np.array(lngs), unit)
+
+        return [(ids[i], distances[i]) for i in np.flatnonzero(distances <= distance)]
+
+    def get_ring(self, row: int, col: int, radius: int) -> list:
+        """
+        Return the keys of the grid cells which form the square ring of cells radius cells away
+        from the cell (row, col). Rows beyond the poles are skipped and columns beyond the
+        antimeridian wrap around.
+        """
+
+        if radius == 0:
+            ring = [(row, col)]
+        else:
+            ring = [(row - radius, c) for c in range(col - radius, col + radius + 1)]
+            ring += [(row + radius, c) for c in range(col - radius, col + radius + 1)]
+            ring += [(r, col - radius) for r in range(row - radius + 1, row + radius)]
+            ring += [(r, col + radius) for r in range(row - radius + 1, row + radius)]
+
+        return [
+            (r, self.get_cell(0, ((c + 0.5) * self.cell_size) % 360)[1])
+            for r, c in ring
+            if r * self.cell_size <= 90 and (r + 1) * self.cell_size >= -90
+        ]
+
+    def get_ring_clearance(self, lat: float, lng: float, radius: int, unit: str) -> float:
+        """
+        Return a lower bound of the distance between the GPS coordinate (lat, lng) and any point
+        outside the square of grid cells up to radius cells away from the cell containing (lat,
+        lng). Every parking spot beyond that square is at least this far away.
+        """
+
+        row, col = self.get_cell(lat, lng)
+        if lng >= 180:
+            lng -= 360
+
+        # angular distance to the nearest parallel bounding the square, unless it is beyond a pole
+        south = (row - radius) * self.cell_size
+        north = (row + radius + 1) * self.cell_size
+        lat_gap = min(
+            lat - south if south > -90 else math.inf,
+            north - lat if north < 90 else math.inf,
+        )
+
+        # angular distance to the nearest meridian bounding the square, i.e. the cross-track
+        # distance asin(sin(lng_gap) * cos(lat)) to the great circle of that meridian, unless the
+        # square spans all meridians
+        if (2 * radius + 1) * self.cell_size >= 360:
+            meridian_gap = math.inf
+        else:
+            lng_gap = min(
+                lng - (col - radius) * self.cell_size,
+                (col + radius + 1) * self.cell_size - lng,
+            )
+            meridian_gap = math.asin(
+                math.sin(math.radians(min(lng_gap, 90))) * math.cos(math.radians(lat))
+            )
+
+        return get_earth_radius(unit) * min(math.radians(lat_gap), meridian_gap)
+
+    def nearest(self, lat: float, lng: float, unit: str, max_distance: float = math.inf):
+        """
+        Generator which yields (parking_spot_id, distance) tuples of the active parking spots in
+        ascending order of their distance from the GPS coordinate (lat, lng), up to max_distance.
+
+        The search visits the grid cells in square rings around the cell containing (lat, lng)
+        and yields a parking spot as soon as no unvisited cell can hold a closer one. Hence, the
+        caller can stop after the first k parking spots without the index sorting all of them.
+        """
+
+        if not self.is_built:
+            self.rebuild()
+
+        row, col = self.get_cell(lat, lng)
+        visited = set()
+        heap = []
+        radius = 0
+        clearance = 0
+
+        while clearance < max_distance:
+            with self._lock:
+                # once the rings have covered more cells than the index holds, it is cheaper to
+                # visit all remaining cells at once
+                if len(visited) > len(self._cells):
+                    cells = [cell for cell in self._cells if cell not in visited]
+                    clearance = math.inf
+                else:
+                    ring = [
+                        cell
+                        for cell in dict.fromkeys(self.get_ring(row, col, radius))
+                        if cell not in visited
+                    ]
+                    visited.update(ring)
+                    cells = [cell for cell in ring if cell in self._cells]
+                    clearance = self.get_ring_clearance(lat, lng, radius, unit)
+
+                candidates = [
+                    (parking_spot_id, spot_lat, spot_lng)
+                    for cell in cells
+                    for parking_spot_id, (spot_lat, spot_lng) in self._cells[cell].items()
+                ]
+
+            if candidates:
+                ids, lats, lngs = zip(*candidates)
+                distances = haversine_distances(lat, lng, np.array(lats), np.array(lngs), unit)
+                for i in np.flatnonzero(distances <= max_distance):
+                    heapq.heappush(heap, (distances[i], ids[i]))
+
+            # no unvisited parking spot is closer than the clearance of the visited cells
+            while heap and heap[0][0] <= clearance:
+                distance, parking_spot_id = heapq.heappop(heap)
+                yield parking_spot_id, distance
+
+            radius += 1
+
+        # all remaining parking spots within max_distance have been visited
+        while heap:
+            distance, parking_spot_id = heapq.heappop(heap)
+            yield parking_spot_id, distance
+
+
+# the index of the current process
+parking_spot_index = ParkingSpotIndex()
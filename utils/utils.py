@@ -4,8 +4,17 @@ Module contains utility or helper functions
 import math
 from decimal import Decimal
 from random import uniform
+
+import numpy as np
+
 from .ErrorClasses import ValidationError
 
+# mean radius of the Earth in km (this is sufficiently accurate)
+EARTH_RADIUS_KM = 6371
+
+# https://en.wikipedia.org/wiki/United_States_customary_units
+KM_PER_MILE = 1.609344
+
 
 def is_integer(decimal: Decimal) -> bool:
     """
@@ -41,6 +50,14 @@ def get_rand_decimal(min: float, max: float, right_digits: int) -> Decimal:
     return Decimal(rand_str)
 
 
+def get_earth_radius(unit: str) -> float:
+    """
+    Return the mean radius of the Earth in km if unit is "km" and in miles otherwise
+    """
+
+    return EARTH_RADIUS_KM if unit == "km" else EARTH_RADIUS_KM / KM_PER_MILE
+
+
 def haversine_distance(
         user_lat: float,
         user_lng: float,
@@ -53,11 +70,8 @@ def haversine_distance(
     Source: http://www.movable-type.co.uk/scripts/latlong.html
     """
 
-    # https://en.wikipedia.org/wiki/United_States_customary_units
-    conversion_factor = 1 if unit == "km" else 1 / 1.609344
-
-    # mean radius of the Earth (this is sufficiently accurate) in [unit]
-    radius_earth = 6371 * conversion_factor
+    # mean radius of the Earth in [unit]
+    radius_earth = get_earth_radius(unit)
 
     # convert to radian
     user_lat_rad = user_lat * math.pi / 180
@@ -75,3 +89,119 @@ def haversine_distance(
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
 
     return radius_earth * c
+
+
+def haversine_distances(
+        user_lat: float,
+        user_lng: float,
+        parking_spot_lats: np.ndarray,
+        parking_spot_lngs: np.ndarray,
+        unit: str
+) -> np.ndarray:
+    """
+    Vectorised version of haversine_distance. Calculate and return the distances between one GPS
+    coordinate and an array of GPS coordinates in a single pass over the arrays.
+    """
+
+    # mean radius of the Earth in [unit]
+    radius_earth = get_earth_radius(unit)
+
+    # convert to radian
+    user_lat_rad = math.radians(user_lat)
+    parking_spot_lats_rad = np.radians(parking_spot_lats)
+
+    # convert lat and long deltas to radian
+    lat_deltas_rad = np.radians(parking_spot_lats - user_lat)
+    lng_deltas_rad = np.radians(parking_spot_lngs - user_lng)
+
+    a = \
+        np.sin(lat_deltas_rad / 2) ** 2 + \
+        math.cos(user_lat_rad) * np.cos(parking_spot_lats_rad) * np.sin(lng_deltas_rad / 2) ** 2
+
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return radius_earth * c
+
+
+def get_unit_vector(lat: float, lng: float) -> tuple:
+    """
+    Return the (x, y, z) unit vector which points from the centre of the Earth to the GPS
+    coordinate (lat, lng). The z-axis points to the North Pole and the x-axis to (0, 0).
+    """
+
+    lat_rad = math.radians(lat)
+    lng_rad = math.radians(lng)
+
+    return (
+        math.cos(lat_rad) * math.cos(lng_rad),
+        math.cos(lat_rad) * math.sin(lng_rad),
+        math.sin(lat_rad),
+    )
+
+
+def get_chord_length(distance: float, unit: str) -> float:
+    """
+    Return the length of the chord through the unit sphere between two points which are distance
+    apart on the surface of the Earth. Two unit vectors are within distance of each other if, and
+    only if, the euclidean distance between them is no larger than the chord length. Comparing
+    squared chord lengths needs no trigonometric functions and, unlike the dot product, stays
+    accurate for distances of a few meters.
+    """
+
+    # angular distance in radian on a great circle, no two points are more than pi apart
+    angular_distance = min(distance / get_earth_radius(unit), math.pi)
+
+    return 2 * math.sin(angular_distance / 2)
+
+
+def chord_length_to_distance(chord_length: float, unit: str) -> float:
+    """
+    Return the distance on the surface of the Earth between two points whose unit vectors are
+    chord_length apart, the inverse of get_chord_length
+    """
+
+    return 2 * get_earth_radius(unit) * math.asin(min(chord_length / 2, 1))
+
+
+def get_bounding_box(lat: float, lng: float, distance: float, unit: str) -> tuple:
+    """
+    Return the smallest lat/lng bounding box which contains every point within distance of the
+    GPS coordinate (lat, lng) as a tuple (min_lat, max_lat, lng_ranges).
+
+    lng_ranges is a list of inclusive (min_lng, max_lng) tuples. Usually it holds a single range.
+    If the box crosses the antimeridian it is split into two ranges, one on either side of the
+    180th meridian. If the search circle includes a pole every longitude is within reach and the
+    single range (-180, 180) is returned.
+    Source: http://janmatuschek.de/LatitudeLongitudeBoundingCoordinates
+    """
+
+    # angular distance in radian on a great circle
+    angular_distance = distance / get_earth_radius(unit)
+
+    lat_rad = math.radians(lat)
+    min_lat_rad = lat_rad - angular_distance
+    max_lat_rad = lat_rad + angular_distance
+
+    # a pole lies within the search circle, hence all meridians are crossed
+    if min_lat_rad <= -math.pi / 2 or max_lat_rad >= math.pi / 2:
+        min_lat = max(math.degrees(min_lat_rad), -90)
+        max_lat = min(math.degrees(max_lat_rad), 90)
+        return min_lat, max_lat, [(-180, 180)]
+
+    lng_delta = math.degrees(math.asin(math.sin(angular_distance) / math.cos(lat_rad)))
+
+    if lng_delta >= 180:
+        return math.degrees(min_lat_rad), math.degrees(max_lat_rad), [(-180, 180)]
+
+    min_lng = lng - lng_delta
+    max_lng = lng + lng_delta
+
+    # split the box into two boxes if it crosses the antimeridian
+    if min_lng < -180:
+        lng_ranges = [(min_lng + 360, 180), (-180, max_lng)]
+    elif max_lng > 180:
+        lng_ranges = [(min_lng, 180), (-180, max_lng - 360)]
+    else:
+        lng_ranges = [(min_lng, max_lng)]
+
+    return math.degrees(min_lat_rad), math.degrees(max_lat_rad), lng_ranges